@@ -0,0 +1,211 @@
+"""
+Gerador de carga para os backends de plano de dieta.
+
+Dispara requisições de geração (/gerar_dieta no FastAPI, /gerar_plano no
+Flask) com concorrência fixa, baixa cada PDF por /baixar_plano e mede
+latência (p50/p95/p99), throughput, erros e o tempo por etapa informado
+pelo servidor no cabeçalho Server-Timing (llm, parse, guard, pdf...).
+
+Com o LLM falso (benchmarks/fake_llm.py) rodando e o app apontado para ele:
+
+    python benchmarks/carga.py fastapi --url http://127.0.0.1:8001 --concorrencia 1 4 16 --requisicoes 40
+    python benchmarks/carga.py flask --url http://127.0.0.1:5000 --comparar benchmarks/resultados/anterior.json
+
+O resultado é salvo em JSON (benchmarks/resultados/) para comparar execuções.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urljoin
+
+import httpx
+
+ENDPOINTS = {"fastapi": "/gerar_dieta", "flask": "/gerar_plano"}
+
+
+def perfil(indice, variar=True):
+    # Peso diferente a cada requisição para não cair no cache de planos
+    return {
+        "idade": 30,
+        "genero": "masculino",
+        "peso": 60 + (indice if variar else 0),
+        "altura": 175,
+        "nivel_atividade": "moderado",
+        "objetivos": "ganhar massa muscular",
+        "restricoes_alimentares": "nenhuma",
+    }
+
+
+def parse_server_timing(valor):
+    etapas = {}
+    for item in (valor or "").split(","):
+        nome, _, resto = item.strip().partition(";")
+        if nome and resto.startswith("dur="):
+            etapas[nome] = float(resto[4:])
+    return etapas
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicao = (len(ordenados) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return round(ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior), 1)
+
+
+def resumo(valores):
+    return {
+        "p50": percentil(valores, 50),
+        "p95": percentil(valores, 95),
+        "p99": percentil(valores, 99),
+        "media": round(sum(valores) / len(valores), 1) if valores else None,
+    }
+
+
+def uma_requisicao(cliente, alvo, indice, variar, baixar):
+    dados = perfil(indice, variar)
+    inicio = time.perf_counter()
+    if alvo == "flask":
+        resposta = cliente.post(ENDPOINTS[alvo], json=dados)
+    else:
+        resposta = cliente.post(ENDPOINTS[alvo], data=dados)
+    latencia = (time.perf_counter() - inicio) * 1000
+    resultado = {
+        "status": resposta.status_code,
+        "latencia_ms": latencia,
+        "etapas": parse_server_timing(resposta.headers.get("Server-Timing")),
+    }
+    if resposta.status_code != 200:
+        return resultado
+
+    url = resposta.json().get("download_url")
+    if baixar and url:
+        inicio = time.perf_counter()
+        download = cliente.get(urljoin(str(cliente.base_url), url))
+        resultado["download_ms"] = (time.perf_counter() - inicio) * 1000
+        resultado["download_status"] = download.status_code
+        resultado["pdf_bytes"] = len(download.content)
+    return resultado
+
+
+def executar_nivel(cliente, alvo, concorrencia, requisicoes, inicio_indice, variar, baixar):
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        resultados = list(executor.map(
+            lambda i: uma_requisicao(cliente, alvo, i, variar, baixar),
+            range(inicio_indice, inicio_indice + requisicoes)
+        ))
+    duracao = time.perf_counter() - inicio
+
+    ok = [r for r in resultados if r["status"] == 200]
+    nomes_etapas = sorted({nome for r in ok for nome in r["etapas"]})
+    downloads = [r["download_ms"] for r in ok if r.get("download_status") == 200]
+    return {
+        "concorrencia": concorrencia,
+        "requisicoes": requisicoes,
+        "ok": len(ok),
+        "erros": len(resultados) - len(ok),
+        "status": {str(s): sum(1 for r in resultados if r["status"] == s) for s in sorted({r["status"] for r in resultados})},
+        "duracao_s": round(duracao, 2),
+        "throughput_rps": round(len(ok) / duracao, 2) if duracao else None,
+        "latencia_ms": resumo([r["latencia_ms"] for r in ok]),
+        "download_ms": resumo(downloads),
+        "download_erros": sum(1 for r in ok if r.get("download_status") not in (None, 200)),
+        "etapas_ms": {nome: resumo([r["etapas"][nome] for r in ok if nome in r["etapas"]]) for nome in nomes_etapas},
+    }
+
+
+def commit_atual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual, anterior):
+    """Imprime a variação de p50/p95 e throughput em relação a uma execução anterior."""
+    anteriores = {n["concorrencia"]: n for n in anterior["niveis"]}
+    for nivel in atual["niveis"]:
+        antigo = anteriores.get(nivel["concorrencia"])
+        if antigo is None:
+            continue
+        linhas = []
+        for rotulo, novo, velho in (
+            ("p50", nivel["latencia_ms"]["p50"], antigo["latencia_ms"]["p50"]),
+            ("p95", nivel["latencia_ms"]["p95"], antigo["latencia_ms"]["p95"]),
+            ("rps", nivel["throughput_rps"], antigo["throughput_rps"]),
+        ):
+            if novo is None or not velho:
+                continue
+            linhas.append(f"{rotulo} {velho} -> {novo} ({(novo - velho) / velho * 100:+.1f}%)")
+        print(f"  concorrência {nivel['concorrencia']}: " + ", ".join(linhas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga dos backends")
+    parser.add_argument("alvo", choices=sorted(ENDPOINTS))
+    parser.add_argument("--url", required=True, help="URL base do app (ex.: http://127.0.0.1:8001)")
+    parser.add_argument("--concorrencia", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requisicoes", type=int, default=40, help="Requisições por nível de concorrência")
+    parser.add_argument("--repetir-perfil", action="store_true", help="Mesmo perfil em todas (mede o caminho com cache)")
+    parser.add_argument("--sem-download", action="store_true", help="Não baixa os PDFs gerados")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--saida", default=os.path.join(os.path.dirname(__file__), "resultados"))
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    args = parser.parse_args()
+
+    limites = httpx.Limits(max_connections=max(args.concorrencia), max_keepalive_connections=max(args.concorrencia))
+    resultado = {
+        "alvo": args.alvo,
+        "url": args.url,
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit_atual(),
+        "config": {
+            "requisicoes": args.requisicoes,
+            "repetir_perfil": args.repetir_perfil,
+            "download": not args.sem_download,
+        },
+        "niveis": [],
+    }
+    with httpx.Client(base_url=args.url, limits=limites, timeout=args.timeout) as cliente:
+        indice = 0
+        for concorrencia in args.concorrencia:
+            nivel = executar_nivel(
+                cliente, args.alvo, concorrencia, args.requisicoes, indice,
+                variar=not args.repetir_perfil, baixar=not args.sem_download
+            )
+            indice += args.requisicoes
+            resultado["niveis"].append(nivel)
+            latencia = nivel["latencia_ms"]
+            print(
+                f"concorrência {concorrencia}: {nivel['ok']} ok, {nivel['erros']} erros, "
+                f"{nivel['throughput_rps']} req/s, p50 {latencia['p50']} ms, p95 {latencia['p95']} ms, p99 {latencia['p99']} ms"
+            )
+            for nome, tempos in nivel["etapas_ms"].items():
+                print(f"    {nome}: p50 {tempos['p50']} ms, p95 {tempos['p95']} ms")
+
+    os.makedirs(args.saida, exist_ok=True)
+    caminho = os.path.join(args.saida, f"{args.alvo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"Resultado salvo em {caminho}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            anterior = json.load(f)
+        print(f"Comparação com {args.comparar} ({anterior.get('commit')}):")
+        comparar(resultado, anterior)
+    return 0 if all(n["erros"] == 0 for n in resultado["niveis"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+Servidor local compatível com a API de chat da OpenAI, para benchmarks.
+
+Responde /v1/chat/completions (com ou sem stream) com um plano_dieta JSON
+pronto (ou no formato compacto, se o prompt pedir), simulando latência até o primeiro token, taxa de tokens por segundo
+e erros. Uso:
+
+    python benchmarks/fake_llm.py --porta 8900 --latencia 0.5 --tokens-por-segundo 200 --erros 0.02
+
+e, nos apps, OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=fake.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from nutricional_core.compacto import compactar
+
+REFEICOES = ["CAFÉ DA MANHÃ", "LANCHE DA MANHÃ", "ALMOÇO", "LANCHE DA TARDE", "JANTAR"]
+
+
+def ingrediente(nome, quantidade, proteina, carboidrato, gordura):
+    return {
+        "nome": nome,
+        "quantidade": quantidade,
+        "proteina": f"{proteina} g",
+        "carboidrato": f"{carboidrato} g",
+        "gordura": f"{gordura} g",
+    }
+
+
+def refeicao(nome_refeicao):
+    return {
+        "refeicao": nome_refeicao,
+        "nome": "Arroz, feijão e frango grelhado",
+        "ingredientes": [
+            ingrediente("Arroz integral cozido", "150 g", 3.9, 38.6, 1.5),
+            ingrediente("Feijão carioca cozido", "100 g", 4.8, 13.6, 0.5),
+            ingrediente("Peito de frango grelhado", "120 g", 38.4, 0.0, 3.0),
+        ],
+        "instrucoes": "Cozinhe o arroz e o feijão; grelhe o frango com azeite e sal.",
+    }
+
+
+METAS = {
+    "calorias": "2600 kcal",
+    "macronutrientes": "30% proteína, 45% carboidrato, 25% gordura",
+    "Consumo de água": "3000 ml",
+    "Consumo de fibras": "30 g",
+    "Suplementação": "Whey protein e creatina",
+    "plano_refeicoes": {"detalhamento": "5 refeições distribuídas ao longo do dia."},
+    "dicas": ["Beba água ao longo do dia", "Priorize alimentos in natura", "Durma bem"],
+    "observacoes": "Plano gerado pelo servidor de benchmark.",
+}
+
+PLANO = {"plano_dieta": {**METAS, "refeições": [refeicao(r) for r in REFEICOES]}}
+
+RESPOSTA_CHAT = "Um ovo cozido tem cerca de 70 kcal e 6 g de proteína. É uma boa fonte de proteína para o café da manhã."
+
+
+def conteudo_para(mensagens):
+    """Escolhe a resposta pronta conforme o prompt recebido."""
+    prompt = " ".join(str(m.get("content", "")) for m in mensagens)
+    if "formato compacto" in prompt:
+        taco = "[nome, quantidade]" in prompt
+        metas_locais = "não recalcule" in prompt
+        compacto = compactar(PLANO["plano_dieta"], "taco" if taco else "llm", metas_locais)
+        return json.dumps(compacto, ensure_ascii=False, separators=(",", ":"))
+    if "Calcule as metas diárias" in prompt or "Complete o plano" in prompt:
+        return json.dumps(METAS, ensure_ascii=False)
+    if "Elabore a refeição" in prompt:
+        nome = next((r for r in REFEICOES if r in prompt), REFEICOES[0])
+        return json.dumps(refeicao(nome), ensure_ascii=False)
+    if "plano nutricional" in prompt or "plano_dieta" in prompt:
+        return json.dumps(PLANO, ensure_ascii=False, indent=2)
+    return RESPOSTA_CHAT
+
+
+def pedacos(texto, tamanho=4):
+    # ~4 caracteres por token
+    return [texto[i:i + tamanho] for i in range(0, len(texto), tamanho)]
+
+
+class Config:
+    latencia = 0.5
+    tokens_por_segundo = 200.0
+    erros = 0.0
+    jitter = 0.1
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, formato, *args):
+        logging.debug(formato % args)
+
+    def _json(self, status, corpo, headers=None):
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._json(404, {"error": {"message": "not found"}})
+            return
+        corpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+        if random.random() < Config.erros:
+            if random.random() < 0.5:
+                self._json(429, {"error": {"message": "Rate limit (injetado)", "type": "rate_limit"}}, {"Retry-After": "0.1"})
+            else:
+                self._json(500, {"error": {"message": "Erro interno (injetado)", "type": "server_error"}})
+            return
+
+        conteudo = conteudo_para(corpo.get("messages", []))
+        tokens = pedacos(conteudo)
+        intervalo = 1 / Config.tokens_por_segundo if Config.tokens_por_segundo else 0
+        time.sleep(max(0.0, random.gauss(Config.latencia, Config.latencia * Config.jitter)))
+
+        resposta_id = f"chatcmpl-{uuid.uuid4().hex}"
+        modelo = corpo.get("model", "fake")
+        if corpo.get("stream"):
+            uso = (corpo.get("stream_options") or {}).get("include_usage")
+            self._stream(resposta_id, modelo, tokens, intervalo, uso)
+            return
+
+        time.sleep(intervalo * len(tokens))
+        self._json(200, {
+            "id": resposta_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": modelo,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": conteudo}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+        })
+
+    def _stream(self, resposta_id, modelo, tokens, intervalo, uso=False):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def enviar(dados):
+            linha = f"data: {dados}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(linha):x}\r\n".encode() + linha + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            for i, token in enumerate(tokens):
+                delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+                enviar(json.dumps({
+                    "id": resposta_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": modelo,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                }, ensure_ascii=False))
+                time.sleep(intervalo)
+            enviar(json.dumps({
+                "id": resposta_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": modelo,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }))
+            if uso:
+                # stream_options.include_usage: chunk final sem choices
+                enviar(json.dumps({
+                    "id": resposta_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": modelo,
+                    "choices": [],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+                }))
+            enviar("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Cliente fechou o stream (ex.: guard abortou a resposta)
+            pass
+
+
+def iniciar(porta=8900, latencia=0.5, tokens_por_segundo=200.0, erros=0.0, em_thread=False):
+    Config.latencia = latencia
+    Config.tokens_por_segundo = tokens_por_segundo
+    Config.erros = erros
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), Handler)
+    servidor.daemon_threads = True
+    if em_thread:
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        return servidor
+    logging.info(f"LLM falso em http://127.0.0.1:{porta}/v1")
+    servidor.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor OpenAI falso para benchmarks")
+    parser.add_argument("--porta", type=int, default=8900)
+    parser.add_argument("--latencia", type=float, default=0.5, help="Segundos até o primeiro token")
+    parser.add_argument("--tokens-por-segundo", type=float, default=200.0)
+    parser.add_argument("--erros", type=float, default=0.0, help="Fração das requisições que falham (429/500)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    iniciar(args.porta, args.latencia, args.tokens_por_segundo, args.erros)
+
+
+if __name__ == "__main__":
+    main()
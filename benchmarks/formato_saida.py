@@ -0,0 +1,138 @@
+"""
+Tokens e latência do formato de resposta do plano: JSON completo x compacto.
+
+Monta o prompt de cada formato (nutricional_core.prompts) para um perfil
+de exemplo e a resposta equivalente do LLM falso (mesmo cardápio nos dois
+formatos), conta os tokens de entrada e de saída e estima o tempo de
+geração pela taxa de tokens por segundo. Com --url, mede também a latência
+real de N chamadas por formato em uma API compatível com a da OpenAI (o
+LLM falso ou a de produção):
+
+    python benchmarks/formato_saida.py
+    python benchmarks/formato_saida.py --macros taco --metas llm
+    python benchmarks/formato_saida.py --url http://127.0.0.1:8900/v1 --chamadas 5
+
+Os tokens são contados com o tiktoken quando instalado; sem ele, pela
+aproximação de ~4 caracteres por token (marcada como "aprox.").
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(RAIZ)
+
+import fake_llm
+from nutricional_core.compacto import expandir
+from nutricional_core.metas import metas_perfil
+from nutricional_core.perfil import validar_perfil
+from nutricional_core.prompts import mensagens_plano
+from nutricional_core.schema import extrair_json
+
+PERFIL = {
+    "idade": 30,
+    "genero": "masculino",
+    "peso": 75,
+    "altura": 175,
+    "nivel_atividade": "moderado",
+    "objetivos": "ganhar massa muscular",
+    "restricoes_alimentares": "nenhuma",
+}
+
+
+def contador_tokens(modelo):
+    """Função texto -> tokens e se a contagem é exata."""
+    try:
+        import tiktoken
+    except ImportError:
+        return (lambda texto: max(1, len(texto) // 4)), False
+    try:
+        codificacao = tiktoken.encoding_for_model(modelo)
+    except KeyError:
+        codificacao = tiktoken.get_encoding("cl100k_base")
+    return (lambda texto: len(codificacao.encode(texto))), True
+
+
+def casos(macro_source, metas_locais):
+    """(formato, mensagens, resposta do LLM falso) de cada formato."""
+    perfil = validar_perfil(PERFIL)
+    metas = metas_perfil(perfil) if metas_locais else None
+    for formato in ("json", "compacto"):
+        mensagens = mensagens_plano(perfil, macro_source, metas, formato)
+        yield formato, mensagens, fake_llm.conteudo_para(mensagens)
+
+
+def medir_expansao(resposta, repeticoes=1000):
+    """Custo no servidor de expandir a resposta compacta (µs por plano)."""
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        expandir(extrair_json(resposta))
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def medir_latencia(url, modelo, mensagens, chamadas):
+    from nutricional_core.llm import LLMClient
+
+    cliente = LLMClient(api_key=os.getenv("OPENAI_API_KEY", "fake"), base_url=url)
+    tempos, tokens_saida = [], []
+    try:
+        for _ in range(chamadas):
+            inicio = time.perf_counter()
+            resposta = cliente.chat(mensagens, model=modelo, temperature=0)
+            tempos.append(time.perf_counter() - inicio)
+            if resposta.usage is not None:
+                tokens_saida.append(resposta.usage.completion_tokens)
+    finally:
+        cliente.close()
+    return statistics.mean(tempos), (statistics.mean(tokens_saida) if tokens_saida else None)
+
+
+def reducao(antes, depois):
+    return f"{(1 - depois / antes) * 100:.0f}%" if antes else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens e latência: JSON completo x formato compacto")
+    parser.add_argument("--macros", choices=["llm", "taco"], default="llm", help="MACRO_SOURCE")
+    parser.add_argument("--metas", choices=["local", "llm"], default="local", help="ENERGY_TARGETS")
+    parser.add_argument("--modelo", default="gpt-4")
+    parser.add_argument("--tokens-por-segundo", type=float, default=40.0, help="Taxa de geração para a estimativa")
+    parser.add_argument("--url", help="Base da API (ex.: http://127.0.0.1:8900/v1) para medir a latência real")
+    parser.add_argument("--chamadas", type=int, default=3)
+    args = parser.parse_args()
+
+    contar, exato = contador_tokens(args.modelo)
+    sufixo = "" if exato else " (aprox.)"
+    resultados = {}
+    for formato, mensagens, resposta in casos(args.macros, args.metas == "local"):
+        resultado = {
+            "tokens_entrada": sum(contar(m["content"]) for m in mensagens),
+            "tokens_saida": contar(resposta),
+        }
+        resultado["geracao_estimada_s"] = round(resultado["tokens_saida"] / args.tokens_por_segundo, 1)
+        if formato != "json":
+            resultado["expansao_us"] = round(medir_expansao(resposta), 1)
+        if args.url:
+            latencia, tokens_api = medir_latencia(args.url, args.modelo, mensagens, args.chamadas)
+            resultado["latencia_s"] = round(latencia, 2)
+            resultado["tokens_saida_api"] = tokens_api
+        resultados[formato] = resultado
+
+    print(f"MACRO_SOURCE={args.macros} ENERGY_TARGETS={args.metas}, tokens{sufixo}")
+    for formato, resultado in resultados.items():
+        print(f"  {formato}: " + ", ".join(f"{nome} {valor}" for nome, valor in resultado.items()))
+    completo, compacto = resultados["json"], resultados["compacto"]
+    print(
+        f"Redução: entrada {reducao(completo['tokens_entrada'], compacto['tokens_entrada'])}, "
+        f"saída {reducao(completo['tokens_saida'], compacto['tokens_saida'])}"
+        + (f", latência {reducao(completo['latencia_s'], compacto['latencia_s'])}" if args.url else "")
+    )
+    print(json.dumps(resultados, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Perfil de importação dos apps (tempo de partida a frio).
+
+Importa o módulo do app em um processo novo com `python -X importtime` e
+mostra quanto cada pacote custa (tempo próprio somado por pacote de topo)
+e os módulos mais caros (tempo acumulado). Com --orcamento, falha se a
+importação passar do limite, para pegar regressões de partida:
+
+    python benchmarks/importacao.py fastapi --orcamento 2.0
+    python benchmarks/importacao.py flask --top 15
+
+O app é importado com OPENAI_API_KEY=fake se a variável não existir.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+APPS = {
+    "fastapi": (os.path.join(RAIZ, "weasyprint"), "main"),
+    "flask": (os.path.join(RAIZ, "flask-nutricional", "backend"), "app"),
+}
+
+
+def parse_importtime(saida):
+    """Linhas do -X importtime -> [(módulo, próprio µs, acumulado µs)]."""
+    modulos = []
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:"):
+            continue
+        partes = linha[len("import time:"):].split("|")
+        if len(partes) != 3 or not partes[0].strip().isdigit():
+            continue  # cabeçalho
+        modulos.append((partes[2].strip(), int(partes[0]), int(partes[1])))
+    return modulos
+
+
+def por_pacote(modulos):
+    """Tempo próprio (ms) somado por pacote de topo, do maior para o menor."""
+    pacotes = {}
+    for nome, proprio, _ in modulos:
+        topo = nome.split(".")[0]
+        pacotes[topo] = pacotes.get(topo, 0) + proprio
+    return sorted(((p, round(us / 1000, 1)) for p, us in pacotes.items()), key=lambda i: -i[1])
+
+
+def importar(alvo):
+    diretorio, modulo = APPS[alvo]
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    env.setdefault("OPENAI_API_KEY", "fake")
+    inicio = time.perf_counter()
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=diretorio, env=env, capture_output=True, text=True
+    )
+    duracao = time.perf_counter() - inicio
+    if processo.returncode != 0:
+        erro = [l for l in processo.stderr.splitlines() if not l.startswith("import time:")]
+        raise RuntimeError("\n".join(erro[-10:]))
+    return duracao, parse_importtime(processo.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de importação dos apps")
+    parser.add_argument("alvo", choices=sorted(APPS))
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--orcamento", type=float, help="Limite em segundos para a importação do app")
+    args = parser.parse_args()
+
+    duracao, modulos = importar(args.alvo)
+    total = sum(proprio for _, proprio, _ in modulos) / 1000
+    print(f"{args.alvo}: processo {duracao:.2f}s, importações {total:.0f} ms em {len(modulos)} módulos")
+    print("Por pacote (tempo próprio):")
+    for pacote, ms in por_pacote(modulos)[:args.top]:
+        print(f"    {pacote}: {ms} ms")
+    print("Módulos mais caros (acumulado):")
+    for nome, _, acumulado in sorted(modulos, key=lambda m: -m[2])[:args.top]:
+        print(f"    {nome}: {acumulado / 1000:.1f} ms")
+
+    if args.orcamento is not None and duracao > args.orcamento:
+        print(f"Acima do orçamento de {args.orcamento}s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,124 +1,97 @@
-from flask import Flask, request, send_file, jsonify, url_for
-import openai
-from fpdf import FPDF
+from flask import Flask, request, send_file, jsonify, url_for, g, Response
+import atexit
+import io
 import os
-import tempfile
-import guardrails as gr
+import sys
+import time
 from flask_cors import CORS
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from nutricional_core.cache import PlanCache
+from nutricional_core.llm import get_client
+from nutricional_core.render import PdfRenderer
+from nutricional_core.blobs import BlobStore, SharedBlobStore
+from nutricional_core.compartilhado import criar_backend
+from nutricional_core.injecao import InjectionFilter
+from nutricional_core.etapas import server_timing
+from nutricional_core.perfil import PerfilInvalido
+from nutricional_core.compacto import MODELO_ESTRITO
+from nutricional_core.gerador import PlanGenerator, RefeicaoInvalida, criar_guard
+from nutricional_core.receitas import RecipeStore
+from nutricional_core.metricas import EM_ANDAMENTO, REQUISICAO_SEGUNDOS, gerar_metricas
+from nutricional_core.inicializacao import LazyResource, Warmup
+
 app = Flask(__name__)
 CORS(app)
 
-# Configurando a chave da API OpenAI a partir das variáveis de ambiente
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-# Função principal para gerar o plano nutricional
-def gerar_plano_dieta(idade, peso, altura, genero, nivel_atividade, objetivos, restricoes_alimentares):
-    # Definindo o rail_spec conforme especificado
-    rail_spec = """
-    <rail version="0.1">
-        <messages>
-            <message role="system">
-                You are a professional nutritionist specialized in creating personalized meal plans. You must respond only with valid JSON in the specified format.
-            </message>
-            <message role="user">
-                Generate a diet plan based on the provided information.
-            </message>
-            <message role="assistant">
-                I'll generate a personalized diet plan based on the information you provide. The plan will be in JSON format as specified.
-            </message>
-        </messages>
-        <output>
-            <object name="plano_dieta">
-                <string name="calorias" description="Quantidade diária em kcal" />
-                <string name="macronutrientes" description="Distribuição macro" />
-                <string name="Consumo de água" description="Quantidade diária em ml" />
-                <string name="Consumo de fibras" description="Quantidade diária em gramas" />
-                <string name="Suplementação" description="Suplementos recomendados" />
-                <object name="plano_refeicoes">
-                    <string name="detalhamento" description="Descrição do plano de refeições" />
-                </object>
-                <list name="Refeições" description="5 refeições diárias">
-                    <object>
-                        <string name="refeicao" description="Nome da refeição" />
-                        <string name="nome" description="Nome da receita" />
-                        <list name="ingredientes" description="Lista de ingredientes">
-                            <object>
-                                <string name="nome" description="Nome do ingrediente" />
-                                <string name="proteina" description="Valor nutricional de proteína em gramas (tabela TACO)" />
-                                <string name="carboidrato" description="Valor nutricional de carboidrato em gramas (tabela TACO)" />
-                                <string name="gordura" description="Valor nutricional de gordura em gramas (tabela TACO)" />
-                            </object>
-                        </list>
-                        <string name="instrucoes" description="Passos para preparo" />
-                    </object>
-                </list>
-                <list name="dicas" description="Dicas de nutrição e estilo de vida">
-                    <string />
-                </list>
-                <string name="observacoes" description="Observações adicionais" />
-            </object>
-        </output>
-    </rail>
-    """
-
-    # Geração do prompt com base nas informações recebidas
-    prompt = f"""
-    Você é um nutricionista profissional especializado em elaborar planos alimentares personalizados. Sua tarefa é fornecer um plano nutricional baseado nas seguintes informações:
-
-    - Idade: {idade}
-    - Peso: {peso}
-    - Altura: {altura}
-    - Gênero: {genero}
-    - Nível de Atividade: {nivel_atividade}
-    - Restrições Alimentares: {restricoes_alimentares}
-    - Objetivos: {objetivos}
-
-    O plano nutricional deve:
-
-    - Ser adequado às necessidades calóricas diárias calculadas com base nas informações fornecidas.
-    - Incluir a distribuição de macronutrientes (proteínas, carboidratos e gorduras) conforme recomendado para o objetivo especificado.
-    - Detalhar um plano de refeições composto por 5 refeições diárias: café da manhã, lanche da manhã, almoço, lanche da tarde e jantar.
-    - Fornecer receitas para cada refeição, incluindo ingredientes e instruções de preparo.
-    - Os ingredientes devem ser apresentados com seus valores nutricionais (proteína, carboidrato, gordura) em gramas, conforme a tabela TACO.
-    - Incluir 3 dicas adicionais para auxiliar no alcance dos objetivos.
-
-    Certifique-se de seguir rigorosamente o formato solicitado e preencher todos os campos com informações precisas.
-    """
-
-    try:
-        # Chamada à API da OpenAI atualizada
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a professional nutritionist specialized in creating personalized meal plans."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-
-        # Extraindo resposta gerada pela LLM como texto
-        if response.choices and len(response.choices) > 0:
-            plano_dieta_text = response.choices[0].message['content']
-        else:
-            raise ValueError("A resposta da API OpenAI não contém escolhas válidas.")
-    except Exception as e:
-        print(f"Erro ao chamar a API OpenAI: {e}")
-        raise e
-
-    # Gerando o PDF a partir do plano de dieta
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt="Plano de Dieta Personalizado", ln=True, align='C')
-
-    # Adicionando informações do plano ao PDF
-    pdf.multi_cell(0, 10, txt=plano_dieta_text)
-
-    # Salvando o PDF em um arquivo temporário
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-    pdf.output(temp_file.name)
-
-    return temp_file.name
+# Vários workers (gunicorn -w N, que também lê WEB_CONCURRENCY) precisam de
+# estado compartilhado para que qualquer um sirva o download do PDF e o cache:
+# "sqlite:///arquivo.db" na mesma máquina, "redis://host:6379/0" entre máquinas
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL") or (
+    "sqlite:///.cache/estado.db" if WEB_CONCURRENCY > 1 else ""
+)
+estado_compartilhado = criar_backend(SHARED_STATE_URL) if SHARED_STATE_URL else None
+
+# Cliente OpenAI compartilhado (chave lida de OPENAI_API_KEY)
+llm_client = get_client()
+
+# Cache de planos já gerados (memória + disco)
+plan_cache = PlanCache(
+    disk_dir=os.getenv("PLAN_CACHE_DIR", ".cache/planos"),
+    memory_size=int(os.getenv("PLAN_CACHE_MEMORY_SIZE", "256")),
+    ttl=float(os.getenv("PLAN_CACHE_TTL", str(7 * 24 * 3600))),
+    max_disk_bytes=int(os.getenv("PLAN_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+    backend=estado_compartilhado
+)
+
+# Triagem de objetivos/restrições antes de qualquer chamada à API
+filtro_entrada = InjectionFilter(
+    limiar=float(os.getenv("INJECTION_THRESHOLD", "0.9")),
+    tokens_resposta=2500,
+    custo_por_1k_tokens=float(os.getenv("LLM_COST_PER_1K_TOKENS", "0"))
+)
+
+# Renderização de PDF por template HTML/CSS, em um pool de processos
+pdf_renderer = PdfRenderer(
+    processes=int(os.getenv("PDF_PROCESSES", str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))))
+)
+
+# PDFs gerados ficam em memória (ou em PDF_STORE_DIR) com TTL e limite de
+# tamanho; com estado compartilhado, no backend, visível a todos os workers
+if estado_compartilhado is not None:
+    pdf_store = SharedBlobStore(estado_compartilhado, ttl=float(os.getenv("PDF_STORE_TTL", "3600")))
+else:
+    pdf_store = BlobStore(
+        max_bytes=int(os.getenv("PDF_STORE_MAX_BYTES", str(256 * 1024 * 1024))),
+        ttl=float(os.getenv("PDF_STORE_TTL", "3600")),
+        disk_dir=os.getenv("PDF_STORE_DIR") or None
+    )
+
+# Refeições já geradas, reaproveitadas nos planos semanais
+recipe_store = RecipeStore(path=os.getenv("RECIPE_STORE_PATH", ".cache/receitas.json"))
+atexit.register(recipe_store.salvar)
+
+# Pipeline compartilhado com o backend FastAPI: mesmo prompt, validação
+# pelo rail (guard só como fallback), PDF estruturado e cache de planos
+# (o guardrails só é importado no primeiro uso ou no aquecimento)
+guard = LazyResource(criar_guard, "guardrails (rail do plano)")
+# ENERGY_TARGETS=local: calorias, macros, água e fibras calculados por equação
+# antes do prompt (mais curto); "llm" devolve o cálculo ao modelo.
+# OUTPUT_FORMAT=compacto|estrito: resposta com chaves curtas, expandida aqui;
+# o estrito exige um modelo com saída estruturada (PLAN_MODEL, padrão gpt-4o)
+formato = os.getenv("OUTPUT_FORMAT", "json")
+gerador = PlanGenerator(
+    llm_client, plan_cache, pdf_renderer, namespace="plano", guard=guard,
+    model=os.getenv("PLAN_MODEL") or (MODELO_ESTRITO if formato == "estrito" else "gpt-4"),
+    metas_locais=os.getenv("ENERGY_TARGETS", "local") == "local", recipe_store=recipe_store,
+    formato=formato
+)
+
+# Aquecimento único por processo, em segundo plano; /ready responde 503 até terminar
+aquecimento = Warmup()
+aquecimento.add("pdf", pdf_renderer.start)
+aquecimento.add("guard", guard.get)
 
 # Endpoint Flask para receber requisições do frontend
 @app.route('/gerar_plano', methods=['POST'])
@@ -128,31 +101,116 @@ def gerar_plano():
         if not request_data:
             return jsonify({"error": "Invalid input data"}), 400
 
-        # Gera o plano de dieta e obtém o caminho do arquivo PDF
-        pdf_path = gerar_plano_dieta(
-            request_data.get("idade"),
-            request_data.get("peso"),
-            request_data.get("altura"),
-            request_data.get("genero"),
-            request_data.get("nivel_atividade"),
-            request_data.get("objetivos"),
-            request_data.get("restricoes_alimentares", "")
-        )
-        
+        permitido, motivo = filtro_entrada.verificar_campos(request_data)
+        if not permitido:
+            return jsonify({"error": f"Entrada rejeitada ({motivo})"}), 400
+
+        # Gera o plano de dieta e guarda o PDF no blob store para download
+        resultado = gerador.gerar(request_data)
+        pdf_id = pdf_store.put(resultado["pdf"])
+
         # Retornar um link para baixar o arquivo
-        return jsonify({"download_url": request.url_root + 'baixar_plano/' + os.path.basename(pdf_path)})
+        resposta = jsonify({"download_url": request.url_root + 'baixar_plano/' + pdf_id, "tempos": resultado["tempos"]})
+        resposta.headers["Server-Timing"] = server_timing(resultado["tempos"])
+        return resposta
 
+    except PerfilInvalido as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/gerar_plano_semanal', methods=['POST'])
+def gerar_plano_semanal():
+    try:
+        request_data = request.get_json()
+        if not request_data:
+            return jsonify({"error": "Invalid input data"}), 400
+
+        permitido, motivo = filtro_entrada.verificar_campos(request_data)
+        if not permitido:
+            return jsonify({"error": f"Entrada rejeitada ({motivo})"}), 400
+
+        # Opções por horário vêm do banco de refeições; o modelo só gera as que faltam
+        dias = request_data.get("dias", 7)
+        if not isinstance(dias, int) or not 1 <= dias <= 14:
+            return jsonify({"error": "dias deve estar entre 1 e 14"}), 400
+        resultado = gerador.gerar_semana(request_data, dias, int(os.getenv("RECIPE_VARIETY", "3")))
+        pdf_id = pdf_store.put(resultado["pdf"])
+
+        resposta = jsonify({
+            "download_url": request.url_root + 'baixar_plano/' + pdf_id,
+            "plano_semanal": resultado["plano_semanal"],
+            "refeicoes_novas": resultado["refeicoes_novas"],
+            "refeicoes_reutilizadas": resultado["refeicoes_reutilizadas"],
+            "tempos": resultado["tempos"]
+        })
+        resposta.headers["Server-Timing"] = server_timing(resultado["tempos"])
+        return resposta
+
+    except (PerfilInvalido, RefeicaoInvalida) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/baixar_plano/<filename>', methods=['GET'])
 def baixar_plano(filename):
     try:
-        file_path = os.path.join(tempfile.gettempdir(), filename)
-        return send_file(file_path, as_attachment=True, download_name="plano_dieta.pdf")
+        path = pdf_store.path(filename)
+        if path is not None:
+            # Em disco: o servidor WSGI pode usar sendfile (wsgi.file_wrapper)
+            return send_file(path, as_attachment=True, download_name="plano_dieta.pdf")
+        pdf_bytes = pdf_store.get(filename)
+        if pdf_bytes is None:
+            return jsonify({"error": "Plano não encontrado ou expirado"}), 404
+        return send_file(io.BytesIO(pdf_bytes), mimetype="application/pdf", as_attachment=True, download_name="plano_dieta.pdf")
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(plan_cache.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    conteudo, content_type = gerar_metricas()
+    return Response(conteudo, mimetype=content_type)
+
+@app.before_request
+def iniciar_medicao():
+    g.prefixo = "/" + request.path.strip("/").split("/")[0]
+    g.inicio = time.perf_counter()
+    EM_ANDAMENTO.labels(g.prefixo).inc()
+
+@app.after_request
+def registrar_medicao(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else g.prefixo
+    REQUISICAO_SEGUNDOS.labels(endpoint, str(response.status_code)).observe(time.perf_counter() - g.inicio)
+    return response
+
+@app.teardown_request
+def encerrar_medicao(exc):
+    if "prefixo" in g:
+        EM_ANDAMENTO.labels(g.prefixo).dec()
+
+@app.route('/filtro/stats', methods=['GET'])
+def filtro_stats():
+    return jsonify(filtro_entrada.stats())
+
+@app.route('/health', methods=['GET'])
+def health():
+    # Liveness: o processo responde, mesmo ainda aquecendo
+    return jsonify({"status": "ok"})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    # Readiness: só recebe tráfego depois do aquecimento
+    stats = aquecimento.stats()
+    return jsonify(stats), 200 if stats["pronto"] else 503
+
+# Iniciado na importação: cada worker (ex.: gunicorn sem --preload) aquece o seu
+aquecimento.start()
+
 if __name__ == "__main__":
-    # Executa o servidor Flask
+    # Servidor de desenvolvimento (um processo). Em produção, com vários workers:
+    #   SHARED_STATE_URL=redis://host:6379/0 gunicorn -w 4 -b 0.0.0.0:5000 app:app
     app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,4 @@
+"""
+Código compartilhado entre os backends de geração de planos de dieta
+(flask-nutricional e weasyprint).
+"""
@@ -0,0 +1,174 @@
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+_NOME_BLOB = re.compile(r"^([0-9a-f]{32})\.pdf$")
+
+
+class BlobStore:
+    """
+    Armazenamento limitado de PDFs gerados, com expiração (TTL) e limite
+    total de bytes. Sem `disk_dir` os PDFs ficam só em memória; com
+    `disk_dir` ficam em arquivos, para serem enviados com sendfile, e os
+    arquivos de execuções anteriores são recarregados (ou removidos, se
+    expirados) na inicialização. Um PDF maior que `max_bytes` é recusado
+    com ValueError.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=3600, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._blobs = OrderedDict()  # blob_id -> (bytes ou caminho, tamanho, criado_em)
+        self._total = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._carregar()
+
+    def _carregar(self):
+        # Downloads ainda válidos continuam disponíveis depois de um reinício
+        encontrados = []
+        for arquivo in os.scandir(self.disk_dir):
+            nome = _NOME_BLOB.match(arquivo.name)
+            if nome is None:
+                continue
+            try:
+                info = arquivo.stat()
+            except OSError:
+                continue
+            encontrados.append((info.st_mtime, nome.group(1), arquivo.path, info.st_size))
+        with self._lock:
+            for criado_em, blob_id, caminho, tamanho in sorted(encontrados):
+                self._blobs[blob_id] = (caminho, tamanho, criado_em)
+                self._total += tamanho
+            removidos = self._evict()
+        self._remover_arquivos(removidos)
+        if encontrados:
+            logging.info(f"{len(self._blobs)} PDFs recarregados de {self.disk_dir}")
+
+    def put(self, data):
+        tamanho = len(data)
+        if tamanho > self.max_bytes:
+            # Seria removido pelo próprio limite e o id retornado daria 404
+            raise ValueError(f"PDF de {tamanho} bytes acima do limite de {self.max_bytes}")
+        blob_id = uuid.uuid4().hex
+        if self.disk_dir:
+            conteudo = os.path.join(self.disk_dir, f"{blob_id}.pdf")
+            with open(conteudo, "wb") as f:
+                f.write(data)
+        else:
+            conteudo = bytes(data)
+
+        with self._lock:
+            self._blobs[blob_id] = (conteudo, tamanho, time.time())
+            self._total += tamanho
+            removidos = self._evict()
+        self._remover_arquivos(removidos)
+        return blob_id
+
+    def _entrada(self, blob_id):
+        with self._lock:
+            entrada = self._blobs.get(blob_id)
+            if entrada is None:
+                return None
+            if time.time() - entrada[2] > self.ttl:
+                self._pop(blob_id)
+                removido = entrada[0]
+            else:
+                return entrada
+        self._remover_arquivos([removido])
+        return None
+
+    def get(self, blob_id):
+        """Conteúdo do PDF em bytes, ou None se não existir/expirou."""
+        entrada = self._entrada(blob_id)
+        if entrada is None:
+            return None
+        if self.disk_dir:
+            try:
+                with open(entrada[0], "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                return None
+        return entrada[0]
+
+    def path(self, blob_id):
+        """Caminho do arquivo em disco (apenas com `disk_dir`)."""
+        if not self.disk_dir:
+            return None
+        entrada = self._entrada(blob_id)
+        return entrada[0] if entrada is not None else None
+
+    def stats(self):
+        with self._lock:
+            return {"blobs": len(self._blobs), "bytes": self._total, "max_bytes": self.max_bytes}
+
+    def _pop(self, blob_id):
+        conteudo, tamanho, _ = self._blobs.pop(blob_id)
+        self._total -= tamanho
+        return conteudo
+
+    def _evict(self):
+        # Chamado com o lock: remove expirados e, depois, os mais antigos
+        removidos = []
+        limite = time.time() - self.ttl
+        while self._blobs:
+            blob_id, (_, _, criado_em) = next(iter(self._blobs.items()))
+            if criado_em >= limite and self._total <= self.max_bytes:
+                break
+            removidos.append(self._pop(blob_id))
+        return removidos
+
+    def _remover_arquivos(self, removidos):
+        if not self.disk_dir:
+            return
+        for caminho in removidos:
+            try:
+                os.remove(caminho)
+            except OSError as e:
+                logging.warning(f"Não foi possível remover {caminho}: {e}")
+
+
+class SharedBlobStore:
+    """
+    PDFs em um backend de estado compartilhado (nutricional_core.compartilhado),
+    para que qualquer worker ou réplica sirva o download. Mesma interface do
+    BlobStore; a expiração e o limite total ficam a cargo do backend (TTL
+    e, no SQLite, SHARED_STATE_MAX_BYTES).
+    """
+
+    def __init__(self, backend, ttl=3600, max_blob_bytes=32 * 1024 * 1024):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_blob_bytes = max_blob_bytes
+        self._lock = threading.Lock()
+        self.metrics = {"puts": 0, "gets": 0, "misses": 0, "bytes": 0}
+
+    def put(self, data):
+        if len(data) > self.max_blob_bytes:
+            raise ValueError(f"PDF de {len(data)} bytes acima do limite de {self.max_blob_bytes}")
+        blob_id = uuid.uuid4().hex
+        self.backend.set(f"blob:{blob_id}", data, ttl=self.ttl)
+        with self._lock:
+            self.metrics["puts"] += 1
+            self.metrics["bytes"] += len(data)
+        return blob_id
+
+    def get(self, blob_id):
+        data = self.backend.get(f"blob:{blob_id}")
+        with self._lock:
+            self.metrics["gets" if data is not None else "misses"] += 1
+        return data
+
+    def path(self, blob_id):
+        # Nada em disco local: o download sai sempre de `get`
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {**self.metrics, "backend": type(self.backend).__name__}
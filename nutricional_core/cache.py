@@ -0,0 +1,285 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Tamanho dos "baldes" usados para arredondar peso (kg) e altura (cm)
+PESO_BUCKET = float(os.getenv("PLAN_CACHE_PESO_BUCKET", "1"))
+ALTURA_BUCKET = float(os.getenv("PLAN_CACHE_ALTURA_BUCKET", "1"))
+
+# Valores de restrição que significam "nenhuma restrição"
+SEM_RESTRICAO = {"", "nenhuma", "nenhum", "nao", "sem restricoes", "sem restricao", "n/a", "-"}
+
+
+def remover_acentos(texto):
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def normalizar_texto(texto):
+    if texto is None:
+        return ""
+    return " ".join(remover_acentos(str(texto)).lower().split())
+
+
+def normalizar_restricoes(restricoes):
+    texto = normalizar_texto(restricoes)
+    for separador in [";", "/", " e ", "\n"]:
+        texto = texto.replace(separador, ",")
+    itens = {item.strip(" .") for item in texto.split(",")}
+    return ", ".join(sorted(item for item in itens if item not in SEM_RESTRICAO))
+
+
+def arredondar(valor, bucket):
+    return round(round(float(valor) / bucket) * bucket, 2)
+
+
+def normalizar_perfil(perfil):
+    """Forma canônica do perfil, usada para montar a chave do cache."""
+    return {
+        "idade": int(float(perfil["idade"])),
+        "peso": arredondar(perfil["peso"], PESO_BUCKET),
+        "altura": arredondar(perfil["altura"], ALTURA_BUCKET),
+        "genero": normalizar_texto(perfil["genero"]),
+        "nivel_atividade": normalizar_texto(perfil["nivel_atividade"]).replace(" ", "_"),
+        "objetivos": normalizar_texto(perfil["objetivos"]).replace(" ", "_"),
+        "restricoes_alimentares": normalizar_restricoes(perfil.get("restricoes_alimentares")),
+    }
+
+
+def chave_perfil(perfil, namespace=""):
+    """
+    Hash SHA-256 do perfil normalizado. O namespace separa entradas geradas
+    por prompts diferentes (ex.: backend Flask e FastAPI).
+    """
+    conteudo = json.dumps(
+        {"namespace": namespace, "perfil": normalizar_perfil(perfil)},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """
+    Cache de planos gerados em dois níveis: LRU em memória e diretório em
+    disco com TTL e limite de tamanho. Cada entrada guarda o plano validado
+    e o PDF renderizado. Com `backend` (nutricional_core.compartilhado), há
+    um nível compartilhado entre a memória e o disco, visto por todos os
+    workers e réplicas. O tamanho ocupado em disco é mantido em um índice
+    (montado uma vez na inicialização) e só passa do limite com gravações
+    deste processo; a remoção das entradas mais antigas só roda nesse caso.
+    """
+
+    def __init__(
+        self, disk_dir=None, memory_size=256, ttl=7 * 24 * 3600, max_disk_bytes=512 * 1024 * 1024, backend=None
+    ):
+        self.disk_dir = disk_dir
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self.backend = backend
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()  # key -> (tamanho, mtime), mais antigas primeiro
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.metrics = {
+            "memory_hits": 0,
+            "shared_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._index_disk()
+
+    def get(self, key):
+        agora = time.time()
+        with self._lock:
+            entrada = self._memory.get(key)
+            if entrada is not None:
+                if agora - entrada["created_at"] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.metrics["memory_hits"] += 1
+                    return entrada
+                del self._memory[key]
+
+        nivel = "shared_hits"
+        entrada = self._get_shared(key)
+        if entrada is None:
+            nivel = "disk_hits"
+            entrada = self._get_disk(key, agora)
+        with self._lock:
+            if entrada is None:
+                self.metrics["misses"] += 1
+                return None
+            self.metrics[nivel] += 1
+            self._put_memory(key, entrada)
+        return entrada
+
+    def put(self, key, plano, pdf):
+        entrada = {"plano": plano, "pdf": bytes(pdf), "created_at": time.time()}
+        with self._lock:
+            self._put_memory(key, entrada)
+            self.metrics["stores"] += 1
+        self._put_shared(key, entrada)
+        if self.disk_dir:
+            try:
+                tamanho = self._put_disk(key, entrada)
+                with self._lock:
+                    self._add_disk(key, tamanho, time.time())
+                    removidas = self._evict_disk()
+                for removida in removidas:
+                    self._remove_files(removida)
+            except OSError as e:
+                logging.error(f"Erro ao gravar cache em disco: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = len(self._disk)
+            stats["disk_bytes"] = self._disk_bytes
+        hits = stats["memory_hits"] + stats["shared_hits"] + stats["disk_hits"]
+        total = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / total, 4) if total else 0.0
+        return stats
+
+    def _put_memory(self, key, entrada):
+        self._memory[key] = entrada
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _get_shared(self, key):
+        if self.backend is None:
+            return None
+        try:
+            meta = self.backend.get(f"plano:{key}")
+            pdf = self.backend.get(f"plano-pdf:{key}") if meta is not None else None
+        except Exception as e:
+            logging.error(f"Erro ao ler cache compartilhado: {e}")
+            return None
+        if pdf is None:
+            return None
+        meta = json.loads(meta)
+        return {"plano": meta["plano"], "pdf": pdf, "created_at": meta["created_at"]}
+
+    def _put_shared(self, key, entrada):
+        if self.backend is None:
+            return
+        restante = self.ttl - (time.time() - entrada["created_at"])
+        meta = json.dumps({"plano": entrada["plano"], "created_at": entrada["created_at"]}, ensure_ascii=False)
+        try:
+            # PDF antes do plano: a entrada só existe quando o plano aparece
+            self.backend.set(f"plano-pdf:{key}", entrada["pdf"], ttl=restante)
+            self.backend.set(f"plano:{key}", meta.encode("utf-8"), ttl=restante)
+        except Exception as e:
+            logging.error(f"Erro ao gravar cache compartilhado: {e}")
+
+    def _paths(self, key):
+        pasta = os.path.join(self.disk_dir, key[:2])
+        return os.path.join(pasta, f"{key}.json"), os.path.join(pasta, f"{key}.pdf")
+
+    def _get_disk(self, key, agora):
+        if not self.disk_dir:
+            return None
+        json_path, pdf_path = self._paths(key)
+        try:
+            if agora - os.path.getmtime(json_path) > self.ttl:
+                self._remove_disk(key)
+                return None
+            with open(json_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(pdf_path, "rb") as f:
+                pdf = f.read()
+        except (OSError, ValueError):
+            return None
+        return {"plano": meta["plano"], "pdf": pdf, "created_at": meta["created_at"]}
+
+    def _put_disk(self, key, entrada):
+        json_path, pdf_path = self._paths(key)
+        os.makedirs(os.path.dirname(json_path), exist_ok=True)
+        # Grava o PDF antes do JSON: a entrada só existe quando o JSON aparece
+        tmp_pdf = f"{pdf_path}.{os.getpid()}.tmp"
+        with open(tmp_pdf, "wb") as f:
+            f.write(entrada["pdf"])
+        os.replace(tmp_pdf, pdf_path)
+        tmp_json = f"{json_path}.{os.getpid()}.tmp"
+        with open(tmp_json, "w", encoding="utf-8") as f:
+            json.dump({"plano": entrada["plano"], "created_at": entrada["created_at"]}, f, ensure_ascii=False)
+        os.replace(tmp_json, json_path)
+        return len(entrada["pdf"]) + os.path.getsize(json_path)
+
+    def _remove_disk(self, key):
+        with self._lock:
+            self._pop_disk(key)
+        self._remove_files(key)
+
+    def _remove_files(self, key):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _add_disk(self, key, tamanho, mtime):
+        # Chamado com o lock
+        self._pop_disk(key)
+        self._disk[key] = (tamanho, mtime)
+        self._disk_bytes += tamanho
+
+    def _pop_disk(self, key):
+        # Chamado com o lock
+        entrada = self._disk.pop(key, None)
+        if entrada is not None:
+            self._disk_bytes -= entrada[0]
+
+    def _index_disk(self):
+        # Uma varredura na inicialização: entradas já gravadas (inclusive por
+        # outras execuções) contam no limite; as expiradas são removidas
+        agora = time.time()
+        entradas = []
+        for pasta in os.scandir(self.disk_dir):
+            if not pasta.is_dir():
+                continue
+            for arquivo in os.scandir(pasta.path):
+                if not arquivo.name.endswith(".json"):
+                    continue
+                key = arquivo.name[:-5]
+                _, pdf_path = self._paths(key)
+                try:
+                    mtime = arquivo.stat().st_mtime
+                    tamanho = arquivo.stat().st_size + os.path.getsize(pdf_path)
+                except OSError:
+                    continue
+                if agora - mtime > self.ttl:
+                    self._remove_files(key)
+                    continue
+                entradas.append((mtime, key, tamanho))
+        with self._lock:
+            for mtime, key, tamanho in sorted(entradas):
+                self._add_disk(key, tamanho, mtime)
+            removidas = self._evict_disk()
+        for key in removidas:
+            self._remove_files(key)
+
+    def _evict_disk(self):
+        # Chamado com o lock: remove expiradas e, depois, as mais antigas até
+        # caber no limite; retorna as chaves cujos arquivos devem ser apagados
+        removidas = []
+        limite = time.time() - self.ttl
+        while self._disk:
+            key, (_, mtime) = next(iter(self._disk.items()))
+            if mtime >= limite and self._disk_bytes <= self.max_disk_bytes:
+                break
+            self._pop_disk(key)
+            removidas.append(key)
+        self.metrics["evictions"] += len(removidas)
+        return removidas
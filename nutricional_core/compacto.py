@@ -0,0 +1,170 @@
+"""
+Formato compacto da resposta do modelo.
+
+No formato JSON completo o modelo repete, para cada ingrediente de cada
+refeição, chaves longas ("carboidrato", "Consumo de fibras"...), e cada
+uma delas custa tokens de saída e tempo de geração. No formato compacto
+as chaves do plano são curtas, as refeições vêm em ordem fixa como listas
+[nome, ingredientes, instruções] e cada ingrediente é uma lista
+[nome, quantidade, proteína, carboidrato, gordura] com os macros em
+gramas (só [nome, quantidade] no modo TACO):
+
+    {"kcal": "2600 kcal", "macro": "...", "agua": "3000 ml", "fibra": "30 g",
+     "sup": "...", "det": "...",
+     "r": [["Omelete", [["Ovo", "100 g", 13, 1.1, 9.5]], "Bata e frite."], ...],
+     "dicas": ["..."], "obs": "..."}
+
+`expandir` reconstrói o plano_dieta completo no servidor, antes da
+validação pelo rail e do PDF. `response_format` gera o JSON Schema estrito
+do formato, para provedores com saída estruturada (formato "estrito"); os
+modelos sem ela (gpt-4, gpt-3.5...) respondem 400 a esse parâmetro.
+"""
+from nutricional_core.metas import DISTRIBUICAO_REFEICOES
+from nutricional_core.schema import SchemaError
+
+# "json" (plano completo), "compacto" (chaves curtas e listas posicionais)
+# ou "estrito" (compacto com JSON Schema estrito na API)
+FORMATOS = ("json", "compacto", "estrito")
+
+# Chave curta -> campo do plano_dieta
+CAMPOS_METAS = (
+    ("kcal", "calorias"),
+    ("macro", "macronutrientes"),
+    ("agua", "Consumo de água"),
+    ("fibra", "Consumo de fibras"),
+)
+CAMPOS = CAMPOS_METAS + (
+    ("sup", "Suplementação"),
+    ("dicas", "dicas"),
+    ("obs", "observacoes"),
+)
+MACROS = ("proteina", "carboidrato", "gordura")
+
+# Modelos com saída estruturada (response_format json_schema), por prefixo
+MODELOS_ESTRITO = ("gpt-4o", "gpt-4.1", "gpt-5", "o3", "o4")
+# Modelo usado pelos apps no formato estrito quando nenhum é configurado
+MODELO_ESTRITO = "gpt-4o"
+
+
+def suporta_estrito(modelo):
+    return modelo.startswith(MODELOS_ESTRITO)
+
+
+def _gramas(valor):
+    # Só o número, como os demais macros do plano; a unidade fica com o PDF
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f"{valor:g}"
+    return str(valor)
+
+
+def _numero(valor):
+    """ "12.5 g" -> 12.5; o que não for número fica como texto."""
+    try:
+        return float(str(valor).lower().replace("g", "").replace(",", ".").strip())
+    except ValueError:
+        return valor
+
+
+def _horario(indice):
+    if indice < len(DISTRIBUICAO_REFEICOES):
+        return DISTRIBUICAO_REFEICOES[indice][0]
+    return f"REFEIÇÃO {indice + 1}"
+
+
+def _expandir_ingrediente(item, caminho):
+    if isinstance(item, dict):
+        return item
+    if not isinstance(item, list) or not item:
+        raise SchemaError(f"{caminho}: ingrediente deve ser uma lista [nome, quantidade, ...]")
+    ingrediente = {"nome": str(item[0])}
+    if len(item) > 1 and item[1] not in (None, ""):
+        ingrediente["quantidade"] = str(item[1])
+    for campo, valor in zip(MACROS, item[2:5]):
+        ingrediente[campo] = _gramas(valor)
+    return ingrediente
+
+
+def _expandir_refeicao(item, indice):
+    caminho = f"$.r[{indice}]"
+    if not isinstance(item, list) or len(item) != 3:
+        raise SchemaError(f"{caminho}: refeição deve ser [nome, ingredientes, instruções]")
+    nome, ingredientes, instrucoes = item
+    if not isinstance(ingredientes, list):
+        raise SchemaError(f"{caminho}[1]: ingredientes devem ser uma lista")
+    return {
+        "refeicao": _horario(indice),
+        "nome": str(nome),
+        "ingredientes": [
+            _expandir_ingrediente(ingrediente, f"{caminho}[1][{i}]") for i, ingrediente in enumerate(ingredientes)
+        ],
+        "instrucoes": str(instrucoes),
+    }
+
+
+def expandir(compacto):
+    """Formato compacto -> {"plano_dieta": {...}} no formato do rail."""
+    if not isinstance(compacto, dict):
+        raise SchemaError("$: esperado um objeto no formato compacto")
+    if "plano_dieta" in compacto:
+        return compacto  # O modelo respondeu no formato completo
+    refeicoes = compacto.get("r")
+    if not isinstance(refeicoes, list):
+        raise SchemaError("$.r: esperada a lista de refeições")
+
+    plano_dieta = {campo: compacto[curta] for curta, campo in CAMPOS if curta in compacto}
+    if "det" in compacto:
+        plano_dieta["plano_refeicoes"] = {"detalhamento": compacto["det"]}
+    plano_dieta["refeições"] = [_expandir_refeicao(item, i) for i, item in enumerate(refeicoes)]
+    return {"plano_dieta": plano_dieta}
+
+
+def compactar(plano_dieta, macro_source="llm", metas_locais=False):
+    """Inverso de `expandir` (benchmarks, testes e o LLM falso)."""
+    campos = CAMPOS if not metas_locais else CAMPOS[len(CAMPOS_METAS):]
+    compacto = {curta: plano_dieta[campo] for curta, campo in campos if campo in plano_dieta}
+    compacto["det"] = plano_dieta.get("plano_refeicoes", {}).get("detalhamento", "")
+    compacto["r"] = [
+        [
+            refeicao["nome"],
+            [
+                [i["nome"], i.get("quantidade", "")]
+                + ([] if macro_source == "taco" else [_numero(i.get(campo)) for campo in MACROS])
+                for i in refeicao["ingredientes"]
+            ],
+            refeicao["instrucoes"],
+        ]
+        for refeicao in plano_dieta["refeições"]
+    ]
+    return compacto
+
+
+def response_format(macro_source="llm", metas_locais=False):
+    """`response_format` da API de chat com o JSON Schema estrito do formato compacto."""
+    texto = {"type": "string"}
+    campo = {"anyOf": [{"type": "string"}, {"type": "number"}]}
+    ingrediente = {"type": "array", "items": texto if macro_source == "taco" else campo}
+    refeicao = {
+        "type": "array",
+        "items": {"anyOf": [texto, {"type": "array", "items": ingrediente}]},
+    }
+    propriedades = {} if metas_locais else {curta: texto for curta, _ in CAMPOS_METAS}
+    propriedades.update({
+        "sup": texto,
+        "det": texto,
+        "r": {"type": "array", "items": refeicao},
+        "dicas": {"type": "array", "items": texto},
+        "obs": texto,
+    })
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "plano_compacto",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": propriedades,
+                "required": list(propriedades),
+                "additionalProperties": False,
+            },
+        },
+    }
@@ -0,0 +1,178 @@
+"""
+Estado compartilhado entre workers e réplicas dos apps.
+
+Com mais de um processo (uvicorn --workers, gunicorn -w) ou mais de uma
+máquina, o PDF gerado em um worker precisa poder ser baixado em outro, o
+job criado em um precisa ser consultado em qualquer um, e o cache de planos
+deve valer para todos. Os backends abaixo guardam pares chave -> bytes com
+TTL opcional e têm a mesma interface (`get`, `set`, `delete`):
+
+- `MemoryBackend`: dict em memória, só para um processo (e testes);
+- `SqliteBackend`: arquivo SQLite (modo WAL), para vários workers na mesma
+  máquina, com limite total de bytes (SHARED_STATE_MAX_BYTES);
+- `RedisBackend`: Redis ou compatível (KeyDB, Valkey...), para várias
+  máquinas; o pacote `redis` só é importado quando usado, e o limite de
+  memória é o do servidor (maxmemory com uma política volatile-*).
+
+`criar_backend(url)` escolhe pelo esquema: "memory://",
+"sqlite:///caminho/estado.db" ou "redis://host:6379/0".
+"""
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+# Tamanho máximo do arquivo SQLite (valores somados); 0 = sem limite
+SQLITE_MAX_BYTES = int(os.getenv("SHARED_STATE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._dados = {}  # chave -> (valor, expira_em ou None)
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is None:
+                return None
+            valor, expira_em = entrada
+            if expira_em is not None and expira_em <= time.time():
+                del self._dados[chave]
+                return None
+            return valor
+
+    def set(self, chave, valor, ttl=None):
+        expira_em = time.time() + ttl if ttl else None
+        with self._lock:
+            self._dados[chave] = (bytes(valor), expira_em)
+
+    def delete(self, chave):
+        with self._lock:
+            self._dados.pop(chave, None)
+
+
+class SqliteBackend:
+    """
+    Tabela chave/valor em um arquivo SQLite compartilhado pelos processos da
+    máquina. Uma conexão por processo e thread. A limpeza remove os
+    expirados e, acima de `max_bytes`, as entradas mais próximas de expirar;
+    roda a cada `limpar_a_cada` gravações, a cada `intervalo_limpeza`
+    segundos com gravações, ou quando o processo já gravou 10% de
+    `max_bytes` desde a última.
+    """
+
+    def __init__(self, path, limpar_a_cada=500, max_bytes=None, intervalo_limpeza=60.0):
+        self.path = path
+        self.limpar_a_cada = limpar_a_cada
+        self.max_bytes = max_bytes
+        self.intervalo_limpeza = intervalo_limpeza
+        self._local = threading.local()
+        # Contadores de limpeza, compartilhados pelas threads do processo
+        self._lock = threading.Lock()
+        self._gravacoes = 0
+        self._bytes_gravados = 0
+        self._ultima_limpeza = time.monotonic()
+        diretorio = os.path.dirname(os.path.abspath(path))
+        os.makedirs(diretorio, exist_ok=True)
+        with self._conexao() as conexao:
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS estado (chave TEXT PRIMARY KEY, valor BLOB NOT NULL, expira_em REAL)"
+            )
+
+    def _conexao(self):
+        # Conexões não sobrevivem a um fork: uma por pid
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None or self._local.pid != os.getpid():
+            conexao = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexao, self._local.pid = conexao, os.getpid()
+        return conexao
+
+    def get(self, chave):
+        linha = self._conexao().execute(
+            "SELECT valor FROM estado WHERE chave = ? AND (expira_em IS NULL OR expira_em > ?)",
+            (chave, time.time()),
+        ).fetchone()
+        return bytes(linha[0]) if linha is not None else None
+
+    def set(self, chave, valor, ttl=None):
+        expira_em = time.time() + ttl if ttl else None
+        conexao = self._conexao()
+        conexao.execute(
+            "INSERT OR REPLACE INTO estado (chave, valor, expira_em) VALUES (?, ?, ?)",
+            (chave, sqlite3.Binary(bytes(valor)), expira_em),
+        )
+        with self._lock:
+            self._gravacoes += 1
+            self._bytes_gravados += len(valor)
+            limpar = (
+                self._gravacoes % self.limpar_a_cada == 0
+                or time.monotonic() - self._ultima_limpeza >= self.intervalo_limpeza
+                or (self.max_bytes and self._bytes_gravados >= self.max_bytes / 10)
+            )
+            if limpar:
+                self._bytes_gravados = 0
+                self._ultima_limpeza = time.monotonic()
+        if limpar:
+            self.limpar(conexao)
+
+    def limpar(self, conexao=None):
+        conexao = conexao or self._conexao()
+        removidos = conexao.execute("DELETE FROM estado WHERE expira_em <= ?", (time.time(),)).rowcount
+        if removidos:
+            logging.info(f"Estado compartilhado: {removidos} entradas expiradas removidas")
+        if not self.max_bytes:
+            return
+        total = conexao.execute("SELECT COALESCE(SUM(LENGTH(valor)), 0) FROM estado").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # As que expiram primeiro saem primeiro; as sem TTL por último
+        excesso, remover = total - self.max_bytes, []
+        for chave, tamanho in conexao.execute(
+            "SELECT chave, LENGTH(valor) FROM estado ORDER BY expira_em IS NULL, expira_em, rowid"
+        ):
+            if excesso <= 0:
+                break
+            remover.append((chave,))
+            excesso -= tamanho
+        conexao.executemany("DELETE FROM estado WHERE chave = ?", remover)
+        logging.info(f"Estado compartilhado: {len(remover)} entradas removidas pelo limite de {self.max_bytes} bytes")
+
+    def delete(self, chave):
+        self._conexao().execute("DELETE FROM estado WHERE chave = ?", (chave,))
+
+
+class RedisBackend:
+    """Redis (ou compatível); `cliente` permite passar uma conexão já criada."""
+
+    def __init__(self, url=None, prefixo="nutricional:", cliente=None):
+        if cliente is None:
+            import redis
+
+            cliente = redis.Redis.from_url(url)
+        self.cliente = cliente
+        self.prefixo = prefixo
+
+    def get(self, chave):
+        return self.cliente.get(self.prefixo + chave)
+
+    def set(self, chave, valor, ttl=None):
+        self.cliente.set(self.prefixo + chave, bytes(valor), px=math.ceil(ttl * 1000) if ttl else None)
+
+    def delete(self, chave):
+        self.cliente.delete(self.prefixo + chave)
+
+
+def criar_backend(url):
+    """Backend pelo esquema da URL (memory://, sqlite:///caminho, redis://...)."""
+    if not url or url == "memory://":
+        return MemoryBackend()
+    if url.startswith("sqlite:///"):
+        return SqliteBackend(url[len("sqlite:///"):], max_bytes=SQLITE_MAX_BYTES or None)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Backend de estado compartilhado desconhecido: {url}")
@@ -0,0 +1,106 @@
+"""
+Tempo gasto em cada etapa de uma requisição (LLM, parse, guard, PDF...).
+
+`coletar()` abre um coletor no contexto atual e `etapa(nome)` soma o tempo
+do bloco nele; fora de um coletor, `etapa` só avisa os observadores. Os
+tempos voltam na resposta (campo "tempos" e cabeçalho Server-Timing), e os
+observadores (ex.: métricas Prometheus) recebem cada etapa e o uso de tokens.
+"""
+import contextvars
+import logging
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+
+_atual = contextvars.ContextVar("etapas", default=None)
+
+# Fração das requisições com entrada e resposta da LLM registradas no log
+LOG_PAYLOAD_SAMPLE = float(os.getenv("LOG_PAYLOAD_SAMPLE", "0"))
+
+# Funções chamadas a cada etapa concluída (nome, segundos), a cada
+# resposta da LLM (modelo, tokens do prompt, tokens da resposta) e ao fim
+# de cada requisição (coletor, campos)
+observadores_etapa = []
+observadores_tokens = []
+observadores_requisicao = []
+
+
+class Etapas:
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.tempos = {}  # nome -> segundos
+        self.spans = []  # (nome, início relativo, duração), em segundos
+        self.tokens = {}  # modelo -> [prompt, resposta]
+        self._inicio = time.perf_counter()
+        # Se a entrada e a resposta da LLM desta requisição vão para o log
+        self.payload = LOG_PAYLOAD_SAMPLE > 0 and random.random() < LOG_PAYLOAD_SAMPLE
+
+    def adicionar(self, nome, segundos):
+        self.tempos[nome] = self.tempos.get(nome, 0.0) + segundos
+
+    def ms(self):
+        return {nome: round(segundos * 1000, 1) for nome, segundos in self.tempos.items()}
+
+    def server_timing(self):
+        return server_timing(self.ms())
+
+
+def server_timing(tempos):
+    """Cabeçalho Server-Timing a partir de {etapa: ms}."""
+    return ", ".join(f"{nome};dur={ms}" for nome, ms in tempos.items())
+
+
+def atual():
+    """Coletor da requisição em andamento, ou None."""
+    return _atual.get()
+
+
+@contextmanager
+def coletar():
+    etapas = Etapas()
+    token = _atual.set(etapas)
+    try:
+        yield etapas
+    finally:
+        _atual.reset(token)
+
+
+@contextmanager
+def etapa(nome):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        etapas = _atual.get()
+        if etapas is not None:
+            etapas.adicionar(nome, duracao)
+            etapas.spans.append((nome, inicio - etapas._inicio, duracao))
+        for observador in observadores_etapa:
+            observador(nome, duracao)
+
+
+def registrar_tokens(modelo, prompt, resposta):
+    """Uso de tokens de uma chamada à LLM, somado à requisição atual."""
+    etapas = _atual.get()
+    if etapas is not None:
+        uso = etapas.tokens.setdefault(modelo, [0, 0])
+        uso[0] += prompt
+        uso[1] += resposta
+    for observador in observadores_tokens:
+        observador(modelo, prompt, resposta)
+
+
+def concluir(coletor, **campos):
+    """Avisa os observadores do fim de uma requisição (ex.: métricas e log estruturado)."""
+    for observador in observadores_requisicao:
+        observador(coletor, campos)
+
+
+def log_payload(rotulo, conteudo):
+    """Registra entrada/resposta completas só nas requisições amostradas."""
+    coletor = _atual.get()
+    if coletor is not None and coletor.payload:
+        logging.info(f"[{coletor.trace_id}] {rotulo}: {conteudo}")
@@ -0,0 +1,595 @@
+"""
+Pipeline de geração do plano de dieta usado pelos backends Flask e FastAPI.
+
+perfil -> cache -> (metas locais) -> LLM -> parse -> (TACO) -> validação
+(schema compilado, guard só como fallback) -> totais -> PDF -> cache. `gerar()` é a fachada
+síncrona (Flask, fila de jobs, lote) e `agerar()` a assíncrona (FastAPI):
+a chamada à LLM não ocupa uma thread e o PDF é renderizado no pool de
+processos.
+"""
+import asyncio
+import contextvars
+import copy
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from nutricional_core.cache import chave_perfil, normalizar_texto
+from nutricional_core.compacto import FORMATOS, expandir, response_format, suporta_estrito
+from nutricional_core.etapas import coletar, concluir, etapa, log_payload
+from nutricional_core.metas import DISTRIBUICAO_REFEICOES, EQUACAO, campos_plano, metas_perfil
+from nutricional_core.perfil import validar_perfil
+from nutricional_core.prompts import (
+    RAIL_SPEC, mensagens_complementos, mensagens_plano, mensagens_refeicao, variaveis_plano
+)
+from nutricional_core.receitas import COMPLEMENTOS, id_refeicao
+from nutricional_core.schema import SchemaError, compilar_campo, compilar_rail, extrair_json
+from nutricional_core.taco import preencher_macros, preencher_refeicao
+from nutricional_core.totais import totais_plano
+
+
+def criar_guard(rail_spec=RAIL_SPEC):
+    """Guard do guardrails para o rail do plano (importado só quando usado)."""
+    from guardrails import Guard
+
+    return Guard.for_rail_string(rail_spec)
+
+
+# Complementos do plano quando o modelo não os devolve no formato pedido
+COMPLEMENTOS_PADRAO = {
+    "Suplementação": "Nenhuma",
+    "plano_refeicoes": {"detalhamento": ""},
+    "dicas": [],
+    "observacoes": "",
+}
+
+
+class RefeicaoInvalida(ValueError):
+    """Dia ou refeição inexistente no plano semanal enviado."""
+
+
+def plano_do_dia(plano_semanal, indice):
+    """Um dia do plano semanal no formato do plano_dieta (PDF, totais, schema)."""
+    comuns = {campo: valor for campo, valor in plano_semanal.items() if campo != "dias"}
+    return {**comuns, "refeições": plano_semanal["dias"][indice]["refeições"]}
+
+
+def normalizar_plano(documento):
+    # Alguns modelos devolvem "Refeições"; o rail e o PDF usam "refeições"
+    plano = documento.get("plano_dieta")
+    if isinstance(plano, dict) and "Refeições" in plano and "refeições" not in plano:
+        plano["refeições"] = plano.pop("Refeições")
+    return documento
+
+
+class PlanGenerator:
+    """
+    Gera planos a partir de um perfil. `gerar_documento(perfil, metas)`
+    permite trocar a chamada única à LLM por outro motor, desde que devolva
+    o documento `{"plano_dieta": ...}` já parseado; `paralelo` usa o motor
+    de uma chamada por refeição (`gerar_documento_paralelo`). Com
+    `metas_locais`, calorias, macros, água e fibras são calculados por
+    nutricional_core.metas (pela `equacao` de gasto basal) e o modelo recebe
+    um prompt curto só para montar o cardápio. Com um `recipe_store`, as refeições geradas
+    alimentam o banco usado pelos planos de vários dias. `formato` escolhe
+    como o modelo responde (nutricional_core.compacto): "json" completo,
+    "compacto" ou "estrito" (compacto com JSON Schema estrito na API, só
+    para modelos com saída estruturada).
+    """
+
+    def __init__(
+        self,
+        llm_client,
+        plan_cache,
+        pdf_renderer,
+        namespace,
+        model="gpt-4",
+        macro_source="llm",
+        guard=None,
+        gerar_documento=None,
+        rail_spec=RAIL_SPEC,
+        metas_locais=False,
+        recipe_store=None,
+        formato="json",
+        paralelo=False,
+        equacao=EQUACAO,
+    ):
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato de resposta desconhecido: {formato}")
+        if formato == "estrito" and not suporta_estrito(model):
+            raise ValueError(f"O formato estrito exige um modelo com saída estruturada; {model} não tem")
+        self.llm_client = llm_client
+        self.plan_cache = plan_cache
+        self.pdf_renderer = pdf_renderer
+        self.namespace = namespace
+        self.model = model
+        self.macro_source = macro_source
+        self.guard = guard
+        self.gerar_documento = gerar_documento
+        if paralelo and gerar_documento is None:
+            self.gerar_documento = self.gerar_documento_paralelo
+        self.metas_locais = metas_locais
+        self.recipe_store = recipe_store
+        self.formato = formato
+        self.equacao = equacao
+        # Validador rápido compilado do rail; o guard só é usado quando ele falha
+        self.validar_schema = compilar_rail(rail_spec)
+        self.validar_refeicao = compilar_campo(rail_spec, "plano_dieta", "refeições")
+
+    # Etapas
+
+    def metas(self, perfil):
+        """Metas calculadas localmente, ou None se o modelo as calcula."""
+        if not self.metas_locais:
+            return None
+        with etapa("metas"):
+            return metas_perfil(perfil, self.equacao)
+
+    def mensagens(self, perfil, metas=None):
+        return mensagens_plano(perfil, self.macro_source, metas, self.formato)
+
+    def opcoes_chat(self, metas=None):
+        """Parâmetros extras da chamada ao modelo (saída estruturada no formato estrito)."""
+        if self.formato != "estrito":
+            return {}
+        return {"response_format": response_format(self.macro_source, metas_locais=metas is not None)}
+
+    def variaveis(self, perfil, metas=None):
+        """Variáveis do prompt para as cadeias do LangChain (ex.: streaming)."""
+        return variaveis_plano(perfil, metas)
+
+    def chave(self, perfil):
+        # Metas locais (e o motor paralelo, que sempre as usa) dependem da
+        # equação: trocar ENERGY_EQUATION não reaproveita planos antigos
+        usa_equacao = self.metas_locais or self.gerar_documento == self.gerar_documento_paralelo
+        sufixo = ("-metas" if self.metas_locais else "") + (f"-{self.equacao}" if usa_equacao else "")
+        return chave_perfil(perfil, f"{self.namespace}-{self.macro_source}{sufixo}")
+
+    def buscar_cache(self, chave):
+        with etapa("cache"):
+            return self.plan_cache.get(chave)
+
+    def validar_texto(self, texto, metas=None, formato="json"):
+        """Parse (uma única vez) e validação do texto da LLM; retorna o plano_dieta."""
+        if formato != "json":
+            # O guard só conhece o formato completo: resposta compacta inválida é erro
+            with etapa("parse"):
+                documento = expandir(extrair_json(texto))
+            return self.validar_documento(documento, metas)
+        try:
+            with etapa("parse"):
+                documento = extrair_json(texto)
+        except ValueError as e:
+            logging.info(f"Resposta não é um JSON válido ({e}); usando o guard")
+            return self.validar_com_guard(texto, metas)
+        return self.validar_documento(documento, metas)
+
+    def validar_documento(self, documento, metas=None):
+        normalizar_plano(documento)
+        if metas is not None and isinstance(documento.get("plano_dieta"), dict):
+            # As metas calculadas prevalecem sobre o que o modelo tenha escrito
+            documento["plano_dieta"].update(campos_plano(metas))
+        if self.macro_source == "taco":
+            # Preenche os macros pela TACO antes da validação, que exige os campos
+            preenchidos = preencher_macros(documento.get("plano_dieta", {}), valor_ausente="n/d")
+            logging.info(f"Macros preenchidos pela TACO: {preenchidos} ingredientes")
+
+        try:
+            with etapa("guard"):
+                self.validar_schema(documento)
+        except SchemaError as e:
+            logging.info(f"Validação rápida falhou ({e}); usando o guard")
+            return self.validar_com_guard(json.dumps(documento, ensure_ascii=False), metas)
+
+        logging.info("JSON validado pelo schema compilado")
+        return documento["plano_dieta"]
+
+    def validar_com_guard(self, texto, metas=None):
+        if self.guard is None:
+            raise SchemaError("Resposta fora do formato do rail e nenhum guard configurado")
+        with etapa("guard"):
+            validated_output = self.guard(lambda: texto)
+        logging.info("JSON validado pelo guard")
+
+        # Dependendo da versão, o guard retorna o texto ou um ValidationOutcome
+        validated_output = getattr(validated_output, "validated_output", validated_output)
+        if isinstance(validated_output, str):
+            validated_output = json.loads(validated_output)
+        plano_dieta = normalizar_plano(validated_output)["plano_dieta"]
+        if metas is not None:
+            plano_dieta.update(campos_plano(metas))
+        return plano_dieta
+
+    def verificar_totais(self, plano_dieta):
+        with etapa("totais"):
+            totais = totais_plano(plano_dieta)
+        if not totais["consistente"]:
+            logging.warning(f"Plano inconsistente: {totais['diario']['calorias']} kcal calculadas, alvo {totais['calorias_alvo']}")
+        return totais
+
+    def render_pdf(self, plano_dieta, totais=None):
+        with etapa("pdf"):
+            return self.pdf_renderer.render(plano_dieta, totais)
+
+    def guardar(self, chave, plano_dieta, pdf_bytes, perfil=None, totais=None):
+        with etapa("cache"):
+            self.plan_cache.put(chave, plano_dieta, pdf_bytes)
+            if self.recipe_store is not None and perfil is not None:
+                self.recipe_store.adicionar_plano(plano_dieta, perfil, totais)
+
+    def do_cache(self, cached):
+        logging.info("Plano encontrado no cache")
+        return {
+            "plano_dieta": cached["plano"],
+            "totais": totais_plano(cached["plano"]),
+            "pdf": cached["pdf"],
+            "cache": "hit",
+        }
+
+    def finalizar(self, chave, texto, metas=None, perfil=None, formato="json", renderizar=True):
+        """Validação, totais, PDF e cache de um texto completo da LLM (ex.: vindo de um stream)."""
+        plano_dieta = self.validar_texto(texto, metas, formato)
+        totais = self.verificar_totais(plano_dieta)
+        return self._concluir(chave, plano_dieta, totais, perfil, renderizar)
+
+    def _concluir(self, chave, plano_dieta, totais, perfil, renderizar=True):
+        if not renderizar:
+            # PDF e cache ficam para renderizar_lote
+            return {"plano_dieta": plano_dieta, "totais": totais, "pdf": None, "cache": "miss", "pendente": (chave, perfil)}
+        pdf_bytes = self.render_pdf(plano_dieta, totais)
+        self.guardar(chave, plano_dieta, pdf_bytes, perfil, totais)
+        return {"plano_dieta": plano_dieta, "totais": totais, "pdf": pdf_bytes, "cache": "miss"}
+
+    def renderizar_lote(self, resultados):
+        """
+        Completa os resultados de `gerar(..., renderizar=False)`: os PDFs
+        ainda não gerados saem em uma única chamada a render_many e vão
+        para o cache. Altera e retorna a própria lista.
+        """
+        pendentes = [resultado for resultado in resultados if resultado["pdf"] is None]
+        pdfs = self.pdf_renderer.render_many(
+            [resultado["plano_dieta"] for resultado in pendentes],
+            [resultado["totais"] for resultado in pendentes],
+        )
+        for resultado, pdf_bytes in zip(pendentes, pdfs):
+            chave, perfil = resultado.pop("pendente")
+            resultado["pdf"] = pdf_bytes
+            self.guardar(chave, resultado["plano_dieta"], pdf_bytes, perfil, resultado["totais"])
+        return resultados
+
+    # Fachada síncrona
+
+    def gerar(self, dados, renderizar=True):
+        """
+        Gera (ou busca no cache) o plano e o PDF. Retorna um dict com
+        plano_dieta, totais, pdf (bytes), cache ("hit" ou "miss") e os tempos
+        de cada etapa em ms. Com `renderizar=False` um plano novo volta com
+        pdf None, a ser completado por `renderizar_lote`.
+        """
+        perfil = validar_perfil(dados)
+        with coletar() as etapas:
+            resultado = self._gerar(perfil, renderizar)
+        concluir(etapas, cache=resultado["cache"], namespace=self.namespace)
+        return {**resultado, "tempos": etapas.ms()}
+
+    def _gerar(self, perfil, renderizar=True):
+        log_payload("Dados de entrada", perfil)
+        chave = self.chave(perfil)
+        cached = self.buscar_cache(chave)
+        if cached is not None:
+            return self.do_cache(cached)
+
+        metas = self.metas(perfil)
+        if self.gerar_documento is not None:
+            return self._gerar_com_motor(chave, perfil, metas, renderizar)
+
+        with etapa("llm"):
+            resposta = self.llm_client.chat(
+                self.mensagens(perfil, metas), model=self.model, temperature=0, **self.opcoes_chat(metas)
+            )
+        texto = resposta.choices[0].message.content
+        logging.info("Resposta do modelo obtida")
+        log_payload("Resposta do modelo", texto)
+        return self.finalizar(chave, texto, metas, perfil, self.formato, renderizar)
+
+    def _gerar_com_motor(self, chave, perfil, metas=None, renderizar=True):
+        with etapa("llm"):
+            documento = self.gerar_documento(perfil, metas)
+        logging.info("Resposta do modelo obtida")
+        plano_dieta = self.validar_documento(documento, metas)
+        totais = self.verificar_totais(plano_dieta)
+        return self._concluir(chave, plano_dieta, totais, perfil, renderizar)
+
+    # Fachada assíncrona
+
+    async def agerar(self, dados):
+        """Mesmo resultado de `gerar`, sem bloquear o event loop."""
+        perfil = validar_perfil(dados)
+        with coletar() as etapas:
+            resultado = await self._agerar(perfil)
+        concluir(etapas, cache=resultado["cache"], namespace=self.namespace)
+        return {**resultado, "tempos": etapas.ms()}
+
+    async def _agerar(self, perfil):
+        log_payload("Dados de entrada", perfil)
+        chave = self.chave(perfil)
+        cached = await asyncio.to_thread(self.buscar_cache, chave)
+        if cached is not None:
+            return self.do_cache(cached)
+
+        metas = self.metas(perfil)
+        if self.gerar_documento is not None:
+            # Motores alternativos são síncronos; rodam em uma thread
+            return await asyncio.to_thread(self._gerar_com_motor, chave, perfil, metas)
+
+        with etapa("llm"):
+            resposta = await self.llm_client.achat(
+                self.mensagens(perfil, metas), model=self.model, temperature=0, **self.opcoes_chat(metas)
+            )
+        texto = resposta.choices[0].message.content
+        logging.info("Resposta do modelo obtida")
+        log_payload("Resposta do modelo", texto)
+
+        plano_dieta = await asyncio.to_thread(self.validar_texto, texto, metas, self.formato)
+        totais = self.verificar_totais(plano_dieta)
+        with etapa("pdf"):
+            pdf_bytes = await self.pdf_renderer.arender(plano_dieta, totais)
+        await asyncio.to_thread(self.guardar, chave, plano_dieta, pdf_bytes, perfil, totais)
+        return {"plano_dieta": plano_dieta, "totais": totais, "pdf": pdf_bytes, "cache": "miss"}
+
+    # Planos de vários dias
+
+    def _chamar_em_paralelo(self, lista_mensagens):
+        """Uma chamada ao modelo por item, em threads; retorna os textos na ordem."""
+        if not lista_mensagens:
+            return []
+
+        def chamar(mensagens):
+            resposta = self.llm_client.chat(mensagens, model=self.model, temperature=0.7)
+            return resposta.choices[0].message.content
+
+        with etapa("llm"), ThreadPoolExecutor(max_workers=len(lista_mensagens)) as executor:
+            # Contexto copiado para o uso de tokens contar na requisição atual
+            futuros = [executor.submit(contextvars.copy_context().run, chamar, m) for m in lista_mensagens]
+            return [futuro.result() for futuro in futuros]
+
+    def _refeicao_do_texto(self, texto, horario, perfil):
+        """Parse, TACO e validação de uma refeição gerada; None se inválida."""
+        try:
+            refeicao = extrair_json(texto)
+            refeicao["refeicao"] = horario
+            if self.macro_source == "taco":
+                preencher_refeicao(refeicao, valor_ausente="n/d")
+            self.validar_refeicao(refeicao)
+        except (ValueError, SchemaError, TypeError) as e:
+            # TypeError: JSON válido que não é um objeto (lista, texto...)
+            logging.warning(f"Refeição {horario} gerada fora do formato: {e}")
+            return None
+        receita_id = None
+        if self.recipe_store is not None:
+            # None: refeição sem calorias conhecidas (ex.: todos os macros n/d),
+            # que vale para este plano mas não entra no banco
+            receita_id = self.recipe_store.adicionar(refeicao, perfil["restricoes_alimentares"])
+        return receita_id or id_refeicao(refeicao), refeicao
+
+    @staticmethod
+    def _complementos_do_texto(texto):
+        """Parse dos complementos do plano; None se fora do formato."""
+        try:
+            resposta = extrair_json(texto)
+            return {campo: resposta[campo] for campo in COMPLEMENTOS}
+        except (ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Complementos do plano gerados fora do formato: {e}")
+            return None
+
+    def gerar_refeicoes(self, perfil, metas, pedidos, com_complementos=False, tentativas=2):
+        """
+        Gera as refeições pedidas [(horário, calorias, nomes a evitar)] em
+        paralelo (e os complementos do plano, se pedidos) e as guarda no
+        banco. O que vier fora do formato é pedido de novo, até `tentativas`
+        rodadas; refeições ainda inválidas ficam de fora e complementos
+        inválidos são trocados por COMPLEMENTOS_PADRAO (que não vão para o
+        banco). Retorna ([(horário, id, refeição)], complementos ou None).
+        """
+        geradas, complementos = [], None
+        for _ in range(tentativas):
+            pedir_complementos = com_complementos and complementos is None
+            mensagens = [
+                mensagens_refeicao(perfil, metas, horario, calorias, evitar, self.macro_source)
+                for horario, calorias, evitar in pedidos
+            ]
+            if pedir_complementos:
+                mensagens.append(mensagens_complementos(perfil, metas))
+            textos = self._chamar_em_paralelo(mensagens)
+
+            with etapa("parse"):
+                if pedir_complementos:
+                    complementos = self._complementos_do_texto(textos.pop())
+                invalidas = []
+                for pedido, texto in zip(pedidos, textos):
+                    gerada = self._refeicao_do_texto(texto, pedido[0], perfil)
+                    if gerada is None:
+                        invalidas.append(pedido)
+                    else:
+                        geradas.append((pedido[0], *gerada))
+            pedidos = invalidas
+            if not pedidos and (complementos is not None or not com_complementos):
+                break
+
+        if com_complementos:
+            if complementos is None:
+                logging.warning("Usando os complementos padrão do plano")
+                complementos = dict(COMPLEMENTOS_PADRAO)
+            elif self.recipe_store is not None:
+                self.recipe_store.guardar_complementos(perfil, complementos)
+        return geradas, complementos
+
+    def gerar_documento_paralelo(self, perfil, metas=None):
+        """
+        Motor paralelo: uma chamada por refeição, com as calorias do horário,
+        e uma para os complementos, todas ao mesmo tempo (latência de uma
+        refeição em vez do plano inteiro). Os prompts de refeição usam as
+        metas calculadas localmente, mesmo sem `metas_locais`.
+        """
+        metas = metas or metas_perfil(perfil, self.equacao)
+        pedidos = [
+            (horario, metas["calorias"] * percentual / 100, ()) for horario, percentual in DISTRIBUICAO_REFEICOES
+        ]
+        geradas, complementos = self.gerar_refeicoes(perfil, metas, pedidos, com_complementos=True)
+        por_horario = {horario: refeicao for horario, _, refeicao in geradas}
+        faltando = [horario for horario, _ in DISTRIBUICAO_REFEICOES if horario not in por_horario]
+        if faltando:
+            raise SchemaError(f"Nenhuma refeição válida para: {', '.join(faltando)}")
+        logging.info("Refeições geradas em paralelo")
+        return {"plano_dieta": {
+            **campos_plano(metas),
+            "Suplementação": complementos["Suplementação"],
+            "plano_refeicoes": complementos["plano_refeicoes"],
+            "refeições": [por_horario[horario] for horario, _ in DISTRIBUICAO_REFEICOES],
+            "dicas": complementos["dicas"],
+            "observacoes": complementos["observacoes"],
+        }}
+
+    def gerar_semana(self, dados, dias=7, variedade=3):
+        """
+        Plano de `dias` dias: cada horário roda entre `variedade` refeições,
+        vindas do banco sempre que houver alguma dentro das metas; o modelo
+        só gera as que faltam. Retorna plano_semanal, totais por dia, pdf,
+        refeicoes_novas, refeicoes_reutilizadas e os tempos.
+        """
+        perfil = validar_perfil(dados)
+        with coletar() as etapas:
+            resultado = self._gerar_semana(perfil, dias, max(1, min(variedade, dias)))
+        concluir(
+            etapas, namespace=self.namespace, dias=dias,
+            refeicoes_novas=resultado["refeicoes_novas"], refeicoes_reutilizadas=resultado["refeicoes_reutilizadas"]
+        )
+        return {**resultado, "tempos": etapas.ms()}
+
+    def _sem_banco(self):
+        if self.recipe_store is None:
+            raise RuntimeError("Planos de vários dias exigem um banco de refeições (recipe_store)")
+
+    def _gerar_semana(self, perfil, dias, variedade):
+        self._sem_banco()
+        metas = metas_perfil(perfil, self.equacao)
+        fracoes = [p / 100 for p in metas["percentuais"]]
+        restricoes = perfil["restricoes_alimentares"]
+
+        opcoes = {}
+        pedidos = []
+        with etapa("receitas"):
+            for horario, percentual in DISTRIBUICAO_REFEICOES:
+                calorias = metas["calorias"] * percentual / 100
+                opcoes[horario] = self.recipe_store.buscar(horario, restricoes, calorias, fracoes, n=variedade)
+                evitar = [refeicao["nome"] for _, refeicao in opcoes[horario]]
+                pedidos += [(horario, calorias, evitar)] * (variedade - len(opcoes[horario]))
+            complementos = self.recipe_store.complementos(perfil)
+        reutilizadas = sum(len(o) for o in opcoes.values())
+        logging.info(f"Plano de {dias} dias: {reutilizadas} refeições do banco, {len(pedidos)} a gerar")
+
+        geradas, novos_complementos = self.gerar_refeicoes(perfil, metas, pedidos, complementos is None)
+        complementos = complementos or novos_complementos
+        for horario, receita_id, refeicao in geradas:
+            if receita_id not in {i for i, _ in opcoes[horario]}:
+                opcoes[horario].append((receita_id, refeicao))
+
+        faltando = [horario for horario, itens in opcoes.items() if not itens]
+        if faltando:
+            raise SchemaError(f"Nenhuma refeição válida para: {', '.join(faltando)}")
+
+        plano_semanal = {**campos_plano(metas), **complementos, "dias": []}
+        escolhidas = set()
+        for dia in range(dias):
+            refeicoes = []
+            for horario, _ in DISTRIBUICAO_REFEICOES:
+                receita_id, refeicao = opcoes[horario][dia % len(opcoes[horario])]
+                refeicoes.append(refeicao)
+                escolhidas.add(receita_id)
+            plano_semanal["dias"].append({"dia": dia + 1, "refeições": refeicoes})
+        self.recipe_store.usar(escolhidas)
+        self.recipe_store.salvar()
+
+        resultado = self._finalizar_semana(plano_semanal)
+        return {**resultado, "refeicoes_novas": len(geradas), "refeicoes_reutilizadas": reutilizadas}
+
+    def _finalizar_semana(self, plano_semanal):
+        totais = [self.verificar_totais(plano_do_dia(plano_semanal, i)) for i in range(len(plano_semanal["dias"]))]
+        with etapa("pdf"):
+            pdf_bytes = self.pdf_renderer.render_semana(plano_semanal, totais)
+        return {"plano_semanal": plano_semanal, "totais": totais, "pdf": pdf_bytes}
+
+    def regenerar_refeicao(self, dados, plano_semanal, dia, horario):
+        """
+        Troca só a refeição `horario` do dia `dia` (1 = primeiro) de um plano
+        semanal, por outra do banco ou, se não houver, por uma nova do modelo.
+        """
+        perfil = validar_perfil(dados)
+        with coletar() as etapas:
+            resultado = self._regenerar_refeicao(perfil, plano_semanal, dia, horario)
+        concluir(etapas, namespace=self.namespace, refeicoes_novas=resultado["refeicoes_novas"])
+        return {**resultado, "tempos": etapas.ms()}
+
+    def _plano_semanal_recebido(self, plano_semanal):
+        """Cópia validada do plano enviado pelo cliente; RefeicaoInvalida se malformado."""
+        if not isinstance(plano_semanal, dict) or not isinstance(plano_semanal.get("dias"), list):
+            raise RefeicaoInvalida("plano_semanal deve ter a lista de dias")
+        for numero, dia in enumerate(plano_semanal["dias"], start=1):
+            refeicoes = dia.get("refeições") if isinstance(dia, dict) else None
+            if not isinstance(refeicoes, list) or not refeicoes:
+                raise RefeicaoInvalida(f"Dia {numero} do plano sem a lista de refeições")
+            for refeicao in refeicoes:
+                try:
+                    self.validar_refeicao(refeicao)
+                except SchemaError as e:
+                    raise RefeicaoInvalida(f"Refeição inválida no dia {numero}: {e}")
+        # O plano do cliente não é alterado
+        return copy.deepcopy(plano_semanal)
+
+    def _regenerar_refeicao(self, perfil, plano_semanal, dia, horario):
+        self._sem_banco()
+        plano_semanal = self._plano_semanal_recebido(plano_semanal)
+        dias = plano_semanal["dias"]
+        if not 1 <= dia <= len(dias):
+            raise RefeicaoInvalida(f"Dia inexistente no plano: {dia}")
+        refeicoes = dias[dia - 1]["refeições"]
+        indice = next(
+            (i for i, r in enumerate(refeicoes) if normalizar_texto(r.get("refeicao")) == normalizar_texto(horario)), None
+        )
+        if indice is None:
+            raise RefeicaoInvalida(f"Refeição inexistente no dia {dia}: {horario}")
+        horario = refeicoes[indice]["refeicao"]
+
+        # Nenhuma refeição desse horário já presente na semana serve
+        da_semana = [d["refeições"][indice] for d in dias if len(d["refeições"]) > indice]
+        metas = metas_perfil(perfil, self.equacao)
+        percentual = dict(DISTRIBUICAO_REFEICOES).get(horario, 100 / len(refeicoes))
+        calorias = metas["calorias"] * percentual / 100
+        with etapa("receitas"):
+            candidatas = self.recipe_store.buscar(
+                horario, perfil["restricoes_alimentares"], calorias, [p / 100 for p in metas["percentuais"]],
+                n=1, excluir={id_refeicao(r) for r in da_semana}
+            )
+
+        novas = 0
+        if candidatas:
+            receita_id, refeicao = candidatas[0]
+        else:
+            evitar = sorted({r.get("nome", "") for r in da_semana})
+            geradas, _ = self.gerar_refeicoes(perfil, metas, [(horario, calorias, evitar)])
+            if not geradas:
+                raise SchemaError(f"Não foi possível gerar uma nova refeição para {horario}")
+            _, receita_id, refeicao = geradas[0]
+            novas = 1
+        self.recipe_store.usar([receita_id])
+        self.recipe_store.salvar()
+
+        refeicoes[indice] = refeicao
+        return {**self._finalizar_semana(plano_semanal), "refeicoes_novas": novas}
+
+    async def agerar_semana(self, dados, dias=7, variedade=3):
+        # As chamadas ao modelo já rodam em paralelo, em threads
+        return await asyncio.to_thread(self.gerar_semana, dados, dias, variedade)
+
+    async def aregenerar_refeicao(self, dados, plano_semanal, dia, horario):
+        return await asyncio.to_thread(self.regenerar_refeicao, dados, plano_semanal, dia, horario)
@@ -0,0 +1,110 @@
+"""
+Partida rápida dos apps.
+
+`LazyResource(fabrica)` adia a importação e a construção de algo pesado
+(guardrails, LangChain, modelos locais) até o primeiro uso. `Warmup` roda,
+uma única vez e em segundo plano, as tarefas de aquecimento registradas: o
+servidor aceita conexões logo, e o endpoint /ready só responde 200 quando
+tudo o que é obrigatório já foi carregado. Assim, uma réplica nova só
+recebe tráfego aquecida.
+"""
+import logging
+import threading
+import time
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+OK = "ok"
+ERRO = "erro"
+
+
+class LazyResource:
+    """Recurso criado por `fabrica()` no primeiro `get()` (thread-safe)."""
+
+    def __init__(self, fabrica, nome=None):
+        self.fabrica = fabrica
+        self.nome = nome or getattr(fabrica, "__name__", "recurso")
+        self._valor = None
+        self._carregado = False
+        self._lock = threading.Lock()
+
+    @property
+    def carregado(self):
+        return self._carregado
+
+    def get(self):
+        if not self._carregado:
+            with self._lock:
+                if not self._carregado:
+                    inicio = time.perf_counter()
+                    self._valor = self.fabrica()
+                    self._carregado = True
+                    logging.info(f"{self.nome} carregado em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+        return self._valor
+
+    def __call__(self, *args, **kwargs):
+        # Permite usar o recurso no lugar do objeto (ex.: guard(...))
+        return self.get()(*args, **kwargs)
+
+
+class Warmup:
+    """
+    Tarefas de aquecimento executadas em ordem, uma única vez. Falhas em
+    tarefas opcionais só são registradas; falha em uma obrigatória deixa o
+    processo como não pronto.
+    """
+
+    def __init__(self):
+        self._tarefas = []  # (nome, fn, obrigatoria)
+        self._estado = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._inicio = time.perf_counter()
+        self._concluido = None
+
+    def add(self, nome, fn, obrigatoria=True):
+        self._tarefas.append((nome, fn, obrigatoria))
+        self._estado[nome] = {"estado": PENDENTE, "obrigatoria": obrigatoria}
+        return fn
+
+    def run(self):
+        for nome, fn, obrigatoria in self._tarefas:
+            with self._lock:
+                if self._estado[nome]["estado"] != PENDENTE:
+                    continue
+                self._estado[nome]["estado"] = EXECUTANDO
+            inicio = time.perf_counter()
+            try:
+                fn()
+                estado = {"estado": OK}
+            except Exception as e:
+                nivel = logging.ERROR if obrigatoria else logging.WARNING
+                logging.log(nivel, f"Aquecimento de {nome} falhou: {e}")
+                estado = {"estado": ERRO, "erro": str(e)}
+            estado["ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+            with self._lock:
+                self._estado[nome].update(estado)
+        self._concluido = time.perf_counter()
+        logging.info(f"Aquecimento concluído em {(self._concluido - self._inicio):.2f}s")
+
+    def start(self):
+        """Roda as tarefas em uma thread; retorna sem esperar."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="aquecimento", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def pronto(self):
+        with self._lock:
+            return all(
+                estado["estado"] == OK for estado in self._estado.values() if estado["obrigatoria"]
+            )
+
+    def stats(self):
+        with self._lock:
+            tarefas = {nome: dict(estado) for nome, estado in self._estado.items()}
+        return {
+            "pronto": self.pronto(),
+            "segundos_aquecimento": round(self._concluido - self._inicio, 2) if self._concluido else None,
+            "tarefas": tarefas,
+        }
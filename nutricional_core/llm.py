@@ -0,0 +1,328 @@
+"""
+Acesso compartilhado à API da OpenAI para os três apps.
+
+Um único cliente HTTP com pool de conexões (keep-alive) é reutilizado por
+todas as chamadas, com limite de requisições e de tokens por minuto,
+novas tentativas com backoff exponencial e jitter em 429/5xx e um prazo
+máximo por chamada. Um tempo limite de leitura não é repetido: o modelo
+está gerando devagar e uma nova tentativa recomeçaria a geração (e a
+cobrança) do zero. Por isso o tempo limite de cada tentativa é, por padrão,
+o prazo restante. Para testes e benchmarks basta apontar
+OPENAI_BASE_URL para um servidor local compatível com a API da OpenAI.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+from nutricional_core.etapas import registrar_tokens
+from nutricional_core.ratelimit import TokenBucket
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """A chamada não terminou dentro do prazo configurado."""
+
+
+def estimar_tokens(messages, max_tokens=None):
+    # Aproximação de ~4 caracteres por token, suficiente para o limitador
+    caracteres = sum(len(str(m.get("content", ""))) for m in messages)
+    return caracteres // 4 + (max_tokens or 1000)
+
+
+def _deve_repetir(erro):
+    if isinstance(erro, openai.APITimeoutError):
+        return False
+    if isinstance(erro, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(erro, openai.APIStatusError):
+        return erro.status_code == 429 or erro.status_code >= 500
+    return False
+
+
+def _retry_after(erro):
+    resposta = getattr(erro, "response", None)
+    if resposta is None:
+        return None
+    try:
+        return float(resposta.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMClient:
+    def __init__(
+        self,
+        api_key=None,
+        base_url=None,
+        max_connections=20,
+        rpm=None,
+        tpm=None,
+        timeout=None,
+        deadline=180.0,
+        max_retries=3,
+        backoff_base=1.0,
+        backoff_max=30.0,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.request_bucket = TokenBucket.per_minute(rpm) if rpm else None
+        self.token_bucket = TokenBucket.per_minute(tpm) if tpm else None
+
+        # Pool de conexões compartilhado (keep-alive entre chamadas)
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        http_timeout = httpx.Timeout(timeout or deadline, connect=10.0)
+        self.http_client = httpx.Client(limits=limits, timeout=http_timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=http_timeout)
+        self.client = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self.http_client,
+            # As novas tentativas são feitas aqui, respeitando o prazo total
+            max_retries=0,
+        )
+        self.async_client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self.http_async_client,
+            max_retries=0,
+        )
+
+    def _aguardar_limites(self, tokens, fim):
+        for bucket, n in ((self.request_bucket, 1), (self.token_bucket, tokens)):
+            if bucket is not None and not bucket.acquire(n, timeout=max(0.0, fim - time.monotonic())):
+                raise LLMDeadlineExceeded("Prazo esgotado aguardando o limite de taxa")
+
+    def _restante(self, fim):
+        restante = fim - time.monotonic()
+        if restante <= 0:
+            raise LLMDeadlineExceeded(f"Prazo de {self.deadline}s excedido")
+        return min(self.timeout, restante) if self.timeout else restante
+
+    def _espera(self, erro, tentativa, fim):
+        """Segundos até a próxima tentativa; relança o erro se não vale repetir."""
+        if not _deve_repetir(erro) or tentativa >= self.max_retries:
+            raise erro
+        # Backoff exponencial com "full jitter"
+        espera = _retry_after(erro) or random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** tentativa))
+        if time.monotonic() + espera >= fim:
+            raise LLMDeadlineExceeded(f"Prazo de {self.deadline}s excedido") from erro
+        logging.warning(f"Erro na API da OpenAI ({erro}); nova tentativa em {espera:.1f}s")
+        return espera
+
+    def _com_retentativas(self, chamada, messages, max_tokens):
+        fim = time.monotonic() + self.deadline
+        tokens = estimar_tokens(messages, max_tokens)
+        tentativa = 0
+        while True:
+            self._aguardar_limites(tokens, fim)
+            try:
+                return chamada(self._restante(fim))
+            except LLMDeadlineExceeded:
+                raise
+            except Exception as e:
+                espera = self._espera(e, tentativa, fim)
+            time.sleep(espera)
+            tentativa += 1
+
+    async def _com_retentativas_async(self, chamada, messages, max_tokens):
+        fim = time.monotonic() + self.deadline
+        tokens = estimar_tokens(messages, max_tokens)
+        tentativa = 0
+        while True:
+            # O TokenBucket é bloqueante; a espera fica fora do event loop
+            await asyncio.to_thread(self._aguardar_limites, tokens, fim)
+            try:
+                return await chamada(self._restante(fim))
+            except LLMDeadlineExceeded:
+                raise
+            except Exception as e:
+                espera = self._espera(e, tentativa, fim)
+            await asyncio.sleep(espera)
+            tentativa += 1
+
+    def _registrar_uso(self, model, resposta):
+        if getattr(resposta, "usage", None) is not None:
+            registrar_tokens(model, resposta.usage.prompt_tokens, resposta.usage.completion_tokens)
+
+    def chat(self, messages, model, max_tokens=None, **kwargs):
+        """chat.completions.create com limites, novas tentativas e prazo."""
+        def chamada(timeout):
+            return self.client.chat.completions.create(
+                model=model, messages=messages, max_tokens=max_tokens, timeout=timeout, **kwargs
+            )
+        resposta = self._com_retentativas(chamada, messages, max_tokens)
+        self._registrar_uso(model, resposta)
+        return resposta
+
+    async def achat(self, messages, model, max_tokens=None, **kwargs):
+        """Versão assíncrona de `chat`, sobre o pool HTTP assíncrono."""
+        def chamada(timeout):
+            return self.async_client.chat.completions.create(
+                model=model, messages=messages, max_tokens=max_tokens, timeout=timeout, **kwargs
+            )
+        resposta = await self._com_retentativas_async(chamada, messages, max_tokens)
+        self._registrar_uso(model, resposta)
+        return resposta
+
+    def stream(self, messages, model, max_tokens=None, **kwargs):
+        """
+        Abre uma completion em streaming e retorna um iterável de chunks
+        (`close()` cancela a requisição). O uso de tokens vem no último
+        chunk, que não tem `choices`, e é registrado ao recebê-lo.
+        """
+        kwargs.setdefault("stream_options", {"include_usage": True})
+
+        def chamada(timeout):
+            return self.client.chat.completions.create(
+                model=model, messages=messages, max_tokens=max_tokens, timeout=timeout, stream=True, **kwargs
+            )
+        return _StreamComUso(self._com_retentativas(chamada, messages, max_tokens), model, self._registrar_uso)
+
+    def langchain_llm(self, model, **kwargs):
+        """
+        ChatOpenAI do LangChain usando o mesmo pool HTTP e os mesmos limites
+        de requisições e de tokens. Sem novas tentativas: cada uma teria o
+        prazo inteiro, e a chamada passaria do prazo total; quem consome o
+        stream limita a duração total a `deadline`.
+        """
+        from langchain_openai import ChatOpenAI
+
+        callbacks = [_langchain_uso_de_tokens(model)]
+        if self.token_bucket is not None:
+            callbacks.append(_langchain_limite_de_tokens(self.token_bucket, self.deadline))
+        return ChatOpenAI(
+            model=model,
+            api_key=self.client.api_key,
+            base_url=self.base_url,
+            http_client=self.http_client,
+            http_async_client=self.http_async_client,
+            timeout=self.deadline,
+            max_retries=0,
+            rate_limiter=_langchain_rate_limiter(self.request_bucket) if self.request_bucket else None,
+            callbacks=callbacks,
+            **kwargs,
+        )
+
+    def close(self):
+        self.http_client.close()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self.http_async_client.aclose())
+        else:
+            loop.create_task(self.http_async_client.aclose())
+
+    async def aclose(self):
+        self.http_client.close()
+        await self.http_async_client.aclose()
+
+
+class _StreamComUso:
+    """Stream da OpenAI que registra o uso de tokens do chunk final."""
+
+    def __init__(self, stream, model, registrar_uso):
+        self._stream = stream
+        self._model = model
+        self._registrar_uso = registrar_uso
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._registrar_uso(self._model, chunk)
+            yield chunk
+
+    def close(self):
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _langchain_rate_limiter(bucket):
+    # Adapta o TokenBucket à interface de rate limiter do langchain_core
+    # (que limita apenas requisições, não tokens)
+    from langchain_core.rate_limiters import BaseRateLimiter
+
+    class LangChainRateLimiter(BaseRateLimiter):
+        def acquire(self, *, blocking=True):
+            return bucket.acquire(1, timeout=None if blocking else 0)
+
+        async def aacquire(self, *, blocking=True):
+            import asyncio
+            return await asyncio.to_thread(bucket.acquire, 1, None if blocking else 0)
+
+    return LangChainRateLimiter()
+
+
+def _langchain_limite_de_tokens(bucket, deadline):
+    # Cobra a estimativa de tokens no limite por minuto antes de cada chamada
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LimiteDeTokens(BaseCallbackHandler):
+        raise_error = True
+
+        def on_chat_model_start(self, serialized, messages, **kwargs):
+            for lista in messages:
+                tokens = estimar_tokens([{"content": m.content} for m in lista], kwargs.get("max_tokens"))
+                if not bucket.acquire(tokens, timeout=deadline):
+                    raise LLMDeadlineExceeded("Prazo esgotado aguardando o limite de tokens")
+
+    return LimiteDeTokens()
+
+
+def _langchain_uso_de_tokens(model):
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class UsoDeTokens(BaseCallbackHandler):
+        def on_llm_end(self, response, **kwargs):
+            uso = (response.llm_output or {}).get("token_usage") or {}
+            if uso:
+                registrar_tokens(model, uso.get("prompt_tokens", 0), uso.get("completion_tokens", 0))
+
+    return UsoDeTokens()
+
+
+def _float_env(nome, padrao=None):
+    valor = os.getenv(nome)
+    return float(valor) if valor else padrao
+
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_client():
+    """Cliente compartilhado do processo, configurado por variáveis de ambiente."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = LLMClient(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("OPENAI_BASE_URL") or None,
+                max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+                rpm=_float_env("LLM_RPM"),
+                tpm=_float_env("LLM_TPM"),
+                timeout=_float_env("LLM_TIMEOUT"),
+                deadline=_float_env("LLM_DEADLINE", 180.0),
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            )
+        return _client
+
+
+def set_client(client):
+    """Substitui o cliente compartilhado (ex.: apontando para um stub em testes)."""
+    global _client
+    with _lock:
+        _client = client
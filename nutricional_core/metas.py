@@ -0,0 +1,209 @@
+"""
+Metas diárias do plano calculadas localmente, antes do prompt.
+
+Gasto energético basal por Mifflin-St Jeor (padrão) ou Harris-Benedict
+revisada, multiplicado pelo fator de atividade e ajustado pelo objetivo;
+a divisão de macronutrientes, a água e as fibras também saem do perfil.
+O cálculo é vetorizado: `metas_perfis` processa milhares de perfis de uma
+vez, e `metas_perfil` é o caso de um perfil só usado pelo gerador.
+"""
+import csv
+import json
+import os
+import re
+import sys
+
+import numpy as np
+
+from nutricional_core.cache import normalizar_texto
+from nutricional_core.totais import KCAL_POR_GRAMA
+
+# "mifflin" ou "harris"
+EQUACAO = os.getenv("ENERGY_EQUATION", "mifflin")
+
+# Valores do formulário -> fator de atividade
+FATORES_ATIVIDADE = {
+    "sedentario": 1.2,
+    "levemente_ativo": 1.375,
+    "moderadamente_ativo": 1.55,
+    "muito_ativo": 1.725,
+    "extremamente_ativo": 1.9,
+}
+
+# Objetivo -> (ajuste das calorias, fração de proteína, carboidrato e gordura)
+OBJETIVOS = {
+    "perder_peso": (0.80, (0.30, 0.40, 0.30)),
+    "manter_peso": (1.00, (0.20, 0.50, 0.30)),
+    "ganhar_peso": (1.15, (0.20, 0.50, 0.30)),
+    "ganhar_massa_muscular": (1.10, (0.30, 0.45, 0.25)),
+}
+
+# Texto livre (Streamlit, API) -> chaves acima, pela primeira palavra encontrada
+_PALAVRAS_ATIVIDADE = [
+    (re.compile(r"extrem|atleta"), "extremamente_ativo"),
+    (re.compile(r"muito|intens|alto"), "muito_ativo"),
+    (re.compile(r"moderad|medio"), "moderadamente_ativo"),
+    (re.compile(r"lev|pouco|baixo"), "levemente_ativo"),
+    (re.compile(r"sedent"), "sedentario"),
+]
+_PALAVRAS_OBJETIVO = [
+    (re.compile(r"massa|muscul|hipertrof"), "ganhar_massa_muscular"),
+    (re.compile(r"perd|emagre|defini|reduz"), "perder_peso"),
+    (re.compile(r"ganh|engord"), "ganhar_peso"),
+]
+
+# Fração das calorias diárias de cada refeição
+DISTRIBUICAO_REFEICOES = [
+    ("CAFÉ DA MANHÃ", 25),
+    ("LANCHE DA MANHÃ", 10),
+    ("ALMOÇO", 30),
+    ("LANCHE DA TARDE", 10),
+    ("JANTAR", 25),
+]
+
+CALORIAS_MINIMAS = 1200
+AGUA_ML_POR_KG = 35
+FIBRAS_G_POR_1000_KCAL = 14
+FIBRAS_MINIMAS = 25
+
+
+def fator_atividade(nivel):
+    nivel = normalizar_texto(nivel).replace(" ", "_")
+    if nivel in FATORES_ATIVIDADE:
+        return FATORES_ATIVIDADE[nivel]
+    for padrao, chave in _PALAVRAS_ATIVIDADE:
+        if padrao.search(nivel):
+            return FATORES_ATIVIDADE[chave]
+    return FATORES_ATIVIDADE["moderadamente_ativo"]
+
+
+def objetivo(texto):
+    texto = normalizar_texto(texto).replace(" ", "_")
+    if texto in OBJETIVOS:
+        return texto
+    for padrao, chave in _PALAVRAS_OBJETIVO:
+        if padrao.search(texto):
+            return chave
+    return "manter_peso"
+
+
+def sexo(genero):
+    """1 masculino, 0 feminino, 0.5 nos demais casos (média das equações)."""
+    genero = normalizar_texto(genero)
+    if genero.startswith(("masc", "homem")) or genero == "m":
+        return 1.0
+    if genero.startswith(("fem", "mulher")) or genero == "f":
+        return 0.0
+    return 0.5
+
+
+def gasto_basal(idade, peso, altura, sexo, equacao=EQUACAO):
+    """Taxa metabólica basal em kcal (arrays ou escalares; altura em cm)."""
+    if equacao == "harris":
+        # Harris-Benedict revisada (Roza e Shizgal, 1984), interpolada pelo sexo
+        homem = 88.362 + 13.397 * peso + 4.799 * altura - 5.677 * idade
+        mulher = 447.593 + 9.247 * peso + 3.098 * altura - 4.330 * idade
+        return sexo * homem + (1 - sexo) * mulher
+    if equacao != "mifflin":
+        raise ValueError(f"Equação desconhecida: {equacao}")
+    return 10 * peso + 6.25 * altura - 5 * idade + 166 * sexo - 161
+
+
+def calcular_metas(idade, peso, altura, sexo, atividade, ajuste, divisao, equacao=EQUACAO):
+    """
+    Metas de N perfis. Recebe arrays (N,) e `divisao` (N, 3) com as frações
+    de proteína, carboidrato e gordura; retorna um dict de arrays.
+    """
+    idade, peso, altura, sexo, atividade, ajuste = (
+        np.asarray(v, dtype=float) for v in (idade, peso, altura, sexo, atividade, ajuste)
+    )
+    divisao = np.asarray(divisao, dtype=float).reshape(-1, 3)
+
+    basal = gasto_basal(idade, peso, altura, sexo, equacao)
+    total = basal * atividade
+    calorias = np.maximum(np.round(total * ajuste / 10) * 10, CALORIAS_MINIMAS)
+    gramas = np.round(calorias[:, None] * divisao / KCAL_POR_GRAMA)
+    return {
+        "basal": np.round(basal),
+        "gasto_total": np.round(total),
+        "calorias": calorias,
+        "divisao": divisao,
+        "gramas": gramas,  # (N, 3) proteína, carboidrato, gordura
+        "agua_ml": np.round(peso * AGUA_ML_POR_KG / 50) * 50,
+        "fibras_g": np.maximum(np.round(calorias * FIBRAS_G_POR_1000_KCAL / 1000), FIBRAS_MINIMAS),
+    }
+
+
+def metas_perfis(perfis, equacao=EQUACAO):
+    """Metas de uma lista de perfis (dicts do formulário), vetorizadas."""
+    objetivos = [objetivo(p.get("objetivos")) for p in perfis]
+    return calcular_metas(
+        idade=[float(p["idade"]) for p in perfis],
+        peso=[float(p["peso"]) for p in perfis],
+        altura=[float(p["altura"]) for p in perfis],
+        sexo=[sexo(p.get("genero")) for p in perfis],
+        atividade=[fator_atividade(p.get("nivel_atividade")) for p in perfis],
+        ajuste=[OBJETIVOS[o][0] for o in objetivos],
+        divisao=[OBJETIVOS[o][1] for o in objetivos],
+        equacao=equacao,
+    )
+
+
+def _metas_linha(metas, i):
+    proteina, carboidrato, gordura = (int(g) for g in metas["gramas"][i])
+    return {
+        "basal": int(metas["basal"][i]),
+        "gasto_total": int(metas["gasto_total"][i]),
+        "calorias": int(metas["calorias"][i]),
+        "percentuais": [int(round(f * 100)) for f in metas["divisao"][i]],
+        "proteina_g": proteina,
+        "carboidrato_g": carboidrato,
+        "gordura_g": gordura,
+        "agua_ml": int(metas["agua_ml"][i]),
+        "fibras_g": int(metas["fibras_g"][i]),
+    }
+
+
+def metas_perfil(perfil, equacao=EQUACAO):
+    """Metas de um perfil em tipos nativos (serializáveis)."""
+    return _metas_linha(metas_perfis([perfil], equacao), 0)
+
+
+def campos_plano(metas):
+    """Campos do plano_dieta preenchidos pelas metas calculadas."""
+    p, c, g = metas["percentuais"]
+    return {
+        "calorias": f"{metas['calorias']} kcal",
+        "macronutrientes": (
+            f"{p}% proteína ({metas['proteina_g']} g), {c}% carboidrato ({metas['carboidrato_g']} g), "
+            f"{g}% gordura ({metas['gordura_g']} g)"
+        ),
+        "Consumo de água": f"{metas['agua_ml']} ml",
+        "Consumo de fibras": f"{metas['fibras_g']} g",
+    }
+
+
+def calorias_refeicoes(metas):
+    """Texto com as calorias alvo de cada refeição, para o prompt."""
+    return ", ".join(
+        f"{refeicao} {round(metas['calorias'] * percentual / 100)} kcal"
+        for refeicao, percentual in DISTRIBUICAO_REFEICOES
+    )
+
+
+def main(argv):
+    """
+    Metas de um lote de perfis (CSV com as colunas do formulário), uma
+    linha JSON por perfil:
+
+        python -m nutricional_core.metas perfis.csv [mifflin|harris]
+    """
+    with open(argv[0], encoding="utf-8", newline="") as f:
+        perfis = list(csv.DictReader(f))
+    metas = metas_perfis(perfis, argv[1] if len(argv) > 1 else EQUACAO)
+    for i in range(len(perfis)):
+        print(json.dumps(_metas_linha(metas, i), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
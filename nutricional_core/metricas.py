@@ -0,0 +1,112 @@
+"""
+Métricas Prometheus do pipeline de geração e log estruturado por requisição.
+
+Ao importar este módulo, as etapas (nutricional_core.etapas) passam a
+alimentar um histograma por etapa, o uso de tokens passa a alimentar os
+contadores de tokens e custo, e cada requisição concluída gera uma linha de
+log JSON. Os apps expõem `gerar_metricas()` em /metrics.
+
+Os gauges são atualizados com inc/dec/set nas mudanças de estado (não com
+set_function, que o modo multiprocesso ignora) e declaram `multiprocess_mode`
+"livesum": com vários workers, o valor é a soma dos processos vivos.
+"""
+import json
+import logging
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from nutricional_core import etapas
+
+# Preço em US$ por 1k tokens (prompt, resposta)
+PRECOS = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+}
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180)
+
+ETAPA_SEGUNDOS = Histogram(
+    "nutricional_etapa_segundos", "Duração de cada etapa do pipeline", ["etapa"], buckets=_BUCKETS
+)
+REQUISICAO_SEGUNDOS = Histogram(
+    "nutricional_requisicao_segundos", "Duração das requisições HTTP", ["endpoint", "status"], buckets=_BUCKETS
+)
+EM_ANDAMENTO = Gauge(
+    "nutricional_requisicoes_em_andamento", "Requisições HTTP em andamento", ["endpoint"],
+    multiprocess_mode="livesum"
+)
+TOKENS = Counter(
+    "nutricional_tokens_total", "Tokens consumidos na API da LLM", ["modelo", "tipo"]
+)
+CUSTO = Counter(
+    "nutricional_custo_usd_total", "Custo estimado das chamadas à LLM (US$)", ["modelo"]
+)
+PLANOS = Counter(
+    "nutricional_planos_total", "Planos gerados, por origem (cache hit/miss)", ["cache"]
+)
+JOBS = Gauge(
+    "nutricional_jobs", "Jobs na fila de geração, por estado", ["estado"],
+    multiprocess_mode="livesum"
+)
+
+
+def custo(modelo, prompt, resposta):
+    preco = next((p for nome, p in sorted(PRECOS.items(), key=lambda i: -len(i[0])) if modelo.startswith(nome)), None)
+    if preco is None:
+        return 0.0
+    return prompt / 1000 * preco[0] + resposta / 1000 * preco[1]
+
+
+def _observar_etapa(nome, segundos):
+    ETAPA_SEGUNDOS.labels(nome).observe(segundos)
+
+
+def _observar_tokens(modelo, prompt, resposta):
+    TOKENS.labels(modelo, "prompt").inc(prompt)
+    TOKENS.labels(modelo, "resposta").inc(resposta)
+    CUSTO.labels(modelo).inc(custo(modelo, prompt, resposta))
+
+
+def _observar_requisicao(coletor, campos):
+    if "cache" in campos:
+        PLANOS.labels(campos["cache"]).inc()
+    log_requisicao(coletor, **campos)
+
+
+etapas.observadores_etapa.append(_observar_etapa)
+etapas.observadores_tokens.append(_observar_tokens)
+etapas.observadores_requisicao.append(_observar_requisicao)
+
+
+def gerar_metricas():
+    """
+    (conteúdo, content type) para o endpoint /metrics. Com vários workers,
+    PROMETHEUS_MULTIPROC_DIR (um diretório vazio comum a todos) faz cada
+    worker responder com as métricas somadas de todos.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import CollectorRegistry, multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def log_requisicao(coletor, **campos):
+    """Uma linha JSON por requisição com spans, tokens e custo."""
+    tokens = {modelo: {"prompt": p, "resposta": r} for modelo, (p, r) in coletor.tokens.items()}
+    registro = {
+        "trace_id": coletor.trace_id,
+        **campos,
+        "etapas_ms": coletor.ms(),
+        "spans": [
+            {"etapa": nome, "inicio_ms": round(inicio * 1000, 1), "duracao_ms": round(duracao * 1000, 1)}
+            for nome, inicio, duracao in coletor.spans
+        ],
+        "tokens": tokens,
+        "custo_usd": round(sum(custo(m, p, r) for m, (p, r) in coletor.tokens.items()), 5),
+    }
+    logging.info(json.dumps(registro, ensure_ascii=False))
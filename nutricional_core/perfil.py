@@ -0,0 +1,45 @@
+"""Perfil do usuário recebido pelos backends (formulário ou JSON)."""
+import math
+
+CAMPOS = ["idade", "genero", "peso", "altura", "nivel_atividade", "objetivos", "restricoes_alimentares"]
+
+
+class PerfilInvalido(ValueError):
+    """Campo ausente ou com valor inválido no perfil."""
+
+
+def _numero(dados, campo, tipo):
+    valor = dados.get(campo)
+    if valor is None or str(valor).strip() == "":
+        raise PerfilInvalido(f"Campo obrigatório ausente: {campo}")
+    try:
+        numero = float(str(valor).replace(",", "."))
+        # "nan" e "inf" passam pelo float(), mas quebram o cache e o prompt
+        if not math.isfinite(numero):
+            raise ValueError(valor)
+        numero = tipo(numero)
+    except ValueError:
+        raise PerfilInvalido(f"Valor inválido para {campo}: {valor!r}")
+    if numero <= 0:
+        raise PerfilInvalido(f"Valor inválido para {campo}: {valor!r}")
+    return numero
+
+
+def _texto(dados, campo, obrigatorio=True):
+    valor = str(dados.get(campo) or "").strip()
+    if obrigatorio and not valor:
+        raise PerfilInvalido(f"Campo obrigatório ausente: {campo}")
+    return valor
+
+
+def validar_perfil(dados):
+    """Converte os campos do perfil para os tipos esperados pelo prompt e pelo cache."""
+    return {
+        "idade": _numero(dados, "idade", int),
+        "genero": _texto(dados, "genero"),
+        "peso": _numero(dados, "peso", float),
+        "altura": _numero(dados, "altura", float),
+        "nivel_atividade": _texto(dados, "nivel_atividade"),
+        "objetivos": _texto(dados, "objetivos"),
+        "restricoes_alimentares": _texto(dados, "restricoes_alimentares", obrigatorio=False),
+    }
@@ -0,0 +1,376 @@
+"""
+Prompts e rail_spec do plano de dieta, compartilhados pelos backends.
+
+Os prompts usam a sintaxe de `str.format` (chaves do JSON dobradas), a
+mesma dos templates do LangChain, então servem tanto para o LLMClient
+quanto para `ChatPromptTemplate.from_template`.
+"""
+from nutricional_core.metas import calorias_refeicoes
+
+RAIL_SPEC = """
+<rail version="0.1">
+<messages>
+    <message role="system">
+    You are a professional nutritionist specialized in creating personalized meal plans. You must respond only with valid JSON in the specified format.
+    </message>
+    <message role="user">
+    Generate a diet plan based on the provided information.
+    </message>
+    <message role="assistant">
+    I'll generate a personalized diet plan based on the information you provide. The plan will be in JSON format as specified.
+    </message>
+</messages>
+<output>
+    <object name="plano_dieta">
+        <string name="calorias" description="Quantidade diária em kcal" />
+        <string name="macronutrientes" description="Distribuição macro" />
+        <string name="Consumo de água" description="Quantidade diária em ml" />
+        <string name="Consumo de fibras" description="Quantidade diária em gramas" />
+        <string name="Suplementação" description="Suplementos recomendados" />
+        <object name="plano_refeicoes">
+            <string name="detalhamento" description="Descrição do plano de refeições" />
+        </object>
+        <list name="refeições" description="5 refeições diárias">
+            <object>
+                <string name="refeicao" description="Nome da refeição" />
+                <string name="nome" description="Nome da receita" />
+                <list name="ingredientes" description="Lista de ingredientes">
+                    <object>
+                        <string name="nome" description="Nome do ingrediente" />
+                        <string name="quantidade" description="Quantidade em gramas" required="false" />
+                        <string name="proteina" description="Valor nutricional de proteína em gramas (tabela TACO)" />
+                        <string name="carboidrato" description="Valor nutricional de carboidrato em gramas (tabela TACO)" />
+                        <string name="gordura" description="Valor nutricional de gordura em gramas (tabela TACO)" />
+                    </object>
+                </list>
+                <string name="instrucoes" description="Passos para preparo" />
+            </object>
+        </list>
+        <list name="dicas" description="Dicas de nutrição e estilo de vida">
+            <string />
+        </list>
+        <string name="observacoes" description="Observações adicionais" />
+    </object>
+</output>
+</rail>
+"""
+
+# Prompt do plano completo: o modelo gera também os macros de cada ingrediente
+PROMPT_PLANO = """
+Você é um nutricionista profissional especializado em elaborar planos alimentares personalizados. Sua tarefa é fornecer um plano nutricional baseado nas seguintes informações:
+
+- Idade: {idade}
+- Peso: {peso}
+- Altura: {altura}
+- Gênero: {genero}
+- Nível de Atividade: {nivel_atividade}
+- Restrições Alimentares: {restricoes_alimentares}
+- Objetivos: {objetivos}
+
+O plano nutricional deve:
+
+- Ser adequado às necessidades calóricas diárias calculadas com base nas informações fornecidas.
+- Incluir a distribuição de macronutrientes (proteínas, carboidratos e gorduras) conforme recomendado para o objetivo especificado.
+- Detalhar um plano de refeições composto por 5 refeições diárias: café da manhã, lanche da manhã, almoço, lanche da tarde e jantar.
+- Fornecer receitas para cada refeição, incluindo ingredientes e instruções de preparo.
+- Os ingredientes devem ser apresentados com seus valores nutricionais (proteína, carboidrato, gordura) em gramas, conforme a tabela TACO.
+- Incluir 3 dicas adicionais para auxiliar no alcance dos objetivos.
+
+Retorne exatamente no seguinte formato JSON:
+
+{{
+    "plano_dieta": {{
+        "calorias": "quantidade diária em kcal",
+        "macronutrientes": "distribuição macro",
+        "Consumo de água": "quantidade diária em ml",
+        "Consumo de fibras": "quantidade diária em gramas",
+        "Suplementação": "suplementos recomendados",
+        "plano_refeicoes": {{
+            "detalhamento": "descrição do plano de refeições"
+        }},
+        "refeições": [
+            {{
+                "refeicao": "CAFÉ DA MANHÃ",
+                "nome": "Nome da receita",
+                "ingredientes": [
+                    {{
+                        "nome": "Nome do ingrediente",
+                        "proteina": "valor em gramas (tabela TACO)",
+                        "carboidrato": "valor em gramas (tabela TACO)",
+                        "gordura": "valor em gramas (tabela TACO)"
+                    }},
+                    ...
+                ],
+                "instrucoes": "passos para preparo"
+            }},
+            {{
+                "refeicao": "LANCHE DA MANHÃ",
+                "nome": "Nome da receita",
+                "ingredientes": [
+                    {{
+                        "nome": "Nome do ingrediente",
+                        "proteina": "valor em gramas (tabela TACO)",
+                        "carboidrato": "valor em gramas (tabela TACO)",
+                        "gordura": "valor em gramas (tabela TACO)"
+                    }},
+                    ...
+                ],
+                "instrucoes": "passos para preparo"
+            }},
+            {{
+                "refeicao": "ALMOÇO",
+                "nome": "Nome da receita",
+                "ingredientes": [
+                    {{
+                        "nome": "Nome do ingrediente",
+                        "proteina": "valor em gramas (tabela TACO)",
+                        "carboidrato": "valor em gramas (tabela TACO)",
+                        "gordura": "valor em gramas (tabela TACO)"
+                    }},
+                    ...
+                ],
+                "instrucoes": "passos para preparo"
+            }},
+            {{
+                "refeicao": "LANCHE DA TARDE",
+                "nome": "Nome da receita",
+                "ingredientes": [
+                    {{
+                        "nome": "Nome do ingrediente",
+                        "proteina": "valor em gramas (tabela TACO)",
+                        "carboidrato": "valor em gramas (tabela TACO)",
+                        "gordura": "valor em gramas (tabela TACO)"
+                    }},
+                    ...
+                ],
+                "instrucoes": "passos para preparo"
+            }},
+            {{
+                "refeicao": "JANTAR",
+                "nome": "Nome da receita",
+                "ingredientes": [
+                    {{
+                        "nome": "Nome do ingrediente",
+                        "proteina": "valor em gramas (tabela TACO)",
+                        "carboidrato": "valor em gramas (tabela TACO)",
+                        "gordura": "valor em gramas (tabela TACO)"
+                    }},
+                    ...
+                ],
+                "instrucoes": "passos para preparo"
+            }}
+        ],
+        "dicas": [
+            "dica 1",
+            "dica 2",
+            "dica 3"
+        ],
+        "observacoes": "observações adicionais"
+    }}
+}}
+
+Certifique-se de seguir rigorosamente o formato solicitado e preencher todos os campos com informações precisas.
+"""
+
+# Prompt do modo TACO: o modelo não gera os macros, só nome e quantidade
+PROMPT_PLANO_TACO = """
+Você é um nutricionista profissional especializado em elaborar planos alimentares personalizados. Sua tarefa é fornecer um plano nutricional baseado nas seguintes informações:
+
+- Idade: {idade}
+- Peso: {peso}
+- Altura: {altura}
+- Gênero: {genero}
+- Nível de Atividade: {nivel_atividade}
+- Restrições Alimentares: {restricoes_alimentares}
+- Objetivos: {objetivos}
+
+O plano nutricional deve:
+
+- Ser adequado às necessidades calóricas diárias calculadas com base nas informações fornecidas.
+- Incluir a distribuição de macronutrientes (proteínas, carboidratos e gorduras) conforme recomendado para o objetivo especificado.
+- Detalhar um plano de refeições composto por 5 refeições diárias: CAFÉ DA MANHÃ, LANCHE DA MANHÃ, ALMOÇO, LANCHE DA TARDE e JANTAR.
+- Fornecer receitas para cada refeição, incluindo ingredientes e instruções de preparo.
+- Para cada ingrediente informe apenas o nome (como na tabela TACO, ex.: "arroz integral cozido") e a quantidade em gramas. Não informe valores nutricionais.
+- Incluir 3 dicas adicionais para auxiliar no alcance dos objetivos.
+
+Retorne exatamente no seguinte formato JSON, com um item em "refeições" para cada uma das 5 refeições:
+
+{{
+    "plano_dieta": {{
+        "calorias": "quantidade diária em kcal",
+        "macronutrientes": "distribuição macro",
+        "Consumo de água": "quantidade diária em ml",
+        "Consumo de fibras": "quantidade diária em gramas",
+        "Suplementação": "suplementos recomendados",
+        "plano_refeicoes": {{
+            "detalhamento": "descrição do plano de refeições"
+        }},
+        "refeições": [
+            {{
+                "refeicao": "CAFÉ DA MANHÃ",
+                "nome": "Nome da receita",
+                "ingredientes": [
+                    {{"nome": "Nome do ingrediente", "quantidade": "100 g"}}
+                ],
+                "instrucoes": "passos para preparo"
+            }}
+        ],
+        "dicas": ["dica 1", "dica 2", "dica 3"],
+        "observacoes": "observações adicionais"
+    }}
+}}
+
+Certifique-se de seguir rigorosamente o formato solicitado e preencher todos os campos com informações precisas.
+"""
+
+
+# Prompt curto usado quando as metas diárias são calculadas localmente
+# (nutricional_core.metas): o modelo só monta o cardápio, sem recalcular
+# calorias, macros, água e fibras, que são preenchidos depois no plano
+_PROMPT_PLANO_METAS = """
+Você é um nutricionista. Monte o cardápio de um dia com 5 refeições (CAFÉ DA MANHÃ, LANCHE DA MANHÃ, ALMOÇO, LANCHE DA TARDE e JANTAR) para: {idade} anos, {peso} kg, {altura} cm, gênero {genero}, atividade {nivel_atividade}, objetivo {objetivos}, restrições alimentares: {restricoes_alimentares}.
+
+Metas diárias já calculadas (não recalcule): {calorias} kcal; proteína {proteina_g} g, carboidrato {carboidrato_g} g, gordura {gordura_g} g.
+Calorias por refeição: {calorias_refeicoes}.
+<INGREDIENTES>
+Inclua 3 dicas para o objetivo.
+
+Responda só com o JSON, com um item em "refeições" para cada refeição:
+
+{{"plano_dieta": {{"Suplementação": "suplementos recomendados", "plano_refeicoes": {{"detalhamento": "descrição do plano"}}, "refeições": [{{"refeicao": "CAFÉ DA MANHÃ", "nome": "Nome da receita", "ingredientes": [<INGREDIENTE>], "instrucoes": "passos para preparo"}}], "dicas": ["dica 1", "dica 2", "dica 3"], "observacoes": "observações"}}}}
+"""
+
+PROMPT_PLANO_METAS = _PROMPT_PLANO_METAS.replace(
+    "<INGREDIENTES>", "Ingredientes com quantidade e proteína, carboidrato e gordura em gramas (tabela TACO)."
+).replace(
+    "<INGREDIENTE>", '{{"nome": "Ingrediente", "quantidade": "100 g", "proteina": "0 g", "carboidrato": "0 g", "gordura": "0 g"}}'
+)
+
+PROMPT_PLANO_METAS_TACO = _PROMPT_PLANO_METAS.replace(
+    "<INGREDIENTES>", 'Ingredientes só com nome (como na tabela TACO, ex.: "arroz integral cozido") e quantidade em gramas, sem valores nutricionais.'
+).replace(
+    "<INGREDIENTE>", '{{"nome": "Ingrediente", "quantidade": "100 g"}}'
+)
+
+
+# Uma refeição avulsa (planos de vários dias e regeneração de uma refeição)
+_PROMPT_REFEICAO = """
+Você é um nutricionista. Elabore a refeição {refeicao} (cerca de {calorias_refeicao} kcal) de um plano diário de {calorias} kcal com proteína {proteina_g} g, carboidrato {carboidrato_g} g e gordura {gordura_g} g, para: {idade} anos, {peso} kg, {altura} cm, gênero {genero}, objetivo {objetivos}, restrições alimentares: {restricoes_alimentares}.
+<INGREDIENTES>
+A receita deve ser diferente de: {evitar}.
+
+Responda só com o JSON:
+
+{{"refeicao": "{refeicao}", "nome": "Nome da receita", "ingredientes": [<INGREDIENTE>], "instrucoes": "passos para preparo"}}
+"""
+
+PROMPT_REFEICAO = _PROMPT_REFEICAO.replace(
+    "<INGREDIENTES>", "Ingredientes com quantidade e proteína, carboidrato e gordura em gramas (tabela TACO)."
+).replace(
+    "<INGREDIENTE>", '{{"nome": "Ingrediente", "quantidade": "100 g", "proteina": "0 g", "carboidrato": "0 g", "gordura": "0 g"}}'
+)
+
+PROMPT_REFEICAO_TACO = _PROMPT_REFEICAO.replace(
+    "<INGREDIENTES>", 'Ingredientes só com nome (como na tabela TACO, ex.: "arroz integral cozido") e quantidade em gramas, sem valores nutricionais.'
+).replace(
+    "<INGREDIENTE>", '{{"nome": "Ingrediente", "quantidade": "100 g"}}'
+)
+
+# Partes do plano que não são refeições, com as metas já definidas
+PROMPT_COMPLEMENTOS = """
+Você é um nutricionista. Complete o plano nutricional de {idade} anos, {peso} kg, {altura} cm, gênero {genero}, objetivo {objetivos}, restrições alimentares: {restricoes_alimentares}, com {calorias} kcal por dia.
+
+Não descreva as refeições. Responda só com o JSON:
+
+{{"Suplementação": "suplementos recomendados", "plano_refeicoes": {{"detalhamento": "descrição do plano de refeições"}}, "dicas": ["dica 1", "dica 2", "dica 3"], "observacoes": "observações adicionais"}}
+"""
+
+
+# Formato compacto (nutricional_core.compacto): chaves curtas e listas
+# posicionais, expandidas no servidor; um único exemplo, sem repetir as
+# chaves de cada refeição e ingrediente
+_PROMPT_COMPACTO = """
+Você é um nutricionista. Monte o cardápio de um dia com 5 refeições para: {idade} anos, {peso} kg, {altura} cm, gênero {genero}, atividade {nivel_atividade}, objetivo {objetivos}, restrições alimentares: {restricoes_alimentares}.
+<METAS>
+<INGREDIENTES>
+Inclua 3 dicas para o objetivo.
+
+Responda só com JSON minificado neste formato compacto: "r" tem exatamente 5 itens, na ordem CAFÉ DA MANHÃ, LANCHE DA MANHÃ, ALMOÇO, LANCHE DA TARDE e JANTAR, cada um [nome da receita, [ingredientes], instruções]; cada ingrediente é <INGREDIENTE>.
+
+{{<CAMPOS>"sup":"suplementos recomendados","det":"descrição do plano","r":[["Nome da receita",[<EXEMPLO>],"preparo"]],"dicas":["dica 1","dica 2","dica 3"],"obs":"observações"}}
+"""
+
+_COMPACTO_METAS = {
+    False: (
+        "Defina as calorias diárias, a divisão de macronutrientes, a água e as fibras adequadas ao perfil e ao objetivo.",
+        '"kcal":"2000 kcal","macro":"30% proteína, 45% carboidrato, 25% gordura","agua":"2500 ml","fibra":"30 g",',
+    ),
+    True: (
+        "Metas diárias já calculadas (não recalcule): {calorias} kcal; proteína {proteina_g} g, carboidrato {carboidrato_g} g, gordura {gordura_g} g.\n"
+        "Calorias por refeição: {calorias_refeicoes}.",
+        "",
+    ),
+}
+
+_COMPACTO_INGREDIENTES = {
+    "llm": (
+        "Ingredientes com quantidade e proteína, carboidrato e gordura em gramas (tabela TACO), como números.",
+        "[nome, quantidade, proteína, carboidrato, gordura]",
+        '["Ingrediente","100 g",0,0,0]',
+    ),
+    "taco": (
+        'Ingredientes só com nome (como na tabela TACO, ex.: "arroz integral cozido") e quantidade em gramas, sem valores nutricionais.',
+        "[nome, quantidade]",
+        '["Ingrediente","100 g"]',
+    ),
+}
+
+
+def prompt_compacto(macro_source="llm", metas_locais=False):
+    metas, campos = _COMPACTO_METAS[metas_locais]
+    ingredientes, formato, exemplo = _COMPACTO_INGREDIENTES["taco" if macro_source == "taco" else "llm"]
+    return (
+        _PROMPT_COMPACTO.replace("<METAS>", metas)
+        .replace("<INGREDIENTES>", ingredientes)
+        .replace("<INGREDIENTE>", formato)
+        .replace("<CAMPOS>", campos)
+        .replace("<EXEMPLO>", exemplo)
+    )
+
+
+def prompt_plano(macro_source="llm", metas_locais=False, formato="json"):
+    if formato != "json":
+        return prompt_compacto(macro_source, metas_locais)
+    if metas_locais:
+        return PROMPT_PLANO_METAS_TACO if macro_source == "taco" else PROMPT_PLANO_METAS
+    return PROMPT_PLANO_TACO if macro_source == "taco" else PROMPT_PLANO
+
+
+def variaveis_plano(perfil, metas=None):
+    """Variáveis do prompt: o perfil e, se houver, as metas calculadas."""
+    if metas is None:
+        return perfil
+    return {**perfil, **metas, "calorias_refeicoes": calorias_refeicoes(metas)}
+
+
+def mensagens_plano(perfil, macro_source="llm", metas=None, formato="json"):
+    """Mensagens de chat para gerar o plano de um perfil."""
+    prompt = prompt_plano(macro_source, metas_locais=metas is not None, formato=formato)
+    return [{"role": "user", "content": prompt.format(**variaveis_plano(perfil, metas))}]
+
+
+def mensagens_refeicao(perfil, metas, refeicao, calorias_refeicao, evitar=(), macro_source="llm"):
+    """Mensagens de chat para gerar uma única refeição do plano."""
+    prompt = PROMPT_REFEICAO_TACO if macro_source == "taco" else PROMPT_REFEICAO
+    variaveis = {
+        **perfil,
+        **metas,
+        "refeicao": refeicao,
+        "calorias_refeicao": round(calorias_refeicao),
+        "evitar": ", ".join(evitar) or "(nenhuma)",
+    }
+    return [{"role": "user", "content": prompt.format(**variaveis)}]
+
+
+def mensagens_complementos(perfil, metas):
+    return [{"role": "user", "content": PROMPT_COMPLEMENTOS.format(**perfil, **metas)}]
@@ -0,0 +1,47 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Limitador de taxa por balde de fichas, seguro entre threads.
+
+    `rate` é a quantidade de fichas repostas por segundo e `capacity` o
+    tamanho máximo da rajada. `acquire` bloqueia até haver fichas; pedidos
+    maiores que a capacidade nunca caberiam e levantam ValueError.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, quantidade, capacity=None):
+        # Rajada padrão de um minuto inteiro: um pedido grande (ex.: tokens de
+        # uma chamada à LLM) cabe, e o total nunca passa do limite por minuto
+        return cls(quantidade / 60.0, capacity if capacity is not None else max(quantidade, 1))
+
+    def _refill(self, agora):
+        self._tokens = min(self.capacity, self._tokens + (agora - self._updated) * self.rate)
+        self._updated = agora
+
+    def acquire(self, n=1, timeout=None):
+        """Consome `n` fichas; retorna False se `timeout` expirar antes."""
+        n = float(n)
+        if n > self.capacity:
+            raise ValueError(f"Pedido de {n:g} fichas acima da capacidade do limitador ({self.capacity:g})")
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._refill(agora)
+                if self._tokens >= n:
+                    self._tokens -= n
+                    return True
+                espera = (n - self._tokens) / self.rate
+            if limite is not None and agora + espera > limite:
+                return False
+            time.sleep(espera)
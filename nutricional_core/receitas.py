@@ -0,0 +1,237 @@
+"""
+Banco de refeições já geradas, para montar planos de vários dias.
+
+Cada refeição de um plano gerado entra no banco indexada pelo horário
+(CAFÉ DA MANHÃ, ALMOÇO...), pelas restrições alimentares normalizadas e
+pelo perfil de macros (calorias e fração de proteína, carboidrato e
+gordura). Um plano semanal busca aqui refeições próximas das metas de cada
+horário e só pede ao modelo as que faltam. As partes do plano que não são
+refeições (suplementação, dicas...) ficam guardadas por objetivo e
+restrições.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+from nutricional_core.cache import normalizar_restricoes, normalizar_texto
+from nutricional_core.totais import totais_plano
+
+COMPLEMENTOS = ("Suplementação", "plano_refeicoes", "dicas", "observacoes")
+
+
+def id_refeicao(refeicao):
+    conteudo = json.dumps(refeicao, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()[:16]
+
+
+def _fracoes(total):
+    kcal = total["proteina"] * 4 + total["carboidrato"] * 4 + total["gordura"] * 9
+    if kcal <= 0:
+        return [0.0, 0.0, 0.0]
+    return [
+        round(total["proteina"] * 4 / kcal, 3),
+        round(total["carboidrato"] * 4 / kcal, 3),
+        round(total["gordura"] * 9 / kcal, 3),
+    ]
+
+
+class RecipeStore:
+    """
+    Refeições indexadas por (horário, restrições). `path` (opcional) é um
+    arquivo JSON salvo a cada `salvar()`; `max_por_grupo` limita cada índice,
+    descartando as refeições menos usadas. Vários workers podem usar o mesmo
+    arquivo: cada `salvar()` incorpora antes o que os outros já gravaram,
+    com o arquivo `<path>.lock` travado do início ao fim da gravação.
+    """
+
+    def __init__(self, path=None, max_por_grupo=200, tolerancia=0.15):
+        self.path = path
+        self.max_por_grupo = max_por_grupo
+        self.tolerancia = tolerancia
+        self._lock = threading.Lock()
+        self._grupos = {}  # (horário, restrições) -> {id: entrada}
+        self._complementos = {}  # "objetivo|restrições" -> complementos do plano
+        self._alterado = False
+        if path and os.path.exists(path):
+            self._carregar()
+
+    @staticmethod
+    def _grupo(horario, restricoes):
+        return normalizar_texto(horario), normalizar_restricoes(restricoes)
+
+    def adicionar(self, refeicao, restricoes, total=None):
+        """Guarda uma refeição; `total` são os macros somados (nutricional_core.totais)."""
+        if total is None:
+            total = totais_plano({"refeições": [refeicao]})["refeicoes"][0]
+        if total["calorias"] <= 0:
+            return None
+        grupo = self._grupo(refeicao.get("refeicao"), restricoes)
+        receita_id = id_refeicao(refeicao)
+        with self._lock:
+            entradas = self._grupos.setdefault(grupo, {})
+            if receita_id not in entradas:
+                entradas[receita_id] = {
+                    "id": receita_id,
+                    "refeicao": refeicao,
+                    "calorias": total["calorias"],
+                    "fracoes": _fracoes(total),
+                    "usos": 0,
+                    "criada_em": time.time(),
+                }
+                self._limitar(entradas)
+                self._alterado = True
+        return receita_id
+
+    def adicionar_plano(self, plano_dieta, perfil, totais=None):
+        """Guarda as refeições e os complementos de um plano diário gerado."""
+        totais = totais or totais_plano(plano_dieta)
+        restricoes = perfil.get("restricoes_alimentares")
+        ids = [
+            self.adicionar(refeicao, restricoes, total)
+            for refeicao, total in zip(plano_dieta.get("refeições", []), totais["refeicoes"])
+        ]
+        if all(campo in plano_dieta for campo in COMPLEMENTOS):
+            with self._lock:
+                self._complementos[self._chave_complementos(perfil)] = {
+                    campo: plano_dieta[campo] for campo in COMPLEMENTOS
+                }
+                self._alterado = True
+        return [i for i in ids if i is not None]
+
+    def _limitar(self, entradas):
+        excesso = len(entradas) - self.max_por_grupo
+        if excesso > 0:
+            for entrada in sorted(entradas.values(), key=lambda e: (e["usos"], e["criada_em"]))[:excesso]:
+                del entradas[entrada["id"]]
+
+    def buscar(self, horario, restricoes, calorias, fracoes, n=3, excluir=()):
+        """
+        Até `n` refeições do horário com calorias dentro da tolerância,
+        as menos usadas primeiro (rodízio) e, entre elas, as de perfil de
+        macros mais próximo. Retorna [(id, refeição)].
+        """
+        grupo = self._grupo(horario, restricoes)
+        with self._lock:
+            entradas = list(self._grupos.get(grupo, {}).values())
+        candidatas = []
+        for entrada in entradas:
+            if entrada["id"] in excluir:
+                continue
+            desvio = abs(entrada["calorias"] - calorias) / calorias
+            if desvio > self.tolerancia:
+                continue
+            distancia = desvio + sum(abs(a - b) for a, b in zip(entrada["fracoes"], fracoes))
+            candidatas.append((entrada["usos"], distancia, entrada["id"], entrada["refeicao"]))
+        candidatas.sort(key=lambda c: (c[0], c[1]))
+        return [(receita_id, refeicao) for _, _, receita_id, refeicao in candidatas[:n]]
+
+    def usar(self, ids):
+        """Conta o uso das refeições escolhidas, para o rodízio."""
+        ids = set(ids)
+        with self._lock:
+            for entradas in self._grupos.values():
+                for receita_id in ids & entradas.keys():
+                    entradas[receita_id]["usos"] += 1
+            self._alterado = True
+
+    @staticmethod
+    def _chave_complementos(perfil):
+        objetivo = normalizar_texto(perfil.get("objetivos")).replace(" ", "_")
+        return f"{objetivo}|{normalizar_restricoes(perfil.get('restricoes_alimentares'))}"
+
+    def complementos(self, perfil):
+        with self._lock:
+            return self._complementos.get(self._chave_complementos(perfil))
+
+    def guardar_complementos(self, perfil, complementos):
+        with self._lock:
+            self._complementos[self._chave_complementos(perfil)] = dict(complementos)
+            self._alterado = True
+
+    def salvar(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._alterado:
+                return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._trava_arquivo():
+            self._gravar()
+
+    @contextmanager
+    def _trava_arquivo(self):
+        # Sem a trava, dois workers leem a mesma versão e o último os.replace
+        # descarta as refeições gravadas pelo outro
+        with open(f"{self.path}.lock", "a") as trava:
+            if fcntl is not None:
+                fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(trava, fcntl.LOCK_UN)
+
+    def _gravar(self):
+        outros = self._ler() if os.path.exists(self.path) else None
+        with self._lock:
+            if outros is not None:
+                self._mesclar(outros)
+            dados = {
+                "grupos": [
+                    {"horario": horario, "restricoes": restricoes, "entradas": list(entradas.values())}
+                    for (horario, restricoes), entradas in self._grupos.items()
+                ],
+                "complementos": self._complementos,
+            }
+            self._alterado = False
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def _ler(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Banco de refeições ilegível ({e})")
+            return None
+
+    def _mesclar(self, dados):
+        # Chamado com o lock: refeições gravadas por outros processos entram,
+        # e o uso de cada uma fica com a maior contagem vista
+        for grupo in dados.get("grupos", []):
+            entradas = self._grupos.setdefault((grupo["horario"], grupo["restricoes"]), {})
+            for entrada in grupo["entradas"]:
+                atual = entradas.get(entrada["id"])
+                if atual is None:
+                    entradas[entrada["id"]] = entrada
+                else:
+                    atual["usos"] = max(atual["usos"], entrada["usos"])
+            self._limitar(entradas)
+        for chave, complementos in dados.get("complementos", {}).items():
+            self._complementos.setdefault(chave, complementos)
+
+    def _carregar(self):
+        dados = self._ler()
+        if dados is None:
+            return
+        self._mesclar(dados)
+        logging.info(f"Banco de refeições carregado: {sum(len(g) for g in self._grupos.values())} refeições")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "refeicoes": sum(len(entradas) for entradas in self._grupos.values()),
+                "grupos": len(self._grupos),
+                "complementos": len(self._complementos),
+            }
@@ -0,0 +1,184 @@
+"""
+Renderização dos planos em PDF a partir de templates HTML/CSS (WeasyPrint).
+
+O template Jinja2 é compilado uma única vez por processo, e a folha de
+estilos e a configuração de fontes são carregadas uma vez em cada worker.
+O layout (CPU) roda em um pool de processos para não bloquear as threads
+da API; `processes=0` renderiza no próprio processo. Os workers são
+criados com "spawn": o pool sobe a partir da thread de aquecimento, e um
+fork com outras threads em andamento pode herdar locks presos.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+CSS_PATH = os.path.join(TEMPLATES_DIR, "plano_dieta.css")
+
+
+_RE_UNIDADE_GRAMAS = re.compile(r"\s*(g|gr|grs|gramas?)\.?\s*$", re.IGNORECASE)
+
+
+def formatar_gramas(valor):
+    # Valores sem correspondência na TACO ficam como "n/d"; o modelo às vezes
+    # já escreve a unidade ("12 g", "12g"), que não deve sair duplicada
+    if valor in (None, "", "n/d"):
+        return "n/d"
+    return f"{_RE_UNIDADE_GRAMAS.sub('', str(valor).strip())}g"
+
+
+_env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False,
+)
+_env.filters["gramas"] = formatar_gramas
+_template_plano = _env.get_template("plano_dieta.html")
+_template_semana = _env.get_template("plano_semanal.html")
+
+# Estilos e fontes do processo atual (carregados na primeira renderização)
+_recursos = {}
+
+
+def _carregar_recursos():
+    if not _recursos:
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        font_config = FontConfiguration()
+        _recursos["font_config"] = font_config
+        _recursos["css"] = CSS(filename=CSS_PATH, font_config=font_config)
+    return _recursos
+
+
+def render_html(plano_dieta, totais=None):
+    if totais is None:
+        from nutricional_core.totais import totais_plano
+        totais = totais_plano(plano_dieta)
+    refeicoes = list(zip(plano_dieta.get("refeições", []), totais["refeicoes"]))
+    return _template_plano.render(plano=plano_dieta, refeicoes=refeicoes, totais=totais)
+
+
+def render_semana_html(plano_semanal, totais):
+    """`totais`: um resultado de totais_plano por dia."""
+    dias = [
+        (dia, list(zip(dia["refeições"], totais_dia["refeicoes"])), totais_dia)
+        for dia, totais_dia in zip(plano_semanal["dias"], totais)
+    ]
+    return _template_semana.render(plano=plano_semanal, dias=dias)
+
+
+def html_para_pdf(html):
+    from weasyprint import HTML
+
+    recursos = _carregar_recursos()
+    return HTML(string=html, base_url=TEMPLATES_DIR).write_pdf(
+        stylesheets=[recursos["css"]],
+        font_config=recursos["font_config"],
+    )
+
+
+def render_pdf(plano_dieta, totais=None):
+    return html_para_pdf(render_html(plano_dieta, totais))
+
+
+def render_semana_pdf(plano_semanal, totais):
+    return html_para_pdf(render_semana_html(plano_semanal, totais))
+
+
+def _render_lote(itens):
+    return [render_pdf(plano, totais) for plano, totais in itens]
+
+
+def _aquecer():
+    # Executado em cada worker ao iniciar: carrega CSS e fontes antecipadamente
+    _carregar_recursos()
+
+
+class PdfRenderer:
+    """Pool de processos para renderizar PDFs, com medição de tempo."""
+
+    def __init__(self, processes=None):
+        self.processes = os.cpu_count() if processes is None else processes
+        self._executor = None
+        self._lock = threading.Lock()
+        self.metrics = {"pdfs": 0, "lotes": 0, "segundos": 0.0}
+
+    def start(self):
+        if self.processes > 0 and self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_aquecer,
+            )
+            # Cria os processos já na inicialização, e não na primeira requisição
+            for futuro in [self._executor.submit(_aquecer) for _ in range(self.processes)]:
+                futuro.result()
+            logging.info(f"Pool de renderização de PDF iniciado com {self.processes} processos")
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _registrar(self, quantidade, segundos, lote=False):
+        with self._lock:
+            self.metrics["pdfs"] += quantidade
+            self.metrics["segundos"] += segundos
+            if lote:
+                self.metrics["lotes"] += 1
+
+    def _executar(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+        return self._executor.submit(fn, *args).result()
+
+    def render(self, plano_dieta, totais=None):
+        inicio = time.perf_counter()
+        pdf = self._executar(render_pdf, plano_dieta, totais)
+        duracao = time.perf_counter() - inicio
+        self._registrar(1, duracao)
+        logging.info(f"PDF renderizado em {duracao * 1000:.0f} ms")
+        return pdf
+
+    def render_semana(self, plano_semanal, totais):
+        inicio = time.perf_counter()
+        pdf = self._executar(render_semana_pdf, plano_semanal, totais)
+        duracao = time.perf_counter() - inicio
+        self._registrar(1, duracao)
+        logging.info(f"PDF semanal ({len(plano_semanal['dias'])} dias) renderizado em {duracao * 1000:.0f} ms")
+        return pdf
+
+    async def arender(self, plano_dieta, totais=None):
+        return await asyncio.get_running_loop().run_in_executor(None, self.render, plano_dieta, totais)
+
+    def render_many(self, planos, totais=None):
+        """Renderiza vários planos de uma vez, em lotes distribuídos entre os processos."""
+        itens = list(zip(planos, totais or [None] * len(planos)))
+        if not itens:
+            return []
+        inicio = time.perf_counter()
+        if self._executor is None:
+            pdfs = _render_lote(itens)
+        else:
+            tamanho = max(1, len(itens) // (self.processes * 4))
+            lotes = [itens[i:i + tamanho] for i in range(0, len(itens), tamanho)]
+            pdfs = [pdf for lote in self._executor.map(_render_lote, lotes) for pdf in lote]
+        duracao = time.perf_counter() - inicio
+        self._registrar(len(itens), duracao, lote=True)
+        logging.info(f"{len(itens)} PDFs renderizados em {duracao:.2f}s ({duracao / len(itens) * 1000:.0f} ms/plano)")
+        return pdfs
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics)
+        stats["ms_por_pdf"] = round(stats["segundos"] / stats["pdfs"] * 1000, 1) if stats["pdfs"] else None
+        stats["processos"] = self.processes
+        return stats
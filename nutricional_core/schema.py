@@ -0,0 +1,101 @@
+"""
+Validação rápida do JSON da LLM contra o `<output>` de um rail_spec.
+
+O rail é convertido uma única vez (na inicialização) em uma árvore de
+funções de checagem; validar um plano é só percorrer o dicionário já
+parseado, sem reparsear o texto nem acionar o guard.
+"""
+import json
+import xml.etree.ElementTree as ET
+
+
+class SchemaError(ValueError):
+    """O documento não segue o schema do rail."""
+
+
+def extrair_json(texto):
+    # Remove texto extra (ex.: cercas ```json) ao redor do objeto
+    inicio = texto.index("{")
+    fim = texto.rindex("}")
+    return json.loads(texto[inicio:fim + 1])
+
+
+def _obrigatorio(elemento):
+    return elemento.get("required", "true").lower() != "false"
+
+
+def _compilar(elemento, caminho):
+    tag = elemento.tag
+
+    if tag == "string":
+        def validar_string(valor, caminho=caminho):
+            if not isinstance(valor, str):
+                raise SchemaError(f"{caminho}: esperado texto, recebido {type(valor).__name__}")
+        return validar_string
+
+    if tag == "object":
+        campos = [
+            (filho.get("name"), _obrigatorio(filho), _compilar(filho, f"{caminho}.{filho.get('name')}"))
+            for filho in elemento
+        ]
+
+        def validar_objeto(valor, caminho=caminho):
+            if not isinstance(valor, dict):
+                raise SchemaError(f"{caminho}: esperado objeto")
+            for nome, obrigatorio, validar in campos:
+                if nome in valor:
+                    validar(valor[nome])
+                elif obrigatorio:
+                    raise SchemaError(f"{caminho}: campo '{nome}' ausente")
+        return validar_objeto
+
+    if tag == "list":
+        filhos = list(elemento)
+        validar_item = _compilar(filhos[0], f"{caminho}[]") if filhos else None
+
+        def validar_lista(valor, caminho=caminho):
+            if not isinstance(valor, list):
+                raise SchemaError(f"{caminho}: esperado lista")
+            if validar_item is not None:
+                for item in valor:
+                    validar_item(item)
+        return validar_lista
+
+    raise ValueError(f"Tipo de elemento não suportado no rail: {tag}")
+
+
+def compilar_rail(rail_spec):
+    """
+    Compila o `<output>` do rail em uma função `validar(documento)` que
+    levanta SchemaError se o documento (já parseado) não segue o schema.
+    """
+    output = ET.fromstring(rail_spec.strip()).find("output")
+    validador = _compilar_objeto_raiz(output)
+
+    def validar(documento):
+        validador(documento)
+        return documento
+    return validar
+
+
+def _compilar_objeto_raiz(output):
+    # O <output> funciona como um objeto sem nome
+    raiz = ET.Element("object", name="")
+    raiz.extend(list(output))
+    return _compilar(raiz, "$")
+
+
+def compilar_campo(rail_spec, *nomes):
+    """
+    Validador de uma parte do `<output>` (ex.: "plano_dieta", "refeições"):
+    segue os nomes a partir da raiz; se o último for uma lista, valida um
+    item dela.
+    """
+    elemento = ET.fromstring(rail_spec.strip()).find("output")
+    for nome in nomes:
+        elemento = next((filho for filho in elemento if filho.get("name") == nome), None)
+        if elemento is None:
+            raise ValueError(f"Campo não encontrado no rail: {'.'.join(nomes)}")
+    if elemento.tag == "list":
+        return _compilar(list(elemento)[0], f"$.{'.'.join(nomes)}[]")
+    return _compilar(elemento, f"$.{'.'.join(nomes)}")
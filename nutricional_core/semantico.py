@@ -0,0 +1,209 @@
+"""
+Cache semântico de respostas do chatbot.
+
+As perguntas são convertidas em embeddings por um modelo local (CPU) e
+indexadas por LSH (hiperplanos aleatórios, várias tabelas): a busca só
+compara a pergunta com os candidatos dos mesmos baldes. Os vetores ficam
+em `vetores.npy`, aberto com mmap ao carregar, e os metadados em
+`entradas.json`. Só devem ser guardadas respostas já validadas pelo guard.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from nutricional_core.cache import normalizar_texto
+
+MODELO_PADRAO = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+
+def carregar_embedder(modelo=MODELO_PADRAO):
+    """Função texto(s) -> vetores normalizados, usando sentence-transformers em CPU."""
+    from sentence_transformers import SentenceTransformer
+
+    encoder = SentenceTransformer(modelo, device="cpu")
+
+    def embed(textos):
+        return encoder.encode(textos, normalize_embeddings=True, convert_to_numpy=True)
+    return embed
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        embed,
+        dim,
+        path=None,
+        limiar=0.9,
+        max_entries=5000,
+        ttl=7 * 24 * 3600,
+        tabelas=4,
+        bits=10,
+        salvar_a_cada=20,
+        seed=0,
+    ):
+        self.embed = embed
+        self.dim = dim
+        self.path = path
+        self.limiar = limiar
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.salvar_a_cada = salvar_a_cada
+        self._planos = np.random.default_rng(seed).standard_normal((dim, tabelas * bits)).astype(np.float32)
+        self._tabelas = tabelas
+        self._bits = bits
+        self._pesos = 1 << np.arange(bits, dtype=np.int64)
+        self._lock = threading.Lock()
+        self._pendentes = 0
+        self.metrics = {"hits": 0, "misses": 0, "expirados": 0, "removidos": 0}
+
+        self._vetores = np.zeros((0, dim), dtype=np.float32)
+        self._entradas = []  # dicts com pergunta, resposta, created_at, last_hit, hits (None = slot livre)
+        if path and os.path.exists(os.path.join(path, "entradas.json")):
+            self._carregar()
+        self._reindexar()
+
+    # Persistência
+
+    def _carregar(self):
+        with open(os.path.join(self.path, "entradas.json"), encoding="utf-8") as f:
+            self._entradas = json.load(f)
+        # Somente leitura e compartilhado entre processos até a primeira escrita
+        self._vetores = np.load(os.path.join(self.path, "vetores.npy"), mmap_mode="r")
+        if self._vetores.shape != (len(self._entradas), self.dim):
+            logging.warning("Cache semântico inconsistente em disco; começando vazio")
+            self._vetores = np.zeros((0, self.dim), dtype=np.float32)
+            self._entradas = []
+        logging.info(f"Cache semântico carregado: {self._ativos()} entradas")
+
+    def salvar(self):
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            vetores = np.array(self._vetores[:len(self._entradas)])
+            entradas = [dict(e) if e is not None else None for e in self._entradas]
+            self._pendentes = 0
+        # Grava em arquivos temporários e troca, para não corromper um mmap aberto
+        tmp_vetores = os.path.join(self.path, "vetores.tmp.npy")
+        tmp_entradas = os.path.join(self.path, "entradas.json.tmp")
+        np.save(tmp_vetores, vetores)
+        with open(tmp_entradas, "w", encoding="utf-8") as f:
+            json.dump(entradas, f, ensure_ascii=False)
+        os.replace(tmp_vetores, os.path.join(self.path, "vetores.npy"))
+        os.replace(tmp_entradas, os.path.join(self.path, "entradas.json"))
+
+    # Índice LSH
+
+    def _codigos(self, vetores):
+        bits = (np.asarray(vetores, dtype=np.float32) @ self._planos) > 0
+        bits = bits.reshape(len(bits), self._tabelas, self._bits)
+        return bits.astype(np.int64) @ self._pesos
+
+    def _reindexar(self):
+        self._baldes = [dict() for _ in range(self._tabelas)]
+        if len(self._entradas):
+            for indice, codigos in enumerate(self._codigos(self._vetores[:len(self._entradas)])):
+                if self._entradas[indice] is not None:
+                    self._indexar(indice, codigos)
+
+    def _indexar(self, indice, codigos):
+        for tabela, codigo in enumerate(codigos):
+            self._baldes[tabela].setdefault(int(codigo), set()).add(indice)
+
+    def _desindexar(self, indice):
+        codigos = self._codigos(self._vetores[indice:indice + 1])[0]
+        for tabela, codigo in enumerate(codigos):
+            self._baldes[tabela].get(int(codigo), set()).discard(indice)
+
+    def _candidatos(self, codigos):
+        candidatos = set()
+        for tabela, codigo in enumerate(codigos):
+            candidatos |= self._baldes[tabela].get(int(codigo), set())
+        return candidatos
+
+    # Operações
+
+    def _ativos(self):
+        return sum(1 for e in self._entradas if e is not None)
+
+    def _remover(self, indice):
+        # Chamado com o lock
+        self._desindexar(indice)
+        self._entradas[indice] = None
+
+    def embedding(self, pergunta):
+        vetor = np.asarray(self.embed([normalizar_texto(pergunta)])[0], dtype=np.float32)
+        return vetor / (np.linalg.norm(vetor) or 1.0)
+
+    def get(self, pergunta, vetor=None):
+        """Resposta em cache para uma pergunta parecida, ou None."""
+        vetor = self.embedding(pergunta) if vetor is None else vetor
+        codigos = self._codigos(vetor[None, :])[0]
+        agora = time.time()
+        with self._lock:
+            candidatos = [i for i in self._candidatos(codigos) if self._entradas[i] is not None]
+            for indice in [i for i in candidatos if agora - self._entradas[i]["created_at"] > self.ttl]:
+                self._remover(indice)
+                self.metrics["expirados"] += 1
+                candidatos.remove(indice)
+            if not candidatos:
+                self.metrics["misses"] += 1
+                return None
+            similaridades = self._vetores[candidatos] @ vetor
+            melhor = int(np.argmax(similaridades))
+            if similaridades[melhor] < self.limiar:
+                self.metrics["misses"] += 1
+                return None
+            entrada = self._entradas[candidatos[melhor]]
+            entrada["hits"] += 1
+            entrada["last_hit"] = agora
+            self.metrics["hits"] += 1
+            return entrada["resposta"]
+
+    def put(self, pergunta, resposta, vetor=None):
+        """Guarda uma resposta já validada pelo guard."""
+        vetor = self.embedding(pergunta) if vetor is None else vetor
+        agora = time.time()
+        entrada = {"pergunta": pergunta, "resposta": resposta, "created_at": agora, "last_hit": agora, "hits": 0}
+        with self._lock:
+            if self._ativos() >= self.max_entries:
+                # LRU: remove a entrada usada há mais tempo
+                indice = min(
+                    (i for i, e in enumerate(self._entradas) if e is not None),
+                    key=lambda i: self._entradas[i]["last_hit"]
+                )
+                self._remover(indice)
+                self.metrics["removidos"] += 1
+
+            livres = [i for i, e in enumerate(self._entradas) if e is None]
+            if livres:
+                indice = livres[0]
+                self._entradas[indice] = entrada
+            else:
+                indice = len(self._entradas)
+                self._entradas.append(entrada)
+            if not self._vetores.flags.writeable or indice >= len(self._vetores):
+                # Sai do mmap (somente leitura) e cresce com folga
+                vetores = np.zeros((max(16, 2 * len(self._entradas)), self.dim), dtype=np.float32)
+                vetores[:len(self._vetores)] = self._vetores
+                self._vetores = vetores
+            self._vetores[indice] = vetor
+            self._indexar(indice, self._codigos(vetor[None, :])[0])
+            self._pendentes += 1
+            salvar = self._pendentes >= self.salvar_a_cada
+        if salvar:
+            self.salvar()
+
+    def stats(self, top=10):
+        with self._lock:
+            entradas = [e for e in self._entradas if e is not None]
+            mais_usadas = sorted(entradas, key=lambda e: e["hits"], reverse=True)[:top]
+            return {
+                **self.metrics,
+                "entradas": len(entradas),
+                "mais_usadas": [{"pergunta": e["pergunta"], "hits": e["hits"]} for e in mais_usadas],
+            }
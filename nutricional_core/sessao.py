@@ -0,0 +1,124 @@
+"""
+Sessões de conversa do chatbot com histórico limitado por tokens.
+
+As mensagens enviadas ao modelo começam sempre pelo mesmo system prompt
+(prefixo estável, aproveitado pelo cache de prompt do provedor); depois vêm
+o resumo dos turnos antigos e os turnos recentes. Quando o histórico passa
+do orçamento, os turnos mais antigos são resumidos, e o tamanho da
+requisição fica limitado independentemente da duração da conversa.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+
+def contar_tokens(texto):
+    # Aproximação de ~4 caracteres por token (mesma do limitador de taxa)
+    return len(texto) // 4 + 1
+
+
+class ChatSession:
+    def __init__(self, sessao_id=None, max_tokens_historico=1500, turnos_recentes=4):
+        self.id = sessao_id or uuid.uuid4().hex
+        self.max_tokens_historico = max_tokens_historico
+        # Número mínimo de turnos (pergunta + resposta) mantidos na íntegra
+        self.turnos_recentes = turnos_recentes
+        self.resumo = ""
+        self.turnos = []  # [{"role": "user"|"assistant", "content": ...}]
+        self.atualizada_em = time.time()
+
+    def mensagens(self, system_prompt, pergunta):
+        mensagens = [{"role": "system", "content": system_prompt}]
+        if self.resumo:
+            mensagens.append({"role": "system", "content": f"Resumo da conversa até aqui: {self.resumo}"})
+        mensagens.extend(self.turnos)
+        mensagens.append({"role": "user", "content": pergunta})
+        return mensagens
+
+    def registrar(self, pergunta, resposta):
+        self.turnos.append({"role": "user", "content": pergunta})
+        self.turnos.append({"role": "assistant", "content": resposta})
+        self.atualizada_em = time.time()
+
+    def tokens_historico(self):
+        return contar_tokens(self.resumo) + sum(contar_tokens(t["content"]) for t in self.turnos)
+
+    def compactar(self, resumir):
+        """
+        Se o histórico passou do orçamento, resume os turnos mais antigos com
+        `resumir(resumo_atual, turnos) -> novo resumo`. Retorna True se resumiu.
+        """
+        if self.tokens_historico() <= self.max_tokens_historico:
+            return False
+        manter = 2 * self.turnos_recentes
+        # Mesmo com poucos turnos, uma única resposta longa pode estourar o orçamento
+        while manter > 0 and sum(contar_tokens(t["content"]) for t in self.turnos[-manter:]) > self.max_tokens_historico // 2:
+            manter -= 2
+        antigos = self.turnos[:len(self.turnos) - manter]
+        if not antigos:
+            return False
+        self.resumo = resumir(self.resumo, antigos)
+        self.turnos = self.turnos[len(antigos):]
+        logging.info(f"Sessão {self.id}: {len(antigos)} mensagens resumidas ({self.tokens_historico()} tokens de histórico)")
+        return True
+
+    def to_dict(self):
+        return {"id": self.id, "resumo": self.resumo, "turnos": self.turnos, "atualizada_em": self.atualizada_em}
+
+    @classmethod
+    def from_dict(cls, dados, **kwargs):
+        sessao = cls(dados["id"], **kwargs)
+        sessao.resumo = dados.get("resumo", "")
+        sessao.turnos = list(dados.get("turnos", []))
+        sessao.atualizada_em = dados.get("atualizada_em", time.time())
+        return sessao
+
+
+def prompt_resumo(resumo, turnos):
+    """Mensagens para o modelo resumir os turnos antigos."""
+    conversa = "\n".join(f"{t['role']}: {t['content']}" for t in turnos)
+    return [
+        {"role": "system", "content": "Resuma a conversa de forma objetiva, mantendo dados do usuário (peso, objetivos, restrições) e recomendações já feitas. Responda só com o resumo."},
+        {"role": "user", "content": f"Resumo anterior: {resumo or '(nenhum)'}\n\nNovos trechos:\n{conversa}"},
+    ]
+
+
+class SessionStore:
+    """Guarda as sessões em arquivos JSON, para sobreviverem a recarregamentos da página."""
+
+    def __init__(self, path, ttl=7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _arquivo(self, sessao_id):
+        if not re.fullmatch(r"[0-9a-f]{32}", sessao_id or ""):
+            return None
+        return os.path.join(self.path, f"{sessao_id}.json")
+
+    def get(self, sessao_id, **kwargs):
+        arquivo = self._arquivo(sessao_id)
+        if arquivo is None or not os.path.exists(arquivo):
+            return None
+        try:
+            with open(arquivo, encoding="utf-8") as f:
+                dados = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Sessão {sessao_id} ilegível: {e}")
+            return None
+        if time.time() - dados.get("atualizada_em", 0) > self.ttl:
+            return None
+        return ChatSession.from_dict(dados, **kwargs)
+
+    def save(self, sessao):
+        arquivo = self._arquivo(sessao.id)
+        tmp = f"{arquivo}.tmp"
+        with self._lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(sessao.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp, arquivo)
@@ -0,0 +1,134 @@
+import json
+
+CHAVE_PLANO = "plano_dieta"
+CHAVES_REFEICOES = {"refeições", "Refeições"}
+
+
+class _Frame:
+    __slots__ = ("tipo", "nome", "inicio", "chave", "espera_chave")
+
+    def __init__(self, tipo, nome, inicio):
+        self.tipo = tipo  # "{" ou "["
+        self.nome = nome  # chave deste container no objeto pai (None dentro de listas)
+        self.inicio = inicio
+        self.chave = None
+        self.espera_chave = tipo == "{"
+
+
+class PlanoStreamParser:
+    """
+    Parser incremental do JSON `plano_dieta` produzido pela LLM.
+
+    Recebe o texto em pedaços (tokens do stream) e devolve eventos assim que
+    cada campo de primeiro nível do plano ou cada item de `refeições` fecha
+    (a lista `refeições` em si não é emitida como campo):
+
+        ("campo", nome, valor)
+        ("refeicao", indice, refeicao)
+
+    Texto antes do primeiro "{" (ex.: cercas ```json) é ignorado.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self._pos = 0
+        self._pilha = []
+        self._em_string = False
+        self._escape = False
+        self._inicio_string = None
+        self._inicio_escalar = None
+        self._refeicoes = 0
+        self._fim = False
+
+    @property
+    def texto(self):
+        return "".join(self.buffer)
+
+    def feed(self, pedaco):
+        eventos = []
+        for c in pedaco:
+            self.buffer.append(c)
+            self._processar(c, self._pos, eventos)
+            self._pos += 1
+        return eventos
+
+    def _trecho(self, inicio, fim):
+        return "".join(self.buffer[inicio:fim + 1])
+
+    def _no_plano(self, profundidade_pai):
+        # O container pai está diretamente em {"plano_dieta": {...}}
+        return (
+            len(self._pilha) == profundidade_pai + 1
+            and profundidade_pai >= 1
+            and self._pilha[1].nome == CHAVE_PLANO
+        )
+
+    def _valor_concluido(self, inicio, fim, eventos):
+        if not self._pilha:
+            return
+        pai = self._pilha[-1]
+        if pai.tipo == "{" and self._no_plano(1):
+            # A lista de refeições já foi emitida item a item
+            if pai.chave in CHAVES_REFEICOES:
+                return
+            eventos.append(("campo", pai.chave, json.loads(self._trecho(inicio, fim))))
+        elif (
+            pai.tipo == "["
+            and len(self._pilha) == 3
+            and self._pilha[1].nome == CHAVE_PLANO
+            and pai.nome in CHAVES_REFEICOES
+        ):
+            eventos.append(("refeicao", self._refeicoes, json.loads(self._trecho(inicio, fim))))
+            self._refeicoes += 1
+
+    def _fechar_escalar(self, fim, eventos):
+        if self._inicio_escalar is not None:
+            self._valor_concluido(self._inicio_escalar, fim, eventos)
+            self._inicio_escalar = None
+
+    def _processar(self, c, i, eventos):
+        if self._fim:
+            return
+
+        if self._em_string:
+            if self._escape:
+                self._escape = False
+            elif c == "\\":
+                self._escape = True
+            elif c == '"':
+                self._em_string = False
+                frame = self._pilha[-1]
+                if frame.tipo == "{" and frame.espera_chave:
+                    frame.chave = json.loads(self._trecho(self._inicio_string, i))
+                else:
+                    self._valor_concluido(self._inicio_string, i, eventos)
+            return
+
+        if not self._pilha:
+            if c == "{":
+                self._pilha.append(_Frame("{", None, i))
+            return
+
+        frame = self._pilha[-1]
+        if c == '"':
+            self._em_string = True
+            self._inicio_string = i
+        elif c in "{[":
+            nome = frame.chave if frame.tipo == "{" else None
+            self._pilha.append(_Frame(c, nome, i))
+        elif c in "}]":
+            self._fechar_escalar(i - 1, eventos)
+            self._pilha.pop()
+            if not self._pilha:
+                self._fim = True
+                return
+            self._valor_concluido(frame.inicio, i, eventos)
+        elif c == ":":
+            frame.espera_chave = False
+        elif c == ",":
+            self._fechar_escalar(i - 1, eventos)
+            if frame.tipo == "{":
+                frame.espera_chave = True
+        elif not c.isspace() and self._inicio_escalar is None:
+            # Números, true/false/null
+            self._inicio_escalar = i
@@ -0,0 +1,185 @@
+import csv
+import os
+import re
+from array import array
+
+from nutricional_core.cache import remover_acentos
+
+TACO_CSV = os.path.join(os.path.dirname(__file__), "dados", "taco.csv")
+
+# Palavras ignoradas na comparação de nomes
+STOPWORDS = {"de", "da", "do", "das", "dos", "com", "em", "e", "a", "o", "ao", "tipo", "sem"}
+
+# Fração mínima das palavras do nome pedido presentes no alimento da tabela;
+# a primeira palavra (o alimento em si) é sempre obrigatória
+LIMIAR_PALAVRAS = 0.6
+
+# Buscas memorizadas por tabela (a memória é esvaziada ao passar disto)
+MAX_BUSCAS = 4096
+
+_RE_QUANTIDADE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(kg|g|gr|gramas?|ml|l)\b", re.IGNORECASE)
+_RE_NUMERO = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*$")
+
+
+def normalizar_nome(nome):
+    texto = remover_acentos(nome).lower()
+    texto = re.sub(r"[^a-z0-9 ]", " ", texto)
+    return " ".join(t for t in texto.split() if t not in STOPWORDS)
+
+
+def trigramas(texto):
+    texto = f"  {texto} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def mesma_palavra(a, b):
+    """Igualdade tolerante a flexões: "ovo"/"ovos", "cozido"/"cozida"."""
+    if a == b:
+        return True
+    prefixo = os.path.commonprefix([a, b])
+    return len(prefixo) >= max(3, min(len(a), len(b)) - 1)
+
+
+def parse_gramas(quantidade):
+    """Converte "120 g", "1 xícara (160g)", "0,2 kg" ou "150" em gramas."""
+    if quantidade is None:
+        return None
+    if isinstance(quantidade, (int, float)):
+        return float(quantidade)
+    texto = str(quantidade)
+    match = _RE_QUANTIDADE.search(texto)
+    if match:
+        valor = float(match.group(1).replace(",", "."))
+        unidade = match.group(2).lower()
+        if unidade in ("kg", "l"):
+            valor *= 1000
+        return valor
+    match = _RE_NUMERO.match(texto)
+    if match:
+        return float(match.group(1).replace(",", "."))
+    return None
+
+
+class TabelaTaco:
+    """
+    Tabela TACO em arrays contíguos (proteína, carboidrato e gordura por
+    100 g) com índice de trigramas para busca aproximada dos nomes. Os
+    trigramas só escolhem candidatos e desempatam: um alimento só é aceito
+    se contiver a primeira palavra do nome pedido e ao menos
+    LIMIAR_PALAVRAS das demais (assim "peixe grelhado" não vira frango
+    grelhado, nem "suco de laranja" a fruta).
+    """
+
+    def __init__(self, csv_path=TACO_CSV):
+        self.nomes = []
+        self.proteina = array("d")
+        self.carboidrato = array("d")
+        self.gordura = array("d")
+        self._trigramas = []
+        self._palavras = []
+        self._indice = {}
+        self._buscas = {}
+
+        with open(csv_path, encoding="utf-8") as f:
+            linhas = (linha for linha in f if not linha.startswith("#"))
+            for registro in csv.DictReader(linhas, delimiter=";"):
+                self._adicionar(registro)
+
+    def _adicionar(self, registro):
+        i = len(self.nomes)
+        self.nomes.append(registro["nome"])
+        self.proteina.append(float(registro["proteina"]))
+        self.carboidrato.append(float(registro["carboidrato"]))
+        self.gordura.append(float(registro["gordura"]))
+        normalizado = normalizar_nome(registro["nome"])
+        grams = trigramas(normalizado)
+        self._trigramas.append(grams)
+        self._palavras.append(normalizado.split())
+        for grama in grams:
+            self._indice.setdefault(grama, []).append(i)
+
+    def __len__(self):
+        return len(self.nomes)
+
+    def buscar(self, nome):
+        """Índice do alimento mais parecido com `nome`, ou None."""
+        chave = normalizar_nome(nome)
+        if chave in self._buscas:
+            return self._buscas[chave]
+
+        palavras = chave.split()
+        consulta = trigramas(chave)
+        contagem = {}
+        for grama in consulta:
+            for i in self._indice.get(grama, ()):
+                contagem[i] = contagem.get(i, 0) + 1
+
+        melhor, melhor_score = None, 0.0
+        for i, comuns in contagem.items():
+            nome = self._palavras[i]
+            presentes = [any(mesma_palavra(p, n) for n in nome) for p in palavras]
+            cobertura = sum(presentes) / len(palavras)
+            if not presentes[0] or cobertura < LIMIAR_PALAVRAS:
+                continue
+            # Entre os aceitos, o de mais palavras em comum; desempate pelo Dice
+            dice = 2 * comuns / (len(consulta) + len(self._trigramas[i]))
+            score = cobertura + 0.1 * dice
+            if score > melhor_score:
+                melhor, melhor_score = i, score
+
+        if len(self._buscas) >= MAX_BUSCAS:
+            self._buscas.clear()
+        self._buscas[chave] = melhor
+        return melhor
+
+    def macros(self, nome, gramas):
+        """(proteína, carboidrato, gordura) em gramas para a quantidade dada."""
+        i = self.buscar(nome)
+        if i is None:
+            return None
+        fator = gramas / 100
+        return (
+            round(self.proteina[i] * fator, 1),
+            round(self.carboidrato[i] * fator, 1),
+            round(self.gordura[i] * fator, 1),
+        )
+
+
+_tabela = None
+
+
+def get_tabela():
+    global _tabela
+    if _tabela is None:
+        _tabela = TabelaTaco()
+    return _tabela
+
+
+def preencher_refeicao(refeicao, tabela=None, valor_ausente=None):
+    """
+    Substitui os macros de cada ingrediente pelos valores da TACO calculados
+    a partir de `quantidade`. Ingredientes sem correspondência mantêm o valor
+    original (ou recebem `valor_ausente`, se informado). Retorna quantos
+    ingredientes foram preenchidos.
+    """
+    tabela = tabela or get_tabela()
+    preenchidos = 0
+    for ingrediente in refeicao.get("ingredientes", []):
+        gramas = parse_gramas(ingrediente.get("quantidade"))
+        macros = tabela.macros(ingrediente.get("nome", ""), gramas) if gramas is not None else None
+        if macros is not None:
+            ingrediente["proteina"], ingrediente["carboidrato"], ingrediente["gordura"] = (
+                f"{valor:.1f}" for valor in macros
+            )
+            preenchidos += 1
+        elif valor_ausente is not None:
+            for campo in ("proteina", "carboidrato", "gordura"):
+                ingrediente.setdefault(campo, valor_ausente)
+    return preenchidos
+
+
+def preencher_macros(plano_dieta, tabela=None, valor_ausente=None):
+    return sum(
+        preencher_refeicao(refeicao, tabela, valor_ausente)
+        for refeicao in plano_dieta.get("refeições", [])
+    )
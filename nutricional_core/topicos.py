@@ -0,0 +1,178 @@
+"""
+Classificação local de tópicos (zero-shot) para o guard do chatbot.
+
+O modelo é carregado uma vez por processo e fica aquecido. Pedidos de
+sessões concorrentes entram em uma fila e são classificados em lotes por
+uma thread dedicada. Os veredictos ficam em cache pelo hash do texto, e
+só os casos incertos precisam ir para a checagem por LLM.
+"""
+import hashlib
+import logging
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+VALIDO = "valido"
+INVALIDO = "invalido"
+INCERTO = "incerto"
+
+
+class TopicClassifier:
+    def __init__(
+        self,
+        valid_topics,
+        invalid_topics,
+        model="facebook/bart-large-mnli",
+        device=-1,
+        batch_size=8,
+        max_wait=0.02,
+        limiar=0.7,
+        cache_size=2048,
+        max_chars=2000,
+        pipeline=None,
+    ):
+        self.valid_topics = list(valid_topics)
+        self.invalid_topics = list(invalid_topics)
+        self.model = model
+        self.device = device
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.limiar = limiar
+        self.cache_size = cache_size
+        self.max_chars = max_chars
+        # Pipeline já construído (opcional); sem ele, carrega `model` em start()
+        self._pipeline = pipeline
+        self._fila = queue.Queue()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.metrics = {VALIDO: 0, INVALIDO: 0, INCERTO: 0, "cache_hits": 0, "lotes": 0}
+
+    def start(self):
+        """Carrega o modelo, faz uma inferência de aquecimento e inicia a thread de lotes."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            inicio = time.perf_counter()
+            if self._pipeline is None:
+                from transformers import pipeline
+                self._pipeline = pipeline("zero-shot-classification", model=self.model, device=self.device)
+            self._classificar_lote(["aquecimento"])
+            logging.info(f"Classificador de tópicos carregado em {time.perf_counter() - inicio:.1f}s")
+            self._thread = threading.Thread(target=self._loop, name="topic-classifier", daemon=True)
+            self._thread.start()
+
+    def verificar(self, texto, timeout=30):
+        """
+        Retorna (veredito, scores): VALIDO, INVALIDO ou INCERTO, e o score
+        de cada tópico.
+        """
+        texto = texto[:self.max_chars]
+        chave = hashlib.sha256(texto.encode("utf-8")).hexdigest()
+        with self._lock:
+            resultado = self._cache.get(chave)
+            if resultado is not None:
+                self._cache.move_to_end(chave)
+                self.metrics["cache_hits"] += 1
+                return resultado
+
+        if self._thread is None:
+            self.start()
+        futuro = Future()
+        self._fila.put((texto, futuro))
+        scores = futuro.result(timeout=timeout)
+        resultado = (self._decidir(scores), scores)
+
+        with self._lock:
+            self.metrics[resultado[0]] += 1
+            self._cache[chave] = resultado
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return resultado
+
+    def stats(self):
+        with self._lock:
+            return dict(self.metrics)
+
+    def _decidir(self, scores):
+        melhor_valido = max(scores[t] for t in self.valid_topics)
+        melhor_invalido = max(scores[t] for t in self.invalid_topics)
+        if melhor_valido >= self.limiar and melhor_valido > melhor_invalido:
+            return VALIDO
+        if melhor_invalido >= self.limiar and melhor_invalido > melhor_valido:
+            return INVALIDO
+        return INCERTO
+
+    def _classificar_lote(self, textos):
+        saidas = self._pipeline(
+            textos,
+            candidate_labels=self.valid_topics + self.invalid_topics,
+            multi_label=True,
+            batch_size=self.batch_size,
+        )
+        if isinstance(saidas, dict):
+            saidas = [saidas]
+        return [dict(zip(saida["labels"], saida["scores"])) for saida in saidas]
+
+    def _loop(self):
+        while True:
+            lote = [self._fila.get()]
+            # Espera um pouco para juntar pedidos de outras sessões
+            limite = time.monotonic() + self.max_wait
+            while len(lote) < self.batch_size:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._fila.get(timeout=restante))
+                except queue.Empty:
+                    break
+
+            try:
+                resultados = self._classificar_lote([texto for texto, _ in lote])
+            except Exception as e:
+                for _, futuro in lote:
+                    futuro.set_exception(e)
+                continue
+            with self._lock:
+                self.metrics["lotes"] += 1
+            for (_, futuro), scores in zip(lote, resultados):
+                futuro.set_result(scores)
+
+
+class ForaDoTopico(Exception):
+    """Trecho de uma resposta em streaming classificado como tópico não permitido."""
+
+    def __init__(self, topico, trecho):
+        super().__init__(f"Resposta fora do tópico ({topico})")
+        self.topico = topico
+        self.trecho = trecho
+
+
+_RE_FIM_DE_FRASE = re.compile(r"[.!?:;\n](?=\s|$)")
+
+
+def guardar_stream(pedacos, classificador, min_chars=200):
+    """
+    Repassa os pedaços de texto de um stream e, a cada fim de frase com pelo
+    menos `min_chars` caracteres novos, classifica o trecho. Levanta
+    ForaDoTopico no primeiro trecho INVALIDO, para o chamador fechar o
+    stream. O final do texto fica para a validação da resposta completa.
+    """
+    pendente = ""
+    for pedaco in pedacos:
+        yield pedaco
+        pendente += pedaco
+        if len(pendente) < min_chars:
+            continue
+        fins = list(_RE_FIM_DE_FRASE.finditer(pendente))
+        if not fins or fins[-1].end() < min_chars:
+            continue
+        trecho, pendente = pendente[:fins[-1].end()], pendente[fins[-1].end():]
+        veredito, scores = classificador.verificar(trecho)
+        if veredito == INVALIDO:
+            topico = max(classificador.invalid_topics, key=lambda t: scores[t])
+            raise ForaDoTopico(topico, trecho)
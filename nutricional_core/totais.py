@@ -0,0 +1,167 @@
+import json
+import re
+import sys
+from functools import lru_cache
+
+import numpy as np
+
+# kcal por grama de proteína, carboidrato e gordura
+KCAL_POR_GRAMA = np.array([4.0, 4.0, 9.0])
+
+# Desvio relativo máximo aceito entre o total calculado e as calorias declaradas
+TOLERANCIA = 0.10
+
+MACROS = ("proteina", "carboidrato", "gordura")
+
+_RE_NUMERO = re.compile(r"-?\d+(?:[.,]\d+)?")
+# Ponto de milhar ("2.000 kcal"): seguido de exatamente três dígitos
+_RE_MILHAR = re.compile(r"(?<=\d)\.(?=\d{3}(?!\d))")
+# Vírgula de milhar ("2,000 kcal"), só em textos sem ponto de milhar: em
+# "1.850,500" a vírgula é a parte decimal
+_RE_MILHAR_VIRGULA = re.compile(r"(?<=\d),(?=\d{3}(?![\d,]))")
+
+
+@lru_cache(maxsize=4096)
+def parse_valor(texto):
+    """Primeiro número de um valor livre ("12g", "12,5 g"); NaN se não houver."""
+    if isinstance(texto, (int, float)):
+        return float(texto)
+    match = _RE_NUMERO.search(str(texto or ""))
+    return float(match.group().replace(",", ".")) if match else float("nan")
+
+
+@lru_cache(maxsize=4096)
+def parse_calorias(texto):
+    """Calorias declaradas; para faixas ("1800-2000 kcal") usa a média."""
+    if isinstance(texto, (int, float)):
+        return float(texto)
+    texto = str(texto or "")
+    sem_milhar = _RE_MILHAR.sub("", texto)
+    if sem_milhar == texto:
+        sem_milhar = _RE_MILHAR_VIRGULA.sub("", texto)
+    numeros = [float(n.replace(",", ".")) for n in _RE_NUMERO.findall(sem_milhar)]
+    numeros = [abs(n) for n in numeros]
+    return sum(numeros[:2]) / len(numeros[:2]) if numeros else float("nan")
+
+
+def totais_planos(planos, tolerancia=TOLERANCIA):
+    """
+    Soma os macros de todos os ingredientes de vários planos de uma vez.
+
+    Retorna um dict de arrays:
+        refeicoes:  (R, 4) proteína, carboidrato, gordura e kcal por refeição
+        plano_da_refeicao: (R,) índice do plano de cada refeição
+        diario:     (N, 4) totais diários por plano
+        alvo:       (N,) calorias declaradas no plano (NaN se ausentes)
+        desvio:     (N,) desvio relativo entre o total e o alvo
+        consistente: (N,) desvio dentro da tolerância
+        ausentes:   (N,) quantidade de valores não numéricos ignorados
+    """
+    valores = []
+    refeicao_idx = []
+    n_refeicoes = []
+    alvo = []
+    refeicao_global = 0
+    for plano in planos:
+        refeicoes = plano.get("refeições", [])
+        n_refeicoes.append(len(refeicoes))
+        alvo.append(parse_calorias(plano.get("calorias")))
+        for refeicao in refeicoes:
+            for ingrediente in refeicao.get("ingredientes", []):
+                refeicao_idx.append(refeicao_global)
+                valores.extend(parse_valor(ingrediente.get(macro)) for macro in MACROS)
+            refeicao_global += 1
+
+    n_planos = len(n_refeicoes)
+    macros = np.array(valores, dtype=float).reshape(-1, 3)
+    refeicao_idx = np.array(refeicao_idx, dtype=np.intp)
+    plano_da_refeicao = np.repeat(np.arange(n_planos), n_refeicoes)
+
+    faltando = np.isnan(macros)
+    macros = np.where(faltando, 0.0, macros)
+
+    por_refeicao = np.empty((refeicao_global, 4))
+    for coluna in range(3):
+        por_refeicao[:, coluna] = np.bincount(refeicao_idx, weights=macros[:, coluna], minlength=refeicao_global)
+    por_refeicao[:, 3] = por_refeicao[:, :3] @ KCAL_POR_GRAMA
+
+    diario = np.empty((n_planos, 4))
+    for coluna in range(4):
+        diario[:, coluna] = np.bincount(plano_da_refeicao, weights=por_refeicao[:, coluna], minlength=n_planos)
+
+    ausentes = np.bincount(
+        plano_da_refeicao[refeicao_idx],
+        weights=faltando.sum(axis=1),
+        minlength=n_planos,
+    ).astype(int)
+
+    alvo = np.array(alvo, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        desvio = (diario[:, 3] - alvo) / alvo
+    consistente = np.abs(desvio) <= tolerancia
+
+    return {
+        "refeicoes": por_refeicao,
+        "plano_da_refeicao": plano_da_refeicao,
+        "diario": diario,
+        "alvo": alvo,
+        "desvio": desvio,
+        "consistente": consistente,
+        "ausentes": ausentes,
+    }
+
+
+def _linha(valores):
+    return {
+        "proteina": round(float(valores[0]), 1),
+        "carboidrato": round(float(valores[1]), 1),
+        "gordura": round(float(valores[2]), 1),
+        "calorias": round(float(valores[3])),
+    }
+
+
+def totais_plano(plano_dieta, tolerancia=TOLERANCIA):
+    """Totais de um único plano em formato serializável (resposta da API e PDF)."""
+    totais = totais_planos([plano_dieta], tolerancia)
+    alvo = totais["alvo"][0]
+    desvio = totais["desvio"][0]
+    return {
+        "refeicoes": [
+            {"refeicao": refeicao.get("refeicao"), **_linha(valores)}
+            for refeicao, valores in zip(plano_dieta.get("refeições", []), totais["refeicoes"])
+        ],
+        "diario": _linha(totais["diario"][0]),
+        "calorias_alvo": None if np.isnan(alvo) else round(float(alvo)),
+        "desvio": None if np.isnan(desvio) else round(float(desvio), 4),
+        "consistente": bool(totais["consistente"][0]),
+        "valores_ausentes": int(totais["ausentes"][0]),
+    }
+
+
+def main(argv):
+    """
+    Auditoria em lote: lê planos (um JSON por linha, com ou sem a chave
+    "plano_dieta") e imprime os que estão fora da tolerância.
+
+        python -m nutricional_core.totais planos.jsonl [tolerancia]
+    """
+    caminho = argv[0]
+    tolerancia = float(argv[1]) if len(argv) > 1 else TOLERANCIA
+    with open(caminho, encoding="utf-8") as f:
+        planos = [json.loads(linha) for linha in f if linha.strip()]
+    planos = [p.get("plano_dieta", p) for p in planos]
+
+    totais = totais_planos(planos, tolerancia)
+    inconsistentes = np.flatnonzero(~totais["consistente"])
+    for i in inconsistentes:
+        print(json.dumps({
+            "linha": int(i) + 1,
+            "calorias_alvo": None if np.isnan(totais["alvo"][i]) else float(totais["alvo"][i]),
+            "calorias_calculadas": round(float(totais["diario"][i, 3])),
+            "desvio": None if np.isnan(totais["desvio"][i]) else round(float(totais["desvio"][i]), 4),
+        }))
+    print(f"{len(inconsistentes)} de {len(planos)} planos fora da tolerância de {tolerancia:.0%}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
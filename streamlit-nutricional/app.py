@@ -1,31 +1,148 @@
 import streamlit as st
-from openai import OpenAI
+import atexit
+import logging
 import os
+import sys
 from dotenv import load_dotenv
 from PIL import Image
 
-# guardrails
-from guardrails import Guard
-from guardrails.hub import RestrictToTopic
-from guardrails.validators import ValidationResult
-
 load_dotenv()
 
-openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from nutricional_core.llm import get_client
+from nutricional_core.topicos import ForaDoTopico, TopicClassifier, VALIDO, INVALIDO, guardar_stream
+from nutricional_core.injecao import InjectionFilter
+from nutricional_core.semantico import SemanticCache, carregar_embedder
+from nutricional_core.sessao import ChatSession, SessionStore, prompt_resumo
+from nutricional_core.inicializacao import Warmup
+
+# Cliente OpenAI compartilhado (pool HTTP, limites de taxa, retentativas e prazo),
+# reaproveitado entre os reruns do script
+@st.cache_resource
+def get_llm_client():
+    return get_client()
+
+llm_client = get_llm_client()
+
+VALID_TOPICS = ["nutrition", "diet", "food", "health"]
+INVALID_TOPICS = ["politics", "entertainment", "technology", "sports", "music", "history", "science", "finance", "business", "policy", "religion", "travel", "pornography", "violence", "hate speech", "spam"]
+
+# Classificador local (bart-large-mnli em CPU), compartilhado entre sessões e
+# reruns do Streamlit: o modelo é carregado uma única vez e fica aquecido
+@st.cache_resource
+def get_classificador():
+    classificador = TopicClassifier(
+        valid_topics=VALID_TOPICS,
+        invalid_topics=INVALID_TOPICS,
+        model="facebook/bart-large-mnli",
+        device=-1,
+        limiar=float(os.getenv("TOPIC_THRESHOLD", "0.7"))
+    )
+    classificador.start()
+    return classificador
+
+# Triagem da pergunta antes da chamada ao gpt-4o-mini: padrões de prompt
+# injection, classificador pequeno e o classificador de tópicos acima
+@st.cache_resource
+def get_filtro_entrada():
+    return InjectionFilter(
+        limiar=float(os.getenv("INJECTION_THRESHOLD", "0.9")),
+        tokens_resposta=600,
+        custo_por_1k_tokens=float(os.getenv("LLM_COST_PER_1K_TOKENS", "0")),
+        classificador=get_classificador()
+    )
+
+# Cache semântico de respostas já aprovadas pelo guard: perguntas parecidas
+# ("quantas calorias tem um ovo?") reutilizam a resposta sem chamar o modelo
+@st.cache_resource
+def get_cache_semantico():
+    cache = SemanticCache(
+        embed=carregar_embedder(),
+        dim=384,
+        path=os.getenv("SEMANTIC_CACHE_DIR", ".cache/respostas"),
+        limiar=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+        max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000")),
+        ttl=float(os.getenv("SEMANTIC_CACHE_TTL", str(7 * 24 * 3600)))
+    )
+    atexit.register(cache.salvar)
+    return cache
 
 # Definir Guardrails para restringir o chatbot a tópicos específicos
 # https://hub.guardrailsai.com/validator/tryolabs/restricttotopic
-guard = Guard().use(
-    RestrictToTopic(
-        valid_topics=["nutrition", "diet", "food", "health"],
-        invalid_topics=["politics", "entertainment", "technology", "sports", "music", "history", "science", "finance", "business", "policy", "religion", "travel", "pornography", "violence", "hate speech", "spam"],
-        disable_classifier=True,
-        disable_llm=False,
-        device=-1,
-        model="facebook/bart-large-mnli",
-        on_fail="exception"
+# Usado apenas quando o classificador local fica incerto (checagem por LLM)
+@st.cache_resource
+def get_guard():
+    # Importado só aqui: o guardrails (e o hub) pesa na partida do app
+    from guardrails import Guard
+    from guardrails.hub import RestrictToTopic
+
+    return Guard().use(
+        RestrictToTopic(
+            valid_topics=VALID_TOPICS,
+            invalid_topics=INVALID_TOPICS,
+            disable_classifier=True,
+            disable_llm=False,
+            device=-1,
+            model="facebook/bart-large-mnli",
+            on_fail="exception"
+        )
     )
-)
+
+# Carrega os modelos locais e o guard em segundo plano, uma vez por processo,
+# em vez de na primeira pergunta (as funções com cache_resource podem ser
+# chamadas de outras threads)
+@st.cache_resource
+def get_aquecimento():
+    aquecimento = Warmup()
+    aquecimento.add("classificador", get_classificador)
+    aquecimento.add("filtro_entrada", get_filtro_entrada)
+    aquecimento.add("cache_semantico", get_cache_semantico, obrigatoria=False)
+    aquecimento.add("guard", get_guard, obrigatoria=False)
+    aquecimento.start()
+    return aquecimento
+
+# Orçamento de tokens do histórico enviado ao modelo; acima dele os turnos
+# mais antigos são resumidos
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "1500"))
+
+# Sessões também salvas no servidor (opcional), para sobreviverem a recarregamentos
+@st.cache_resource
+def get_session_store():
+    path = os.getenv("CHAT_SESSION_DIR")
+    return SessionStore(path) if path else None
+
+def get_sessao():
+    """Sessão de conversa do usuário, guardada em st.session_state."""
+    if "sessao" not in st.session_state:
+        store = get_session_store()
+        sessao_id = st.query_params.get("sessao")
+        sessao = store.get(sessao_id, max_tokens_historico=CHAT_HISTORY_TOKENS) if store and sessao_id else None
+        if sessao is None:
+            sessao = ChatSession(max_tokens_historico=CHAT_HISTORY_TOKENS)
+        if store:
+            st.query_params["sessao"] = sessao.id
+        st.session_state["sessao"] = sessao
+    return st.session_state["sessao"]
+
+def resumir_historico(resumo, turnos):
+    response = llm_client.chat(
+        model="gpt-4o-mini",
+        messages=prompt_resumo(resumo, turnos),
+        max_tokens=300,
+        temperature=0,
+    )
+    return response.choices[0].message.content.strip()
+
+def concluir_turno(sessao, user_input, assistant_response):
+    sessao.registrar(user_input, assistant_response)
+    try:
+        sessao.compactar(resumir_historico)
+    except Exception as e:
+        # Sem o resumo a conversa continua; a compactação é tentada no próximo turno
+        logging.warning(f"Erro ao resumir o histórico: {e}")
+    store = get_session_store()
+    if store:
+        store.save(sessao)
 
 def load_image(image_path, alt_message):
     if os.path.exists(image_path):
@@ -34,22 +151,79 @@ def load_image(image_path, alt_message):
         st.warning(alt_message)
         return None
 
-def get_response(user_input):
-    # Define o backstory e o prompt
-    backstory = """
+# Define o backstory e o prompt
+BACKSTORY = """
     Você é uma referência global no campo da nutrição, apelidado de "Mestre dos Alimentos" ou o "Nutrólogo Supremo". 
     Consultado por celebridades, atletas e profissionais de saúde, você desenvolve planos alimentares personalizados, equilibrando saúde, desempenho e sustentabilidade. 
     Com vasto conhecimento em bioquímica e dietas globais (como a mediterrânea, cetogênica e ayurvédica), você é defensor do consumo consciente e da preservação ambiental. 
     Agora,você expande sua expertise para o mundo digital, oferecendo orientação de alta qualidade para ajudar pessoas a montarem suas próprias dietas e responder dúvidas sobre alimentação.
     """
-    
+
+# Exibe a resposta token a token (STREAMING=0 volta para a resposta completa)
+STREAMING = os.getenv("STREAMING", "1") == "1"
+
+# Prefixo fixo em todas as requisições, para o cache de prompt do provedor
+SYSTEM_PROMPT = BACKSTORY + "\nResponda apenas a perguntas relacionadas a dieta e nutrição."
+
+def mensagens(user_input, sessao):
+    return sessao.mensagens(SYSTEM_PROMPT, user_input)
+
+def resposta_imediata(user_input, sessao):
+    """
+    Triagem da pergunta e busca no cache semântico, antes de chamar o
+    modelo. Retorna (resposta ou None, vetor da pergunta).
+    """
+    permitido, motivo = get_filtro_entrada().verificar(user_input)
+    if not permitido:
+        return f"Erro de validação: a pergunta não pôde ser processada ({motivo}).", None
+
+    # Perguntas no meio de uma conversa dependem do contexto e não usam o cache
+    if sessao.turnos or sessao.resumo:
+        return None, None
+
+    cache = get_cache_semantico()
+    vetor = cache.embedding(user_input)
+    return cache.get(user_input, vetor), vetor
+
+def validar_resposta(assistant_response):
+    """Retorna None se a resposta passa pelo guard, senão a mensagem de erro."""
+    try:
+        # Classificação local primeiro; o LLM só é consultado se ela for incerta
+        veredito, scores = get_classificador().verificar(assistant_response)
+        if veredito == VALIDO:
+            return None
+        if veredito == INVALIDO:
+            topico = max(INVALID_TOPICS, key=lambda t: scores[t])
+            return f"Erro de validação: a resposta trata de um tópico não permitido ({topico})."
+    except Exception as e:
+        return f"Erro ao aplicar Guardrails: {str(e)}"
+
+    try:
+        from guardrails.validators import ValidationResult
+
+        # Aplica o Guardrails para validar a resposta
+        validation_result = get_guard().validate(assistant_response)
+        if isinstance(validation_result, ValidationResult) and not validation_result.passed:
+            return f"Erro de validação: {validation_result.error_message}"
+        return None
+    except Exception as e:
+        return f"Erro ao aplicar Guardrails: {str(e)}"
+
+def guardar_no_cache(user_input, assistant_response, vetor):
+    if vetor is not None:
+        get_cache_semantico().put(user_input, assistant_response, vetor)
+
+def get_response(user_input, sessao):
+    resposta, vetor = resposta_imediata(user_input, sessao)
+    if resposta is not None:
+        if not resposta.startswith("Erro"):
+            concluir_turno(sessao, user_input, resposta)
+        return resposta
+
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini", 
-            messages=[
-                {"role": "system", "content": backstory},
-                {"role": "user", "content": f"Responda apenas a perguntas relacionadas a dieta e nutrição. Usuário: {user_input}"}
-            ],
+        response = llm_client.chat(
+            model="gpt-4o-mini",
+            messages=mensagens(user_input, sessao),
             max_tokens=2048,
             n=1,
             stop=None,
@@ -60,18 +234,61 @@ def get_response(user_input):
 
     assistant_response = response.choices[0].message.content.strip()
 
+    erro = validar_resposta(assistant_response)
+    if erro is not None:
+        return erro
+    guardar_no_cache(user_input, assistant_response, vetor)
+    concluir_turno(sessao, user_input, assistant_response)
+    return assistant_response
+
+def stream_response(user_input, sessao):
+    """
+    Gera os pedaços da resposta conforme chegam. O guard classifica o texto
+    a cada fim de frase; se sair do tópico, levanta ForaDoTopico e fecha o
+    stream, cancelando a requisição (os tokens restantes não são cobrados).
+    """
+    stream = llm_client.stream(
+        model="gpt-4o-mini",
+        messages=mensagens(user_input, sessao),
+        max_tokens=2048,
+        temperature=0.7,
+    )
+    try:
+        pedacos = (chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices)
+        yield from guardar_stream(pedacos, get_classificador())
+    finally:
+        stream.close()
+
+def exibir_em_streaming(user_input, sessao):
+    """Exibe a resposta conforme ela chega. Retorna a resposta aprovada, ou None."""
+    resposta, vetor = resposta_imediata(user_input, sessao)
+    if resposta is not None:
+        if resposta.startswith("Erro"):
+            st.error(resposta)
+            return None
+        st.markdown(resposta)
+        concluir_turno(sessao, user_input, resposta)
+        return resposta
+
+    area = st.empty()
     try:
-        # Aplica o Guardrails para validar a resposta
-        validation_result = guard.validate(assistant_response)
-        if isinstance(validation_result, ValidationResult):
-            if validation_result.passed:
-                return assistant_response
-            else:
-                return f"Erro de validação: {validation_result.error_message}"
-        else:
-            return assistant_response
+        with area.container():
+            assistant_response = st.write_stream(stream_response(user_input, sessao)).strip()
+    except ForaDoTopico as e:
+        area.error(f"Erro de validação: a resposta trata de um tópico não permitido ({e.topico}).")
+        return None
     except Exception as e:
-        return f"Erro ao aplicar Guardrails: {str(e)}"
+        area.error(f"Erro na API da OpenAI: {str(e)}")
+        return None
+
+    # Validação final sobre a resposta completa
+    erro = validar_resposta(assistant_response)
+    if erro is not None:
+        area.error(erro)
+        return None
+    guardar_no_cache(user_input, assistant_response, vetor)
+    concluir_turno(sessao, user_input, assistant_response)
+    return assistant_response
 
 # --------------------------------
 # Interface com Streamlit
@@ -96,17 +313,36 @@ nutrients_img = load_image('./assets/nutrients_lab.png.png', "Adicione uma image
 if nutrients_img:
     st.image(nutrients_img, use_container_width=True)
 
-user_input = st.text_input("Faça uma pergunta sobre dieta ou nutrição:")
+if not get_aquecimento().pronto():
+    st.caption("Carregando os modelos locais; a primeira resposta pode demorar um pouco.")
 
-if st.button("Enviar"):
+sessao = get_sessao()
+
+# Conversa exibida na tela (inclui turnos que já foram resumidos para o modelo)
+historico = st.session_state.setdefault("historico", list(sessao.turnos))
+for mensagem in historico:
+    with st.chat_message(mensagem["role"]):
+        st.markdown(mensagem["content"])
+
+user_input = st.chat_input("Faça uma pergunta sobre dieta ou nutrição:")
+
+if user_input is not None:
     if user_input.strip():
-        with st.spinner("Pensando..."):
-            response = get_response(user_input)
-            if response.startswith("Erro"):
-                st.error(response)
+        with st.chat_message("user"):
+            st.markdown(user_input)
+        with st.chat_message("assistant"):
+            if STREAMING:
+                response = exibir_em_streaming(user_input, sessao)
             else:
-                st.success("Resposta:")
-                st.write(response)
+                with st.spinner("Pensando..."):
+                    response = get_response(user_input, sessao)
+                if response.startswith("Erro"):
+                    st.error(response)
+                    response = None
+                else:
+                    st.markdown(response)
+        if response is not None:
+            historico.append({"role": "user", "content": user_input})
+            historico.append({"role": "assistant", "content": response})
     else:
         st.warning("Por favor, insira uma pergunta.")
-
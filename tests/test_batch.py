@@ -0,0 +1,95 @@
+import json
+import os
+import sys
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "weasyprint"))
+
+from batch import executar, ler_checkpoint, ler_perfis
+
+
+class Queda(BaseException):
+    """Interrupção do processo no meio do lote."""
+
+
+class RendererFalso:
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+def app_falso(cair_em=None, lotes=None):
+    def gerar_plano(input_data, renderizar=True):
+        if input_data["idade"] == cair_em:
+            raise Queda()
+        return {"cache": "miss", "pdf": None, "totais": {}, "plano_dieta": {"idade": input_data["idade"]}}
+
+    def renderizar_lote(resultados):
+        if lotes is not None:
+            lotes.append(len(resultados))
+        for resultado in resultados:
+            resultado["pdf"] = f"%PDF-{resultado['plano_dieta']['idade']}".encode()
+        return resultados
+
+    return SimpleNamespace(
+        gerar_plano=gerar_plano, renderizar_lote=renderizar_lote, mensagem_de_erro=str, pdf_renderer=RendererFalso()
+    )
+
+
+def test_zip_sobrevive_a_queda_e_retomada(tmp_path):
+    entrada = tmp_path / "perfis.jsonl"
+    entrada.write_text("".join(json.dumps({"id": n, "idade": str(n)}) + "\n" for n in range(1, 5)))
+    saida, zip_path = str(tmp_path / "resultados.jsonl"), str(tmp_path / "planos.zip")
+
+    with pytest.raises(Queda):
+        executar(str(entrada), saida, zip_path=zip_path, concorrencia=1, lote=1, app=app_falso(cair_em="3"))
+    assert not os.path.exists(zip_path)
+    # Com vários perfis em voo, quais terminaram antes da queda do 3 varia
+    concluidos = ler_checkpoint(saida)
+    assert concluidos and "3" not in concluidos
+
+    # Retomada: os já concluídos são pulados, mas seus PDFs continuam no zip
+    contagem = executar(str(entrada), saida, zip_path=zip_path, concorrencia=1, app=app_falso())
+    assert contagem == {"ok": 4 - len(concluidos), "erro": 0, "pulados": len(concluidos)}
+    with zipfile.ZipFile(zip_path) as z:
+        assert sorted(z.namelist()) == [f"plano_dieta_{n}.pdf" for n in range(1, 5)]
+        assert z.read("plano_dieta_1.pdf") == b"%PDF-1"
+    assert not os.path.exists(f"{zip_path}.partes")
+
+    # Novo lote no mesmo zip mantém o conteúdo anterior
+    entrada.write_text(json.dumps({"id": 5, "idade": "5"}) + "\n")
+    executar(str(entrada), saida, zip_path=zip_path, concorrencia=1, app=app_falso())
+    with zipfile.ZipFile(zip_path) as z:
+        assert len(z.namelist()) == 5
+
+
+def test_ids_viram_nomes_seguros_e_repetidos_sao_recusados(tmp_path):
+    entrada = tmp_path / "perfis.jsonl"
+    entrada.write_text(json.dumps({"id": "../../fora", "idade": "1"}) + "\n")
+    pdfs = tmp_path / "pdfs"
+    executar(str(entrada), str(tmp_path / "r.jsonl"), pdf_dir=str(pdfs), concorrencia=1, app=app_falso())
+    assert [p.name for p in pdfs.iterdir()] == ["plano_dieta_____fora.pdf"]
+
+    entrada.write_text("".join(json.dumps({"id": i, "idade": "1"}) + "\n" for i in ("a/b", "a_b")))
+    with pytest.raises(ValueError, match="repetido"):
+        list(ler_perfis(str(entrada)))
+
+
+def test_pdfs_renderizados_em_lotes(tmp_path):
+    entrada = tmp_path / "perfis.jsonl"
+    entrada.write_text("".join(json.dumps({"id": n, "idade": str(n)}) + "\n" for n in range(1, 6)))
+    lotes = []
+    contagem = executar(
+        str(entrada), str(tmp_path / "r.jsonl"), pdf_dir=str(tmp_path / "pdfs"), concorrencia=2, lote=2,
+        app=app_falso(lotes=lotes)
+    )
+    assert contagem["ok"] == 5 and sorted(lotes) == [1, 2, 2]
+    assert (tmp_path / "pdfs" / "plano_dieta_5.pdf").read_bytes() == b"%PDF-5"
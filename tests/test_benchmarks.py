@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+import fake_llm
+from carga import parse_server_timing, percentil
+from importacao import parse_importtime, por_pacote
+from nutricional_core.etapas import coletar, etapa
+from nutricional_core.llm import LLMClient
+from nutricional_core.schema import extrair_json
+
+
+def test_etapas_viram_server_timing():
+    with coletar() as etapas:
+        with etapa("llm"):
+            time.sleep(0.01)
+        with etapa("pdf"):
+            pass
+    # Fora do coletor, etapa() não registra nada
+    with etapa("ignorada"):
+        pass
+
+    tempos = parse_server_timing(etapas.server_timing())
+    assert set(tempos) == {"llm", "pdf"}
+    assert tempos["llm"] >= 10
+
+
+def test_percentil():
+    valores = list(range(1, 101))
+    assert percentil(valores, 50) == 50.5
+    assert percentil(valores, 95) == 95.0
+    assert percentil([], 50) is None
+
+
+def test_fake_llm_responde_plano_compativel_com_openai():
+    servidor = fake_llm.iniciar(0, latencia=0, tokens_por_segundo=0, em_thread=True)
+    try:
+        cliente = LLMClient(api_key="fake", base_url=f"http://127.0.0.1:{servidor.server_port}/v1", max_retries=0)
+        resposta = cliente.chat([{"role": "user", "content": "Elabore um plano nutricional"}], model="gpt-4")
+        assert "refeições" in extrair_json(resposta.choices[0].message.content)["plano_dieta"]
+
+        with coletar() as etapas:
+            stream = cliente.stream([{"role": "user", "content": "Quantas calorias tem um ovo?"}], model="gpt-4o-mini")
+            texto = "".join(chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices)
+        assert texto == fake_llm.RESPOSTA_CHAT
+        # Uso de tokens do chunk final (stream_options.include_usage)
+        assert etapas.tokens["gpt-4o-mini"][1] > 0
+    finally:
+        servidor.shutdown()
+
+
+def test_parse_importtime():
+    saida = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:      3000 |       5000 |     langchain_core.prompts
+import time:      2000 |       2000 |   langchain_core
+import time:       900 |       1020 | main
+"""
+    modulos = parse_importtime(saida)
+    assert modulos[1] == ("langchain_core.prompts", 3000, 5000)
+    assert por_pacote(modulos)[0] == ("langchain_core", 5.0)
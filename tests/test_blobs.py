@@ -0,0 +1,48 @@
+import pytest
+
+from nutricional_core.blobs import BlobStore
+
+
+def test_blob_em_memoria_respeita_limite_de_bytes():
+    store = BlobStore(max_bytes=10)
+    primeiro = store.put(b"123456")
+    segundo = store.put(b"abcdef")
+
+    assert store.get(primeiro) is None
+    assert store.get(segundo) == b"abcdef"
+    assert store.path(segundo) is None
+    assert store.stats()["bytes"] == 6
+
+
+def test_blob_em_disco_expira(tmp_path):
+    store = BlobStore(disk_dir=str(tmp_path), ttl=60)
+    blob_id = store.put(b"%PDF")
+    assert open(store.path(blob_id), "rb").read() == b"%PDF"
+
+    store.ttl = -1
+    assert store.get(blob_id) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_blob_inexistente():
+    assert BlobStore().get("../../etc/passwd") is None
+
+
+def test_blob_em_disco_sobrevive_ao_reinicio(tmp_path):
+    blob_id = BlobStore(disk_dir=str(tmp_path)).put(b"%PDF")
+    (tmp_path / "outro.txt").write_text("não é um blob")
+
+    reiniciado = BlobStore(disk_dir=str(tmp_path))
+    assert reiniciado.get(blob_id) == b"%PDF"
+    assert reiniciado.stats()["bytes"] == 4
+
+    # Expirados são apagados na inicialização
+    BlobStore(disk_dir=str(tmp_path), ttl=-1)
+    assert [p.name for p in tmp_path.iterdir()] == ["outro.txt"]
+
+
+def test_blob_maior_que_o_limite_e_recusado():
+    store = BlobStore(max_bytes=4)
+    with pytest.raises(ValueError):
+        store.put(b"12345")
+    assert store.stats()["blobs"] == 0
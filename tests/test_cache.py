@@ -0,0 +1,59 @@
+from nutricional_core.cache import PlanCache, chave_perfil, normalizar_restricoes
+
+PERFIL = {
+    "idade": 30,
+    "peso": 70.2,
+    "altura": 175,
+    "genero": "Masculino",
+    "nivel_atividade": "sedentario",
+    "objetivos": "perder_peso",
+    "restricoes_alimentares": "Sem glúten; lactose",
+}
+
+
+def test_chave_ignora_variacoes_do_perfil():
+    variacao = dict(PERFIL, idade="30", peso=69.8, genero=" masculino", restricoes_alimentares="lactose, sem gluten")
+    assert chave_perfil(PERFIL) == chave_perfil(variacao)
+    assert chave_perfil(PERFIL, "flask") != chave_perfil(PERFIL, "weasyprint")
+
+
+def test_normalizar_restricoes_vazias():
+    assert normalizar_restricoes("Nenhuma") == ""
+    assert normalizar_restricoes(None) == ""
+
+
+def test_cache_memoria_e_disco(tmp_path):
+    cache = PlanCache(disk_dir=str(tmp_path), memory_size=1)
+    cache.put("a1", {"calorias": "2000"}, b"%PDF-a")
+    cache.put("b2", {"calorias": "1800"}, b"%PDF-b")
+
+    # "a1" saiu da memória, mas continua no disco
+    entrada = cache.get("a1")
+    assert entrada["plano"] == {"calorias": "2000"}
+    assert entrada["pdf"] == b"%PDF-a"
+    assert cache.get("zz") is None
+
+    stats = cache.stats()
+    assert stats["disk_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_cache_expira_por_ttl(tmp_path):
+    cache = PlanCache(disk_dir=str(tmp_path), ttl=-1)
+    cache.put("a1", {}, b"%PDF")
+    assert cache.get("a1") is None
+
+
+def test_cache_em_disco_mantem_o_limite_de_bytes(tmp_path):
+    cache = PlanCache(disk_dir=str(tmp_path), memory_size=0, max_disk_bytes=300)
+    for key in ("a1", "b2", "c3"):
+        cache.put(key, {"calorias": "2000"}, b"%PDF-" + b"x" * 60)
+
+    # Cada entrada ocupa ~125 bytes: só as duas mais recentes cabem
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["disk_entries"] == 2 and stats["disk_bytes"] <= 300
+    assert cache.get("a1") is None and cache.get("c3") is not None
+
+    # Outro processo (ou um reinício) parte do que já está no disco
+    reaberto = PlanCache(disk_dir=str(tmp_path))
+    assert reaberto.stats()["disk_bytes"] == stats["disk_bytes"]
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+import fake_llm
+from nutricional_core.compacto import compactar, expandir, response_format
+from nutricional_core.prompts import RAIL_SPEC
+from nutricional_core.schema import SchemaError, compilar_rail
+
+
+def test_expandir_reconstroi_o_plano_completo():
+    plano = fake_llm.PLANO["plano_dieta"]
+    documento = expandir(compactar(plano))
+    compilar_rail(RAIL_SPEC)(documento)
+    expandido = documento["plano_dieta"]
+    assert [r["refeicao"] for r in expandido["refeições"]] == fake_llm.REFEICOES
+    assert expandido["refeições"][0]["ingredientes"][0] == {
+        "nome": "Arroz integral cozido", "quantidade": "150 g",
+        "proteina": "3.9", "carboidrato": "38.6", "gordura": "1.5",
+    }
+    assert {campo: expandido[campo] for campo in ("calorias", "dicas", "plano_refeicoes")} == {
+        campo: plano[campo] for campo in ("calorias", "dicas", "plano_refeicoes")
+    }
+
+    # TACO: só nome e quantidade; metas locais: sem os campos das metas
+    taco = expandir(compactar(plano, "taco", metas_locais=True))["plano_dieta"]
+    assert "calorias" not in taco
+    assert taco["refeições"][2]["ingredientes"][1] == {"nome": "Feijão carioca cozido", "quantidade": "100 g"}
+
+
+def test_expandir_rejeita_estrutura_invalida():
+    with pytest.raises(SchemaError, match=r"\$\.r"):
+        expandir({"sup": "x"})
+    with pytest.raises(SchemaError, match=r"\$\.r\[0\]"):
+        expandir({"r": [{"nome": "x"}]})
+    # Resposta no formato completo passa direto
+    assert expandir(fake_llm.PLANO) is fake_llm.PLANO
+
+
+def test_response_format_estrito():
+    schema = response_format(metas_locais=True)["json_schema"]
+    assert schema["strict"] is True
+    assert schema["schema"]["required"] == ["sup", "det", "r", "dicas", "obs"]
+    assert "kcal" in response_format()["json_schema"]["schema"]["properties"]
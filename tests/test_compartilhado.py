@@ -0,0 +1,92 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "weasyprint"))
+
+from jobs import CONCLUIDO, JobQueue
+from nutricional_core.blobs import SharedBlobStore
+from nutricional_core.cache import PlanCache
+from nutricional_core.compartilhado import MemoryBackend, RedisBackend, SqliteBackend, criar_backend
+
+
+class RedisLocal:
+    """Substituto local do cliente redis-py (só os comandos usados)."""
+
+    def __init__(self):
+        self.dados = {}
+
+    def get(self, chave):
+        valor, expira_em = self.dados.get(chave, (None, None))
+        return None if expira_em is not None and expira_em <= time.time() else valor
+
+    def set(self, chave, valor, px=None):
+        self.dados[chave] = (valor, time.time() + px / 1000 if px else None)
+
+    def delete(self, chave):
+        self.dados.pop(chave, None)
+
+
+@pytest.fixture(params=["memoria", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SqliteBackend(str(tmp_path / "estado.db"))
+    if request.param == "redis":
+        return RedisBackend(cliente=RedisLocal())
+    return MemoryBackend()
+
+
+def test_backend_get_set_ttl_delete(backend):
+    backend.set("a", b"1")
+    backend.set("b", b"2", ttl=0.05)
+    assert backend.get("a") == b"1" and backend.get("b") == b"2"
+    time.sleep(0.1)
+    assert backend.get("b") is None
+    backend.delete("a")
+    assert backend.get("a") is None
+
+
+def test_workers_compartilham_pdfs_cache_e_jobs(tmp_path):
+    # Dois "workers": instâncias separadas sobre o mesmo arquivo SQLite
+    url = f"sqlite:///{tmp_path / 'estado.db'}"
+    worker_a, worker_b = criar_backend(url), criar_backend(url)
+
+    blob_id = SharedBlobStore(worker_a).put(b"%PDF-1")
+    assert SharedBlobStore(worker_b).get(blob_id) == b"%PDF-1"
+
+    PlanCache(backend=worker_a).put("chave", {"calorias": "2000 kcal"}, b"%PDF-2")
+    cache_b = PlanCache(backend=worker_b)
+    assert cache_b.get("chave")["pdf"] == b"%PDF-2"
+    assert cache_b.stats()["shared_hits"] == 1
+
+    async def executar():
+        fila = JobQueue(lambda dados: {"eco": dados}, max_workers=1, backend=worker_a)
+        await fila.start()
+        job_id = await fila.submit({"x": 1})
+        while (await fila.get(job_id))["status"] != CONCLUIDO:
+            await asyncio.sleep(0.01)
+        await fila.stop()
+        return job_id
+
+    job_id = asyncio.run(executar())
+    job = asyncio.run(JobQueue(None, backend=worker_b).get(job_id))
+    assert job["status"] == CONCLUIDO and job["result"] == {"eco": {"x": 1}}
+
+    with pytest.raises(ValueError):
+        criar_backend("mongodb://localhost")
+
+
+def test_sqlite_respeita_limite_de_bytes(tmp_path):
+    backend = SqliteBackend(str(tmp_path / "estado.db"), max_bytes=1000)
+    for n in range(30):
+        backend.set(f"blob:{n}", b"x" * 100, ttl=3600 + n)
+    backend.set("job:1", b"y" * 100)
+    backend.limpar()
+    # Ficam as mais recentes; a entrada sem TTL é a última a sair
+    assert backend.get("blob:0") is None and backend.get("blob:29") is not None
+    assert backend.get("job:1") is not None
+    total = sum(1 for n in range(30) if backend.get(f"blob:{n}") is not None)
+    assert (total + 1) * 100 <= 1000
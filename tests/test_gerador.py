@@ -0,0 +1,308 @@
+import asyncio
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+import fake_llm
+from nutricional_core.cache import PlanCache
+from nutricional_core.compacto import compactar
+from nutricional_core.gerador import PlanGenerator, RefeicaoInvalida
+from nutricional_core.metas import DISTRIBUICAO_REFEICOES
+from nutricional_core.perfil import PerfilInvalido, validar_perfil
+from nutricional_core.receitas import RecipeStore, id_refeicao
+from nutricional_core.schema import SchemaError
+
+PERFIL = {
+    "idade": "30",
+    "genero": "masculino",
+    "peso": "70,5",
+    "altura": 175,
+    "nivel_atividade": "moderado",
+    "objetivos": "ganhar massa muscular",
+    "restricoes_alimentares": "",
+}
+
+
+def resposta(conteudo):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=conteudo))])
+
+
+class ClienteFalso:
+    def __init__(self, documento):
+        self.texto = json.dumps(documento, ensure_ascii=False)
+        self.chamadas = []
+
+    def chat(self, messages, model, **kw):
+        self.chamadas.append(messages)
+        return resposta(self.texto)
+
+    async def achat(self, messages, model, **kw):
+        return self.chat(messages, model, **kw)
+
+
+class ClienteRefeicoes(ClienteFalso):
+    """Responde cada refeição pedida com uma receita nova nas calorias do prompt."""
+
+    def __init__(self):
+        super().__init__(fake_llm.METAS)
+        self.contador = itertools.count(1)
+
+    def chat(self, messages, model, **kw):
+        self.chamadas.append(messages)
+        prompt = messages[0]["content"]
+        if "Elabore a refeição" not in prompt:
+            return resposta(fake_llm.conteudo_para(messages))
+        calorias = int(re.search(r"cerca de (\d+) kcal", prompt).group(1))
+        refeicao = fake_llm.refeicao("?")
+        refeicao["nome"] = f"Receita {next(self.contador)}"
+        refeicao["ingredientes"] = [fake_llm.ingrediente("Arroz", "100 g", 0, round(calorias / 4, 1), 0)]
+        return resposta(json.dumps(refeicao, ensure_ascii=False))
+
+
+class RendererFalso:
+    def render(self, plano_dieta, totais=None):
+        return b"%PDF-" + plano_dieta["calorias"].encode()
+
+    def render_semana(self, plano_semanal, totais):
+        return b"%PDF-" + str(len(plano_semanal["dias"])).encode()
+
+    async def arender(self, plano_dieta, totais=None):
+        return self.render(plano_dieta, totais)
+
+
+def gerador(documento=fake_llm.PLANO, **kw):
+    cliente = ClienteFalso(documento)
+    return PlanGenerator(cliente, PlanCache(disk_dir=None), RendererFalso(), namespace="plano", **kw), cliente
+
+
+def test_gerar_usa_cache_na_segunda_chamada():
+    g, cliente = gerador()
+    primeiro = g.gerar(PERFIL)
+    assert primeiro["cache"] == "miss"
+    assert primeiro["pdf"] == b"%PDF-2600 kcal"
+    assert "70.5" in cliente.chamadas[0][0]["content"]
+    assert "llm" in primeiro["tempos"]
+
+    # Mesmo perfil pela fachada assíncrona: vem do cache, sem nova chamada
+    segundo = asyncio.run(g.agerar(dict(PERFIL, peso=70.5)))
+    assert segundo["cache"] == "hit"
+    assert len(cliente.chamadas) == 1
+
+
+def test_refeicoes_com_maiuscula_sao_normalizadas():
+    plano = dict(fake_llm.PLANO["plano_dieta"])
+    plano["Refeições"] = plano.pop("refeições")
+    g, _ = gerador({"plano_dieta": plano})
+    resultado = asyncio.run(g.agerar(PERFIL))
+    assert len(resultado["plano_dieta"]["refeições"]) == 5
+
+
+def test_perfil_invalido():
+    g, cliente = gerador()
+    with pytest.raises(PerfilInvalido):
+        g.gerar(dict(PERFIL, peso="abc"))
+    with pytest.raises(PerfilInvalido):
+        g.gerar(dict(PERFIL, objetivos=" "))
+    for valor in ("nan", "inf", "-inf"):
+        with pytest.raises(PerfilInvalido):
+            g.gerar(dict(PERFIL, peso=valor))
+    assert cliente.chamadas == []
+
+
+def test_metas_locais_encurtam_o_prompt_e_prevalecem():
+    g, cliente = gerador(metas_locais=True)
+    resultado = g.gerar(PERFIL)
+    prompt = cliente.chamadas[0][0]["content"]
+    assert "não recalcule" in prompt and len(prompt) < 2000
+    # 2600 kcal da resposta do modelo substituídas pelo cálculo local
+    assert resultado["plano_dieta"]["calorias"] != fake_llm.METAS["calorias"]
+    assert resultado["totais"]["calorias_alvo"] == int(resultado["plano_dieta"]["calorias"].split()[0])
+    perfil = validar_perfil(PERFIL)
+    assert g.chave(perfil) != gerador()[0].chave(perfil)
+    assert g.chave(perfil) != gerador(metas_locais=True, equacao="harris")[0].chave(perfil)
+    assert gerador(paralelo=True)[0].chave(perfil) != gerador(paralelo=True, equacao="harris")[0].chave(perfil)
+
+
+def test_semana_reaproveita_refeicoes_do_banco():
+    cliente = ClienteRefeicoes()
+    g = PlanGenerator(cliente, PlanCache(disk_dir=None), RendererFalso(), namespace="plano", recipe_store=RecipeStore())
+    semana = g.gerar_semana(PERFIL, dias=7, variedade=3)
+    # 3 opções por horário + complementos, independente do número de dias
+    assert len(cliente.chamadas) == 3 * 5 + 1
+    assert semana["refeicoes_novas"] == 15 and semana["pdf"] == b"%PDF-7"
+    dias = semana["plano_semanal"]["dias"]
+    assert [r["refeicao"] for r in dias[0]["refeições"]][0] == "CAFÉ DA MANHÃ"
+    assert dias[0]["refeições"] == dias[3]["refeições"] != dias[1]["refeições"]
+    assert len(semana["totais"]) == 7
+
+    # Segunda semana do mesmo perfil: tudo vem do banco
+    outra = g.gerar_semana(PERFIL, dias=7, variedade=3)
+    assert len(cliente.chamadas) == 16
+    assert outra["refeicoes_reutilizadas"] == 15 and outra["refeicoes_novas"] == 0
+
+    # Regenerar uma refeição só chama o modelo para ela
+    plano = outra["plano_semanal"]
+    antes = plano["dias"][1]["refeições"][2]
+    trocada = g.regenerar_refeicao(PERFIL, plano, 2, "almoço")
+    novo = trocada["plano_semanal"]["dias"][1]["refeições"][2]
+    assert trocada["refeicoes_novas"] == 1
+    assert novo["refeicao"] == "ALMOÇO" and novo["nome"] != antes["nome"]
+    assert len(cliente.chamadas) == 17
+    with pytest.raises(RefeicaoInvalida):
+        g.regenerar_refeicao(PERFIL, plano, 9, "ALMOÇO")
+    # O plano enviado não é alterado; plano malformado é erro de entrada
+    assert plano["dias"][1]["refeições"][2] == antes
+    for malformado in ({"dias": [{}]}, {"dias": [{"refeições": ["x"]}]}, {"dias": [{"refeições": [{"nome": "A"}]}]}):
+        with pytest.raises(RefeicaoInvalida):
+            g.regenerar_refeicao(PERFIL, malformado, 1, "ALMOÇO")
+
+
+def test_formato_compacto_e_expandido_no_servidor():
+    g, cliente = gerador(
+        compactar(fake_llm.PLANO["plano_dieta"], metas_locais=True), metas_locais=True, formato="estrito", model="gpt-4o"
+    )
+    resultado = g.gerar(PERFIL)
+    assert "formato compacto" in cliente.chamadas[0][0]["content"]
+    assert len(resultado["plano_dieta"]["refeições"]) == 5
+    assert resultado["plano_dieta"]["refeições"][4]["refeicao"] == "JANTAR"
+    assert resultado["plano_dieta"]["Suplementação"] == fake_llm.METAS["Suplementação"]
+
+
+def test_formato_estrito_exige_modelo_com_saida_estruturada():
+    with pytest.raises(ValueError):
+        gerador(formato="estrito", model="gpt-4")
+
+
+class ClienteComFalhas(ClienteRefeicoes):
+    """Complementos sempre fora do formato; a primeira refeição vem como lista."""
+
+    def __init__(self):
+        super().__init__()
+        self.falhas = itertools.count()
+
+    def chat(self, messages, model, **kw):
+        prompt = messages[0]["content"]
+        if "Complete o plano" in prompt:
+            self.chamadas.append(messages)
+            return resposta('{"dicas": ["sem os outros campos"]}')
+        if next(self.falhas) == 0:
+            self.chamadas.append(messages)
+            return resposta("[]")
+        return super().chat(messages, model, **kw)
+
+
+def test_semana_repete_o_que_vem_fora_do_formato():
+    cliente = ClienteComFalhas()
+    store = RecipeStore()
+    g = PlanGenerator(cliente, PlanCache(disk_dir=None), RendererFalso(), namespace="plano", recipe_store=store)
+    semana = g.gerar_semana(PERFIL, dias=2, variedade=1)
+
+    # 5 refeições + complementos, e na segunda rodada a refeição inválida + complementos
+    assert len(cliente.chamadas) == 6 + 2
+    assert semana["refeicoes_novas"] == 5
+    assert semana["plano_semanal"]["dicas"] == [] and semana["plano_semanal"]["Suplementação"] == "Nenhuma"
+    # Complementos padrão não vão para o banco: a próxima semana os pede de novo
+    assert store.complementos(validar_perfil(PERFIL)) is None
+
+
+def test_motor_paralelo_usa_o_mesmo_pipeline():
+    cliente = ClienteRefeicoes()
+    g = PlanGenerator(cliente, PlanCache(disk_dir=None), RendererFalso(), namespace="plano", paralelo=True)
+    resultado = g.gerar(PERFIL)
+    assert len(cliente.chamadas) == 5 + 1
+    plano = resultado["plano_dieta"]
+    assert [r["refeicao"] for r in plano["refeições"]][2] == "ALMOÇO"
+    assert plano["Suplementação"] == fake_llm.METAS["Suplementação"]
+    assert resultado["totais"]["consistente"]
+
+
+class ClienteParalelo(ClienteRefeicoes):
+    """Conta as chamadas simultâneas; as primeiras refeições terminam por último."""
+
+    def __init__(self, macro_source="llm", invalida=None, erro=None):
+        super().__init__()
+        self.macro_source = macro_source
+        self.invalida = invalida
+        self.erro = erro
+        self.em_voo = self.max_em_voo = 0
+        self._lock = threading.Lock()
+
+    def chat(self, messages, model, **kw):
+        with self._lock:
+            self.em_voo += 1
+            self.max_em_voo = max(self.max_em_voo, self.em_voo)
+        try:
+            prompt = messages[0]["content"]
+            horario = re.search(r"Elabore a refeição (.+?) \(", prompt)
+            if horario is None:
+                return super().chat(messages, model, **kw)
+            if horario.group(1) == self.erro:
+                raise RuntimeError("API indisponível")
+            time.sleep(0.01 * (5 - [h for h, _ in DISTRIBUICAO_REFEICOES].index(horario.group(1))))
+            if horario.group(1) == self.invalida:
+                self.chamadas.append(messages)
+                return resposta("sem JSON")
+            if self.macro_source == "taco":
+                self.chamadas.append(messages)
+                refeicao = {"refeicao": "?", "nome": "Arroz", "instrucoes": "Cozinhe.",
+                            "ingredientes": [{"nome": "arroz integral cozido", "quantidade": "200 g"}]}
+                return resposta(json.dumps(refeicao, ensure_ascii=False))
+            return super().chat(messages, model, **kw)
+        finally:
+            with self._lock:
+                self.em_voo -= 1
+
+
+def paralelo(cliente, **kw):
+    return PlanGenerator(cliente, PlanCache(disk_dir=None), RendererFalso(), namespace="plano", paralelo=True, **kw)
+
+
+def test_motor_paralelo_dispara_tudo_junto_e_mantem_a_ordem():
+    cliente = ClienteParalelo()
+    plano = paralelo(cliente).gerar(PERFIL)["plano_dieta"]
+    assert cliente.max_em_voo == 6
+    assert [r["refeicao"] for r in plano["refeições"]] == [h for h, _ in DISTRIBUICAO_REFEICOES]
+    # Cada refeição pedida com as calorias do seu horário
+    calorias = dict(
+        re.search(r"refeição (.+?) \(cerca de (\d+) kcal", m[0]["content"]).groups()
+        for m in cliente.chamadas if "Elabore" in m[0]["content"]
+    )
+    assert int(calorias["ALMOÇO"]) > int(calorias["LANCHE DA MANHÃ"])
+
+
+def test_motor_paralelo_preenche_macros_pela_quantidade_na_taco():
+    cliente = ClienteParalelo(macro_source="taco")
+    plano = paralelo(cliente, macro_source="taco").gerar(PERFIL)["plano_dieta"]
+    assert all("quantidade" in m[0]["content"] for m in cliente.chamadas if "Elabore" in m[0]["content"])
+    arroz = plano["refeições"][0]["ingredientes"][0]
+    assert (arroz["proteina"], arroz["carboidrato"], arroz["gordura"]) == ("5.2", "51.6", "2.0")
+
+
+def test_motor_paralelo_propaga_erros():
+    cliente = ClienteParalelo(invalida="ALMOÇO")
+    with pytest.raises(SchemaError, match="ALMOÇO"):
+        paralelo(cliente).gerar(PERFIL)
+    # A refeição inválida foi pedida de novo antes de desistir
+    assert sum("Elabore a refeição ALMOÇO" in m[0]["content"] for m in cliente.chamadas) == 2
+
+    with pytest.raises(RuntimeError, match="indisponível"):
+        paralelo(ClienteParalelo(erro="JANTAR")).gerar(PERFIL)
+
+
+def test_refeicao_sem_calorias_nao_entra_no_banco_mas_tem_id():
+    store = RecipeStore()
+    g = PlanGenerator(ClienteRefeicoes(), PlanCache(disk_dir=None), RendererFalso(), namespace="plano", recipe_store=store)
+    refeicao = fake_llm.refeicao("ALMOÇO")
+    refeicao["ingredientes"] = [fake_llm.ingrediente("Whey", "30 g", 0, 0, 0)]
+    receita_id, _ = g._refeicao_do_texto(json.dumps(refeicao), "ALMOÇO", validar_perfil(PERFIL))
+    assert receita_id == id_refeicao(refeicao)
+    assert store.stats()["refeicoes"] == 0
@@ -0,0 +1,44 @@
+import threading
+import time
+
+from nutricional_core.inicializacao import ERRO, OK, LazyResource, Warmup
+
+
+def test_lazy_resource_cria_uma_unica_vez():
+    criacoes = []
+
+    def fabrica():
+        time.sleep(0.01)
+        criacoes.append(1)
+        return lambda x: x * 2
+
+    recurso = LazyResource(fabrica)
+    assert not recurso.carregado
+    threads = [threading.Thread(target=recurso.get) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(criacoes) == 1
+    assert recurso(21) == 42
+
+
+def test_warmup_pronto_so_com_obrigatorias_ok():
+    def falha():
+        raise RuntimeError("sem modelo")
+
+    aquecimento = Warmup()
+    aquecimento.add("pdf", lambda: None)
+    aquecimento.add("opcional", falha, obrigatoria=False)
+    assert not aquecimento.pronto()
+
+    aquecimento.start().join()
+    stats = aquecimento.stats()
+    assert stats["pronto"]
+    assert stats["tarefas"]["pdf"]["estado"] == OK
+    assert stats["tarefas"]["opcional"]["estado"] == ERRO
+
+    aquecimento = Warmup()
+    aquecimento.add("guard", falha)
+    aquecimento.run()
+    assert not aquecimento.pronto()
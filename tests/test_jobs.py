@@ -0,0 +1,94 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "weasyprint"))
+
+from nutricional_core.compartilhado import MemoryBackend
+from jobs import CONCLUIDO, ERRO, EXECUTANDO, PENDENTE, TIMEOUT, JobQueue, QueueFullError
+
+
+async def aguardar(fila, job_id, estados=(CONCLUIDO, ERRO, TIMEOUT)):
+    while (await fila.get(job_id))["status"] not in estados:
+        await asyncio.sleep(0.01)
+    return await fila.get(job_id)
+
+
+def test_estados_do_job_e_erro():
+    liberar = threading.Event()
+
+    def processar(payload):
+        liberar.wait(1)
+        if payload == "falha":
+            raise RuntimeError("falhou")
+        return payload * 2
+
+    async def executar():
+        fila = JobQueue(processar, max_workers=1)
+        await fila.start()
+        try:
+            ok = await fila.submit(21)
+            falha = await fila.submit("falha")
+            assert (await aguardar(fila, ok, (EXECUTANDO,)))["started_at"] is not None
+            assert (await fila.get(falha))["status"] == PENDENTE
+            assert fila.stats()["running"] == 1 and fila.stats()["queued"] == 1
+
+            liberar.set()
+            assert (await aguardar(fila, ok))["result"] == 42
+            job = await aguardar(fila, falha)
+            assert job["status"] == ERRO and job["error"] == "falhou"
+            assert fila.stats()["running"] == 0
+        finally:
+            await fila.stop()
+
+    asyncio.run(executar())
+
+
+def test_fila_cheia_e_tempo_limite():
+    liberar = threading.Event()
+    backend = MemoryBackend()
+    totais = []
+
+    async def executar():
+        fila = JobQueue(
+            lambda payload: liberar.wait(1), max_workers=1, max_queue=1, job_timeout=0.05,
+            observador=lambda na_fila, executando: totais.append((na_fila, executando)), backend=backend
+        )
+        await fila.start()
+        try:
+            primeiro = await fila.submit(1)
+            await aguardar(fila, primeiro, (EXECUTANDO,))
+            await fila.submit(2)
+            # Fila cheia: o endpoint responde 429
+            with pytest.raises(QueueFullError):
+                await fila.submit(3)
+
+            job = await aguardar(fila, primeiro)
+            assert job["status"] == TIMEOUT and "0.05s" in job["error"]
+            # Publicado antes de a thread terminar: outro worker já vê o TIMEOUT
+            outro = await JobQueue(None, backend=backend).get(primeiro)
+            assert outro["status"] == TIMEOUT and outro["finished_at"] is not None
+            liberar.set()
+        finally:
+            await fila.stop()
+
+    asyncio.run(executar())
+    assert (0, 1) in totais and (1, 1) in totais
+
+
+def test_jobs_expirados_sao_removidos_sem_novos_envios():
+    async def executar():
+        fila = JobQueue(lambda payload: payload, result_ttl=0.05, intervalo_limpeza=0.02)
+        await fila.start()
+        try:
+            job_id = await fila.submit(1)
+            await aguardar(fila, job_id)
+            await asyncio.sleep(0.2)
+            assert await fila.get(job_id) is None
+        finally:
+            await fila.stop()
+
+    asyncio.run(executar())
@@ -0,0 +1,84 @@
+import httpx
+import pytest
+
+from nutricional_core.etapas import coletar
+from nutricional_core.llm import LLMClient, LLMDeadlineExceeded
+
+RESPOSTA = {
+    "id": "stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+}
+
+
+def _cliente(handler, **kwargs):
+    cliente = LLMClient(api_key="stub", base_url="http://stub/v1", backoff_base=0.001, **kwargs)
+    cliente.http_client._transport = httpx.MockTransport(handler)
+    return cliente
+
+
+def test_repete_em_erros_5xx_e_429():
+    chamadas = []
+
+    def handler(request):
+        chamadas.append(request)
+        if len(chamadas) == 1:
+            return httpx.Response(429, json={"error": {"message": "rate limit"}})
+        if len(chamadas) == 2:
+            return httpx.Response(503, json={"error": {"message": "indisponível"}})
+        return httpx.Response(200, json=RESPOSTA)
+
+    resposta = _cliente(handler).chat([{"role": "user", "content": "oi"}], model="stub")
+    assert resposta.choices[0].message.content == "ok"
+    assert len(chamadas) == 3
+
+
+def test_nao_repete_erro_do_cliente():
+    chamadas = []
+
+    def handler(request):
+        chamadas.append(request)
+        return httpx.Response(400, json={"error": {"message": "inválido"}})
+
+    with pytest.raises(Exception):
+        _cliente(handler).chat([{"role": "user", "content": "oi"}], model="stub")
+    assert len(chamadas) == 1
+
+
+def test_prazo_maximo_da_chamada():
+    def handler(request):
+        return httpx.Response(503, headers={"retry-after": "5"}, json={"error": {"message": "ocupado"}})
+
+    with pytest.raises(LLMDeadlineExceeded):
+        _cliente(handler, deadline=0.5).chat([{"role": "user", "content": "oi"}], model="stub")
+
+
+def test_uso_de_tokens_vai_para_a_requisicao_atual():
+    resposta = {**RESPOSTA, "usage": {"prompt_tokens": 120, "completion_tokens": 30, "total_tokens": 150}}
+    cliente = _cliente(lambda request: httpx.Response(200, json=resposta))
+
+    with coletar() as etapas:
+        cliente.chat([{"role": "user", "content": "oi"}], model="gpt-4o-mini")
+        cliente.chat([{"role": "user", "content": "oi"}], model="gpt-4o-mini")
+
+    assert etapas.tokens == {"gpt-4o-mini": [240, 60]}
+
+
+def test_nao_repete_tempo_limite_de_leitura():
+    chamadas = []
+
+    def handler(request):
+        chamadas.append(request)
+        raise httpx.ReadTimeout("lento", request=request)
+
+    with pytest.raises(Exception):
+        _cliente(handler).chat([{"role": "user", "content": "oi"}], model="stub")
+    assert len(chamadas) == 1
+
+
+def test_close_fecha_os_dois_pools():
+    cliente = _cliente(lambda request: httpx.Response(200, json=RESPOSTA))
+    cliente.close()
+    assert cliente.http_client.is_closed and cliente.http_async_client.is_closed
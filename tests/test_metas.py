@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from nutricional_core.metas import (
+    campos_plano, fator_atividade, gasto_basal, metas_perfil, metas_perfis, objetivo, sexo
+)
+from nutricional_core.totais import parse_calorias
+
+PERFIL = {
+    "idade": 30,
+    "genero": "masculino",
+    "peso": 70,
+    "altura": 175,
+    "nivel_atividade": "moderadamente_ativo",
+    "objetivos": "manter_peso",
+    "restricoes_alimentares": "",
+}
+
+
+def test_equacoes():
+    # Mifflin-St Jeor: 10*70 + 6.25*175 - 5*30 + 5
+    assert gasto_basal(30, 70, 175, 1.0) == pytest.approx(1648.75)
+    assert gasto_basal(30, 70, 175, 0.0) == pytest.approx(1482.75)
+    assert gasto_basal(30, 70, 175, 1.0, "harris") == pytest.approx(1695.667, abs=0.01)
+    # Gênero não informado: média das duas
+    assert gasto_basal(30, 70, 175, 0.5) == pytest.approx((1648.75 + 1482.75) / 2)
+
+
+def test_texto_livre_do_perfil():
+    assert fator_atividade("Moderado") == fator_atividade("moderadamente_ativo") == 1.55
+    assert fator_atividade("???") == 1.55
+    assert objetivo("ganhar massa muscular") == "ganhar_massa_muscular"
+    assert objetivo("quero emagrecer") == "perder_peso"
+    assert sexo("Feminino") == 0.0 and sexo("outro") == 0.5
+
+
+def test_metas_de_um_perfil():
+    metas = metas_perfil(PERFIL)
+    assert metas["calorias"] == 2560  # 1648.75 * 1.55, arredondado a 10 kcal
+    assert metas["percentuais"] == [20, 50, 30]
+    assert metas["proteina_g"] == 128 and metas["gordura_g"] == 85
+    assert metas["agua_ml"] == 2450
+    campos = campos_plano(metas)
+    assert parse_calorias(campos["calorias"]) == 2560
+    assert "128 g" in campos["macronutrientes"]
+
+
+def test_lote_vetorizado_igual_ao_individual():
+    perfis = [
+        dict(PERFIL, peso=50 + i, idade=20 + i % 40, genero=("masculino", "feminino")[i % 2], objetivos=o)
+        for i, o in enumerate(["perder_peso", "ganhar_peso", "ganhar_massa_muscular", "manter_peso"] * 250)
+    ]
+    lote = metas_perfis(perfis)
+    assert lote["calorias"].shape == (1000,)
+    for i in (0, 1, 2, 999):
+        assert metas_perfil(perfis[i])["calorias"] == lote["calorias"][i]
+    assert np.all(lote["calorias"] >= 1200)
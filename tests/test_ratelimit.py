@@ -0,0 +1,25 @@
+import time
+
+import pytest
+
+from nutricional_core.ratelimit import TokenBucket
+
+
+def test_limite_por_minuto_vale_para_pedidos_grandes():
+    # 600 tokens/min = 10/s; a rajada inicial é o minuto inteiro
+    bucket = TokenBucket.per_minute(600)
+    inicio = time.monotonic()
+    for _ in range(3):
+        bucket.acquire(200)
+    assert time.monotonic() - inicio < 0.1
+
+    # Os próximos 3 tokens só existem depois de 0.3s
+    bucket.acquire(3)
+    decorrido = time.monotonic() - inicio
+    assert decorrido >= 0.29
+    assert 603 <= 600 + decorrido * 10
+
+
+def test_pedido_acima_da_capacidade_e_recusado():
+    with pytest.raises(ValueError):
+        TokenBucket.per_minute(6000).acquire(6001)
@@ -0,0 +1,67 @@
+import multiprocessing
+
+import pytest
+
+from nutricional_core.receitas import RecipeStore, fcntl, id_refeicao
+
+
+def refeicao(horario, nome, carboidrato):
+    return {
+        "refeicao": horario,
+        "nome": nome,
+        "ingredientes": [
+            {"nome": "Arroz", "quantidade": "100 g", "proteina": "20 g", "carboidrato": f"{carboidrato} g", "gordura": "5 g"}
+        ],
+        "instrucoes": "Cozinhe.",
+    }
+
+
+def test_buscar_filtra_calorias_e_restricoes_e_faz_rodizio():
+    store = RecipeStore()
+    a = store.adicionar(refeicao("ALMOÇO", "A", 100), "Sem lactose, vegano")  # 525 kcal
+    b = store.adicionar(refeicao("Almoço", "B", 110), "vegano, sem lactose")  # 565 kcal
+    store.adicionar(refeicao("ALMOÇO", "C", 200), "vegano, sem lactose")  # 925 kcal, fora da tolerância
+    fracoes = [0.15, 0.76, 0.09]
+
+    assert [i for i, _ in store.buscar("almoço", "sem lactose, vegano", 540, fracoes)] == [a, b]
+    assert store.buscar("ALMOÇO", "", 540, fracoes) == []
+    assert store.buscar("JANTAR", "vegano, sem lactose", 540, fracoes) == []
+
+    # A mais usada vai para o fim; excluídas não voltam
+    store.usar([a])
+    assert [i for i, _ in store.buscar("ALMOÇO", "vegano, sem lactose", 540, fracoes)] == [b, a]
+    assert store.buscar("ALMOÇO", "vegano, sem lactose", 540, fracoes, excluir={b}) == [(a, refeicao("ALMOÇO", "A", 100))]
+
+
+def test_persistencia_e_limite(tmp_path):
+    path = tmp_path / "receitas.json"
+    store = RecipeStore(path=str(path), max_por_grupo=2)
+    ids = [store.adicionar(refeicao("JANTAR", str(n), 100 + n), "") for n in range(3)]
+    store.guardar_complementos({"objetivos": "perder peso", "restricoes_alimentares": ""}, {"dicas": ["x"]})
+    store.salvar()
+
+    carregado = RecipeStore(path=str(path))
+    assert carregado.stats() == {"refeicoes": 2, "grupos": 1, "complementos": 1}
+    assert ids[0] not in {i for i, _ in carregado.buscar("JANTAR", "", 540, [0.15, 0.76, 0.09])}
+    assert carregado.complementos({"objetivos": "Perder peso", "restricoes_alimentares": None}) == {"dicas": ["x"]}
+    assert id_refeicao(refeicao("JANTAR", "2", 102)) == ids[2]
+
+
+def _gravar_refeicoes(path, worker):
+    store = RecipeStore(path=path)
+    for n in range(5):
+        store.adicionar(refeicao("JANTAR", f"{worker}-{n}", 100 + n), "")
+        store.salvar()
+
+
+@pytest.mark.skipif(fcntl is None, reason="trava entre processos só com fcntl")
+def test_salvar_em_varios_processos_nao_perde_refeicoes(tmp_path):
+    path = str(tmp_path / "receitas.json")
+    contexto = multiprocessing.get_context("fork")
+    processos = [contexto.Process(target=_gravar_refeicoes, args=(path, w)) for w in range(4)]
+    for processo in processos:
+        processo.start()
+    for processo in processos:
+        processo.join()
+
+    assert RecipeStore(path=path).stats()["refeicoes"] == 20
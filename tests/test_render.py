@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+import fake_llm
+from nutricional_core.compacto import compactar, expandir
+from nutricional_core.render import formatar_gramas, render_html
+
+PLANO = {
+    "calorias": "330 kcal",
+    "macronutrientes": "40/40/20",
+    "Consumo de água": "2000 ml",
+    "Consumo de fibras": "25 g",
+    "Suplementação": "Nenhuma",
+    "plano_refeicoes": {"detalhamento": "Plano <equilibrado>"},
+    "refeições": [{
+        "refeicao": "CAFÉ DA MANHÃ",
+        "nome": "Aveia",
+        "ingredientes": [
+            {"nome": "Aveia", "quantidade": "60 g", "proteina": "10", "carboidrato": "50", "gordura": "10"},
+            {"nome": "Whey", "proteina": "n/d", "carboidrato": "n/d", "gordura": "n/d"},
+        ],
+        "instrucoes": "Misture",
+    }],
+    "dicas": ["Beba água"],
+    "observacoes": "Nenhuma",
+}
+
+
+def test_render_html_inclui_plano_e_totais():
+    html = render_html(PLANO)
+    assert "CAFÉ DA MANHÃ - Aveia" in html
+    assert "Aveia (60 g)" in html
+    assert "10g" in html and "n/d" in html
+    assert "Total (330 kcal)" in html
+    assert "Plano &lt;equilibrado&gt;" in html
+    assert "Atenção" not in html
+
+
+def test_gramas_nao_duplica_a_unidade():
+    assert [formatar_gramas(v) for v in ("12", "12 g", "12g", "1.5 gramas", 13, "n/d")] == [
+        "12g", "12g", "12g", "1.5g", "13g", "n/d"
+    ]
+    # Plano vindo do formato compacto: números puros, uma única unidade no PDF
+    plano = expandir(compactar(fake_llm.PLANO["plano_dieta"]))["plano_dieta"]
+    html = render_html(plano)
+    assert "38.4g" in html and "3.9g" in html
+    assert "gg" not in html
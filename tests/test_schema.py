@@ -0,0 +1,47 @@
+import copy
+
+import pytest
+
+from nutricional_core.schema import SchemaError, compilar_rail, extrair_json
+
+RAIL = """
+<rail version="0.1">
+<output>
+    <object name="plano_dieta">
+        <string name="calorias" />
+        <list name="refeições">
+            <object>
+                <string name="nome" />
+                <string name="quantidade" required="false" />
+            </object>
+        </list>
+        <list name="dicas">
+            <string />
+        </list>
+    </object>
+</output>
+</rail>
+"""
+
+DOCUMENTO = {"plano_dieta": {"calorias": "2000", "refeições": [{"nome": "Aveia"}], "dicas": ["a"]}}
+
+
+def test_documento_valido():
+    validar = compilar_rail(RAIL)
+    assert validar(DOCUMENTO) is DOCUMENTO
+
+
+@pytest.mark.parametrize("alterar", [
+    lambda d: d["plano_dieta"].pop("calorias"),
+    lambda d: d["plano_dieta"]["refeições"][0].update(nome=12),
+    lambda d: d["plano_dieta"].update(dicas="a"),
+])
+def test_documento_invalido(alterar):
+    documento = copy.deepcopy(DOCUMENTO)
+    alterar(documento)
+    with pytest.raises(SchemaError):
+        compilar_rail(RAIL)(documento)
+
+
+def test_extrair_json_ignora_cercas():
+    assert extrair_json('```json\n{"a": 1}\n```') == {"a": 1}
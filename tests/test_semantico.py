@@ -0,0 +1,50 @@
+import numpy as np
+
+from nutricional_core.semantico import SemanticCache
+
+# Embedding de teste: perguntas com as mesmas palavras-chave ficam próximas
+VOCABULARIO = ["calorias", "ovo", "banana", "proteina", "agua", "dia"]
+
+
+def embed(textos):
+    vetores = np.array([[texto.count(p) for p in VOCABULARIO] + [0.1] for texto in textos], dtype=np.float32)
+    return vetores / np.linalg.norm(vetores, axis=1, keepdims=True)
+
+
+def _cache(**kwargs):
+    return SemanticCache(embed, dim=len(VOCABULARIO) + 1, bits=4, **kwargs)
+
+
+def test_pergunta_parecida_usa_a_resposta_em_cache():
+    cache = _cache(limiar=0.95)
+    cache.put("Quantas calorias tem um ovo?", "Cerca de 70 kcal.")
+
+    assert cache.get("quantas calorias tem 1 ovo") == "Cerca de 70 kcal."
+    assert cache.get("quanta proteina tem uma banana?") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["mais_usadas"][0]["hits"] == 1
+
+
+def test_lru_e_persistencia_com_mmap(tmp_path):
+    cache = _cache(path=str(tmp_path), max_entries=2)
+    cache.put("calorias ovo", "ovo")
+    cache.put("calorias banana", "banana")
+    cache.get("calorias ovo")
+    cache.put("agua por dia", "agua")  # remove "banana", a menos usada
+    cache.salvar()
+
+    recarregado = _cache(path=str(tmp_path), max_entries=2)
+    assert not recarregado._vetores.flags.writeable
+    assert recarregado.get("calorias ovo") == "ovo"
+    assert recarregado.get("agua por dia") == "agua"
+    assert recarregado.get("calorias banana") is None
+    recarregado.put("proteina", "proteina")
+    assert recarregado.stats()["entradas"] == 2
+
+
+def test_ttl_expira_entradas():
+    cache = _cache(ttl=-1)
+    cache.put("calorias ovo", "ovo")
+    assert cache.get("calorias ovo") is None
+    assert cache.stats()["expirados"] == 1
@@ -0,0 +1,32 @@
+from nutricional_core.sessao import ChatSession, SessionStore, contar_tokens
+
+
+def _resumir(resumo, turnos):
+    return (resumo + " " + " ".join(t["content"][:10] for t in turnos)).strip()
+
+
+def test_historico_fica_dentro_do_orcamento():
+    sessao = ChatSession(max_tokens_historico=200, turnos_recentes=2)
+    tamanhos = []
+    for i in range(30):
+        sessao.registrar(f"pergunta {i} " + "x" * 100, f"resposta {i} " + "y" * 200)
+        sessao.compactar(_resumir)
+        mensagens = sessao.mensagens("SYSTEM", "próxima")
+        tamanhos.append(sum(contar_tokens(m["content"]) for m in mensagens))
+
+    assert mensagens[0] == {"role": "system", "content": "SYSTEM"}
+    assert sessao.resumo
+    assert len(sessao.turnos) <= 4
+    # O tamanho depende do resumo, não do número de turnos
+    assert max(tamanhos[10:]) - min(tamanhos[10:]) < 150
+
+
+def test_store_persiste_sessao(tmp_path):
+    store = SessionStore(str(tmp_path))
+    sessao = ChatSession()
+    sessao.registrar("quantas calorias tem um ovo?", "Cerca de 70 kcal.")
+    store.save(sessao)
+
+    recuperada = store.get(sessao.id)
+    assert recuperada.turnos == sessao.turnos
+    assert store.get("../../etc/passwd") is None
@@ -0,0 +1,24 @@
+from nutricional_core.stream_parser import PlanoStreamParser
+
+DOCUMENTO = """```json
+{"plano_dieta": {"calorias": "2000 kcal", "plano_refeicoes": {"detalhamento": "texto com \\"aspas\\" e }"},
+"refeições": [{"refeicao": "CAFÉ DA MANHÃ", "ingredientes": [{"nome": "ovo"}]}, {"refeicao": "JANTAR", "ingredientes": []}],
+"dicas": ["beba água"], "observacoes": "ok"}}
+```"""
+
+
+def test_eventos_emitidos_em_ordem_com_pedacos_pequenos():
+    parser = PlanoStreamParser()
+    eventos = []
+    for i in range(0, len(DOCUMENTO), 3):
+        eventos.extend(parser.feed(DOCUMENTO[i:i + 3]))
+
+    assert eventos == [
+        ("campo", "calorias", "2000 kcal"),
+        ("campo", "plano_refeicoes", {"detalhamento": 'texto com "aspas" e }'}),
+        ("refeicao", 0, {"refeicao": "CAFÉ DA MANHÃ", "ingredientes": [{"nome": "ovo"}]}),
+        ("refeicao", 1, {"refeicao": "JANTAR", "ingredientes": []}),
+        ("campo", "dicas", ["beba água"]),
+        ("campo", "observacoes", "ok"),
+    ]
+    assert parser.texto == DOCUMENTO
@@ -0,0 +1,36 @@
+from nutricional_core.taco import get_tabela, parse_gramas, preencher_macros
+
+
+def test_busca_aproximada_com_acentos_e_ordem_diferente():
+    tabela = get_tabela()
+    assert tabela.nomes[tabela.buscar("peito de frango grelhado")] == "Frango, peito, sem pele, grelhado"
+    assert tabela.nomes[tabela.buscar("arroz integral")] == "Arroz, integral, cozido"
+    assert tabela.nomes[tabela.buscar("FEIJAO carioca")] == "Feijão, carioca, cozido"
+    assert tabela.buscar("whey protein") is None
+    assert tabela.nomes[tabela.buscar("ovos cozidos")] == "Ovo, de galinha, inteiro, cozido"
+
+
+def test_busca_nao_casa_so_pelos_modificadores():
+    tabela = get_tabela()
+    # O alimento (primeira palavra) precisa estar no nome da tabela
+    for nome in ("peixe grelhado", "farinha integral", "queijo cottage", "macarrão integral", "suco de laranja"):
+        assert tabela.buscar(nome) is None, nome
+
+
+def test_parse_gramas():
+    assert parse_gramas("1 xícara (160g)") == 160
+    assert parse_gramas("0,2 kg") == 200
+    assert parse_gramas("150") == 150
+    assert parse_gramas("2 unidades") is None
+
+
+def test_preencher_macros():
+    plano = {"refeições": [{"ingredientes": [
+        {"nome": "arroz integral cozido", "quantidade": "200 g"},
+        {"nome": "whey protein", "quantidade": "30 g"},
+    ]}]}
+    assert preencher_macros(plano, valor_ausente="n/d") == 1
+
+    arroz, whey = plano["refeições"][0]["ingredientes"]
+    assert (arroz["proteina"], arroz["carboidrato"], arroz["gordura"]) == ("5.2", "51.6", "2.0")
+    assert whey["proteina"] == "n/d"
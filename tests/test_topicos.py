@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from nutricional_core.topicos import INCERTO, INVALIDO, VALIDO, ForaDoTopico, TopicClassifier, guardar_stream
+
+
+class PipelineFalso:
+    def __init__(self):
+        self.lotes = []
+
+    def __call__(self, textos, candidate_labels, multi_label, batch_size):
+        self.lotes.append(list(textos))
+        saidas = []
+        for texto in textos:
+            scores = {"nutrition": 0.1, "politics": 0.1}
+            if "comida" in texto:
+                scores["nutrition"] = 0.9
+            elif "eleição" in texto:
+                scores["politics"] = 0.9
+            saidas.append({"labels": list(scores), "scores": list(scores.values())})
+        return saidas
+
+
+def _classificador(pipeline, **kwargs):
+    return TopicClassifier(["nutrition"], ["politics"], pipeline=pipeline, **kwargs)
+
+
+def test_vereditos_e_cache():
+    pipeline = PipelineFalso()
+    classificador = _classificador(pipeline)
+
+    assert classificador.verificar("comida saudável")[0] == VALIDO
+    assert classificador.verificar("eleição")[0] == INVALIDO
+    assert classificador.verificar("qualquer coisa")[0] == INCERTO
+    assert classificador.verificar("comida saudável")[0] == VALIDO
+    assert classificador.stats()["cache_hits"] == 1
+
+
+def test_pedidos_concorrentes_sao_agrupados():
+    pipeline = PipelineFalso()
+    classificador = _classificador(pipeline, batch_size=16, max_wait=0.2)
+    classificador.start()
+
+    threads = [threading.Thread(target=classificador.verificar, args=(f"comida {i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Um lote de aquecimento e poucos lotes para os 8 pedidos
+    assert len(pipeline.lotes) <= 3
+    assert sum(len(lote) for lote in pipeline.lotes[1:]) == 8
+
+
+def test_stream_interrompido_ao_sair_do_topico():
+    classificador = _classificador(PipelineFalso())
+    pedacos = ["Coma ", "comida variada. ", "Agora sobre a ", "eleição: vote. ", "Mais texto ", "que não deve chegar."]
+    recebidos = []
+
+    with pytest.raises(ForaDoTopico) as erro:
+        for pedaco in guardar_stream(iter(pedacos), classificador, min_chars=10):
+            recebidos.append(pedaco)
+
+    assert erro.value.topico == "politics"
+    assert "Mais texto " not in recebidos
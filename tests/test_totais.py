@@ -0,0 +1,49 @@
+import math
+
+from nutricional_core.totais import parse_calorias, parse_valor, totais_plano, totais_planos
+
+
+def _plano(calorias, *refeicoes):
+    return {
+        "calorias": calorias,
+        "refeições": [
+            {"refeicao": f"R{i}", "ingredientes": [
+                {"proteina": p, "carboidrato": c, "gordura": g} for p, c, g in ingredientes
+            ]}
+            for i, ingredientes in enumerate(refeicoes)
+        ],
+    }
+
+
+def test_parse_valores_livres():
+    assert parse_valor("12,5 g") == 12.5
+    assert math.isnan(parse_valor("n/d"))
+    assert parse_calorias("2.000 kcal") == 2000
+    assert parse_calorias("1800-2000 kcal") == 1900
+    assert parse_calorias("1850.5 kcal") == 1850.5
+    assert parse_calorias("1.850,5 kcal") == 1850.5
+    assert parse_calorias("2,000 kcal") == 2000
+    assert parse_calorias("1,800-2,200 kcal") == 2000
+    assert parse_calorias("2,000.5 kcal") == 2000.5
+    assert parse_calorias("1.850,500 kcal") == 1850.5
+    assert parse_calorias("1850,5 kcal") == 1850.5
+
+
+def test_totais_em_lote():
+    planos = [
+        _plano("500 kcal", [("10g", "50g", "10g")], [("5", "10", "n/d")]),
+        _plano("1000 kcal", [("10", "10", "10")]),
+    ]
+    totais = totais_planos(planos)
+
+    assert totais["refeicoes"].tolist() == [[10, 50, 10, 330], [5, 10, 0, 60], [10, 10, 10, 170]]
+    assert totais["diario"][:, 3].tolist() == [390, 170]
+    assert totais["consistente"].tolist() == [False, False]
+    assert totais["ausentes"].tolist() == [1, 0]
+
+
+def test_totais_plano_serializavel():
+    totais = totais_plano(_plano("330 kcal", [("10g", "50g", "10g")]))
+    assert totais["diario"] == {"proteina": 10.0, "carboidrato": 50.0, "gordura": 10.0, "calorias": 330}
+    assert totais["consistente"] is True
+    assert totais["desvio"] == 0.0
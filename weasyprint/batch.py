@@ -0,0 +1,250 @@
+"""
+Geração em lote de planos de dieta a partir de um arquivo de perfis.
+
+Uso (a partir do diretório weasyprint):
+
+    python batch.py perfis.csv --saida resultados.jsonl --pdfs planos/
+    python batch.py perfis.jsonl --saida resultados.jsonl --zip planos.zip --concorrencia 8 --rpm 120 --lote 32
+
+Cada linha do arquivo de entrada precisa dos campos idade, genero, peso,
+altura, nivel_atividade, objetivos e restricoes_alimentares (opcional).
+Um campo "id" opcional identifica a linha; sem ele é usado o número da
+linha. Ids repetidos (também depois de trocados os caracteres que não
+servem em nome de arquivo) interrompem o lote. O arquivo de saída também
+é o checkpoint: ao rodar de novo, as linhas já concluídas com sucesso são
+puladas. Com --zip, cada PDF é gravado primeiro em um diretório de
+trabalho ao lado do zip, e o zip só é montado no fim: uma execução
+interrompida não perde os PDFs já gerados. Os planos novos são
+renderizados em lotes de --lote planos (render_many no pool de PDF).
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from nutricional_core.ratelimit import TokenBucket
+
+CAMPOS = ["idade", "genero", "peso", "altura", "nivel_atividade", "objetivos", "restricoes_alimentares"]
+
+_RE_NOME_INVALIDO = re.compile(r"[^\w.-]")
+
+
+def nome_pdf(perfil_id):
+    """Nome do PDF de um perfil: o id vem do arquivo de entrada e não pode sair do diretório."""
+    return f"plano_dieta_{_RE_NOME_INVALIDO.sub('_', perfil_id).replace('..', '_')}.pdf"
+
+
+def ler_perfis(caminho):
+    """Lê os perfis em streaming (CSV ou JSONL), gerando (id, input_data)."""
+    with open(caminho, encoding="utf-8", newline="") as f:
+        if caminho.endswith(".csv"):
+            linhas = csv.DictReader(f)
+        else:
+            linhas = (json.loads(linha) for linha in f if linha.strip())
+        vistos = set()
+        for numero, linha in enumerate(linhas, start=1):
+            perfil_id = str(linha.get("id") or numero)
+            if nome_pdf(perfil_id) in vistos:
+                raise ValueError(f"Linha {numero}: id repetido ({perfil_id!r})")
+            vistos.add(nome_pdf(perfil_id))
+            input_data = {campo: linha.get(campo, "") for campo in CAMPOS}
+            yield perfil_id, input_data
+
+
+def ler_checkpoint(caminho):
+    """Ids já concluídos com sucesso em execuções anteriores."""
+    concluidos = set()
+    if not os.path.exists(caminho):
+        return concluidos
+    with open(caminho, encoding="utf-8") as f:
+        for linha in f:
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError:
+                # Última linha incompleta de uma execução interrompida
+                continue
+            if registro.get("status") == "ok":
+                concluidos.add(registro["id"])
+    return concluidos
+
+
+class SaidaPdf:
+    """
+    Grava os PDFs em um diretório ou em um arquivo zip. No modo zip os PDFs
+    vão para `<zip>.partes/` e o zip é montado em `fechar()`, junto com o
+    conteúdo de um zip anterior, se houver.
+    """
+
+    def __init__(self, pdf_dir=None, zip_path=None):
+        self.zip_path = zip_path
+        self.pdf_dir = f"{zip_path}.partes" if zip_path else pdf_dir
+        os.makedirs(self.pdf_dir, exist_ok=True)
+
+    def gravar(self, perfil_id, pdf_bytes):
+        nome = nome_pdf(perfil_id)
+        caminho = os.path.join(self.pdf_dir, nome)
+        # Arquivo completo ou nenhum: o checkpoint só marca "ok" depois disto
+        tmp = f"{caminho}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp, caminho)
+        return nome if self.zip_path else caminho
+
+    def fechar(self):
+        if not self.zip_path:
+            return
+        partes = {nome for nome in os.listdir(self.pdf_dir) if nome.endswith(".pdf")}
+        tmp = f"{self.zip_path}.tmp"
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_STORED) as destino:
+            # PDFs de execuções anteriores já concluídas continuam no zip
+            if os.path.exists(self.zip_path):
+                try:
+                    with zipfile.ZipFile(self.zip_path) as anterior:
+                        for nome in anterior.namelist():
+                            if nome not in partes:
+                                destino.writestr(nome, anterior.read(nome))
+                except zipfile.BadZipFile:
+                    logging.warning(f"Zip anterior ilegível, ignorado: {self.zip_path}")
+            for nome in sorted(partes):
+                destino.write(os.path.join(self.pdf_dir, nome), nome)
+        os.replace(tmp, self.zip_path)
+        shutil.rmtree(self.pdf_dir)
+
+
+def processar(gerar_plano, mensagem_de_erro, perfil_id, input_data, limitador):
+    if limitador is not None:
+        limitador.acquire()
+    inicio = time.monotonic()
+    try:
+        resultado = gerar_plano(input_data, renderizar=False)
+    except Exception as e:
+        return perfil_id, None, mensagem_de_erro(e), time.monotonic() - inicio
+    return perfil_id, resultado, None, time.monotonic() - inicio
+
+
+def executar(entrada, saida, pdf_dir=None, zip_path=None, concorrencia=4, rpm=None, lote=16, app=None):
+    """
+    `app`: módulo com gerar_plano, renderizar_lote, mensagem_de_erro e
+    pdf_renderer (padrão: main).
+    """
+    if app is None:
+        import main as app
+
+    concluidos = ler_checkpoint(saida)
+    if concluidos:
+        logging.info(f"Retomando: {len(concluidos)} perfis já concluídos serão pulados")
+
+    limitador = TokenBucket.per_minute(rpm, capacity=concorrencia) if rpm else None
+    pdfs = SaidaPdf(pdf_dir, zip_path)
+    app.pdf_renderer.start()
+    contagem = {"ok": 0, "erro": 0, "pulados": 0}
+    inicio = time.monotonic()
+
+    # Planos gerados aguardando a renderização do lote: (id, resultado, duração)
+    gerados = []
+
+    def gravar(arquivo, perfil_id, resultado, erro, duracao):
+        registro = {"id": perfil_id, "duracao": round(duracao, 3)}
+        if erro is None:
+            registro.update({
+                "status": "ok",
+                "cache": resultado["cache"],
+                "pdf": pdfs.gravar(perfil_id, resultado["pdf"]),
+                "totais": resultado["totais"],
+                "plano_dieta": resultado["plano_dieta"],
+            })
+        else:
+            registro.update({"status": "erro", "error": erro})
+        contagem[registro["status"]] += 1
+        arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        arquivo.flush()
+
+    def renderizar(arquivo):
+        erro = None
+        try:
+            app.renderizar_lote([resultado for _, resultado, _ in gerados])
+        except Exception as e:
+            erro = app.mensagem_de_erro(e)
+        for perfil_id, resultado, duracao in gerados:
+            gravar(arquivo, perfil_id, resultado, erro, duracao)
+        gerados.clear()
+
+    def registrar(arquivo, futuro):
+        perfil_id, resultado, erro, duracao = futuro.result()
+        if erro is not None:
+            gravar(arquivo, perfil_id, None, erro, duracao)
+            return
+        gerados.append((perfil_id, resultado, duracao))
+        if len(gerados) >= lote:
+            renderizar(arquivo)
+
+    with open(saida, "a", encoding="utf-8") as arquivo, ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        pendentes = set()
+        for perfil_id, input_data in ler_perfis(entrada):
+            if perfil_id in concluidos:
+                contagem["pulados"] += 1
+                continue
+            # Mantém no máximo 2x a concorrência em voo para ler a entrada em streaming
+            if len(pendentes) >= 2 * concorrencia:
+                prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    registrar(arquivo, futuro)
+            pendentes.add(executor.submit(
+                processar, app.gerar_plano, app.mensagem_de_erro, perfil_id, input_data, limitador
+            ))
+
+        for futuro in wait(pendentes).done:
+            registrar(arquivo, futuro)
+        if gerados:
+            renderizar(arquivo)
+
+    pdfs.fechar()
+    app.pdf_renderer.stop()
+    duracao = time.monotonic() - inicio
+    processados = contagem["ok"] + contagem["erro"]
+    logging.info(
+        f"Lote concluído: {contagem['ok']} ok, {contagem['erro']} com erro, {contagem['pulados']} pulados "
+        f"em {duracao:.1f}s ({processados / duracao if duracao else 0:.2f} perfis/s)"
+    )
+    logging.info(f"Renderização de PDF: {app.pdf_renderer.stats()}")
+    return contagem
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geração em lote de planos de dieta")
+    parser.add_argument("entrada", help="Arquivo de perfis (.csv ou .jsonl)")
+    parser.add_argument("--saida", default="resultados.jsonl", help="Arquivo JSONL de resultados (também é o checkpoint)")
+    destino = parser.add_mutually_exclusive_group()
+    destino.add_argument("--pdfs", default="pdfs_lote", help="Diretório onde salvar os PDFs")
+    destino.add_argument("--zip", help="Arquivo zip onde salvar os PDFs")
+    parser.add_argument("--concorrencia", type=int, default=4, help="Número de gerações simultâneas")
+    parser.add_argument("--rpm", type=float, default=None, help="Limite de gerações iniciadas por minuto")
+    parser.add_argument("--lote", type=int, default=16, help="Planos por lote de renderização de PDF")
+    args = parser.parse_args()
+
+    try:
+        contagem = executar(
+            args.entrada,
+            args.saida,
+            pdf_dir=None if args.zip else args.pdfs,
+            zip_path=args.zip,
+            concorrencia=args.concorrencia,
+            rpm=args.rpm,
+            lote=args.lote,
+        )
+    except ValueError as e:
+        logging.error(f"Arquivo de entrada inválido: {e}")
+        sys.exit(2)
+    sys.exit(1 if contagem["erro"] else 0)
+
+
+if __name__ == "__main__":
+    main()
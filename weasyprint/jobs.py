@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Estados possíveis de um job
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDO = "concluido"
+ERRO = "erro"
+TIMEOUT = "timeout"
+
+
+class QueueFullError(Exception):
+    """Fila de jobs cheia; o cliente deve tentar novamente mais tarde."""
+
+
+class JobQueue:
+    """
+    Fila de jobs com um pool limitado de workers.
+
+    Os jobs são executados em threads (a cadeia LLM + guard + PDF é síncrona),
+    então o event loop do uvicorn nunca fica bloqueado. A fila tem tamanho
+    máximo (backpressure) e cada job tem um tempo limite de execução. Jobs
+    finalizados há mais de `result_ttl` segundos são removidos por uma
+    tarefa periódica (a cada `intervalo_limpeza` segundos).
+
+    Com `backend` (nutricional_core.compartilhado), cada mudança de estado
+    é publicada nele: o job roda no worker que o recebeu, mas pode ser
+    consultado em qualquer worker ou réplica. As chamadas ao backend rodam
+    em threads, fora do event loop.
+
+    `observador(na_fila, executando)` é chamado a cada mudança nesses totais
+    (métricas).
+    """
+
+    def __init__(
+        self, process_fn, max_workers=4, max_queue=100, job_timeout=180, result_ttl=3600, backend=None,
+        observador=None, intervalo_limpeza=60
+    ):
+        self.process_fn = process_fn
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self.result_ttl = result_ttl
+        self.backend = backend
+        self.observador = observador
+        self.intervalo_limpeza = min(intervalo_limpeza, result_ttl)
+        self.jobs = {}
+        self._executando = 0
+        self._queue = None
+        self._workers = []
+        self._executor = None
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+        self._workers.append(asyncio.create_task(self._limpar()))
+        logging.info(f"Fila de jobs iniciada com {self.max_workers} workers (fila máx. {self.max_queue})")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def submit(self, payload):
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "status": PENDENTE,
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        try:
+            self._queue.put_nowait((job_id, payload))
+        except asyncio.QueueFull:
+            raise QueueFullError("Fila de jobs cheia")
+        self.jobs[job_id] = job
+        self._notificar()
+        await self._publicar(job)
+        return job_id
+
+    async def get(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None and self.backend is not None:
+            dados = await asyncio.to_thread(self.backend.get, f"job:{job_id}")
+            job = json.loads(dados) if dados is not None else None
+        return job
+
+    async def _publicar(self, job):
+        if self.backend is not None:
+            # Cópia: o worker continua alterando o job enquanto a thread grava
+            await asyncio.to_thread(self._gravar, dict(job))
+
+    def _gravar(self, job):
+        try:
+            # Expira junto com o resultado, contando o tempo máximo na fila/execução
+            self.backend.set(
+                f"job:{job['id']}", json.dumps(job, ensure_ascii=False).encode("utf-8"),
+                ttl=self.result_ttl + self.job_timeout * 2
+            )
+        except Exception as e:
+            logging.error(f"Não foi possível publicar o job {job['id']}: {e}")
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": self._executando,
+            "max_queue": self.max_queue,
+            "workers": self.max_workers,
+        }
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job_id, payload = await self._queue.get()
+            job = self.jobs[job_id]
+            job["status"] = EXECUTANDO
+            job["started_at"] = time.time()
+            self._executando += 1
+            self._notificar()
+            await self._publicar(job)
+            future = loop.run_in_executor(self._executor, self.process_fn, payload)
+            try:
+                job["result"] = await asyncio.wait_for(asyncio.shield(future), timeout=self.job_timeout)
+                job["status"] = CONCLUIDO
+            except asyncio.TimeoutError:
+                job["status"] = TIMEOUT
+                job["error"] = f"Tempo limite de {self.job_timeout}s excedido"
+                logging.error(f"Job {job_id} excedeu o tempo limite")
+                # Os outros workers veem o TIMEOUT já, não quando a thread terminar
+                job["finished_at"] = time.time()
+                await self._publicar(job)
+                # A thread não pode ser interrompida; o worker só libera a vaga
+                # quando ela termina, para manter o limite de concorrência real.
+                await asyncio.gather(future, return_exceptions=True)
+            except Exception as e:
+                job["status"] = ERRO
+                job["error"] = str(e)
+                logging.error(f"Job {job_id} falhou: {e}")
+            finally:
+                if job["finished_at"] is None:
+                    job["finished_at"] = time.time()
+                self._executando -= 1
+                self._notificar()
+                await self._publicar(job)
+                self._queue.task_done()
+
+    def _notificar(self):
+        if self.observador is not None:
+            self.observador(self._queue.qsize(), self._executando)
+
+    async def _limpar(self):
+        while True:
+            await asyncio.sleep(self.intervalo_limpeza)
+            self._prune()
+
+    def _prune(self):
+        # Remove jobs finalizados há mais tempo que result_ttl
+        limite = time.time() - self.result_ttl
+        expirados = [
+            job_id for job_id, job in self.jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < limite
+        ]
+        for job_id in expirados:
+            del self.jobs[job_id]
@@ -1,258 +1,307 @@
+import asyncio
 import logging
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
-from langchain.chains import LLMChain
-from langchain_openai import ChatOpenAI
-from guardrails import Guard
-from fpdf import FPDF
 import dotenv
 import os
+import sys
 import json
-import uuid
+import time
+
+from jobs import JobQueue, QueueFullError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from nutricional_core.cache import PlanCache
+from nutricional_core.stream_parser import PlanoStreamParser
+from nutricional_core.taco import get_tabela, preencher_refeicao
+from nutricional_core.totais import totais_plano
+from nutricional_core.llm import get_client
+from nutricional_core.render import PdfRenderer
+from nutricional_core.blobs import BlobStore, SharedBlobStore
+from nutricional_core.compartilhado import criar_backend
+from nutricional_core.injecao import InjectionFilter
+from nutricional_core.etapas import server_timing
+from nutricional_core.perfil import PerfilInvalido, validar_perfil
+from nutricional_core.prompts import prompt_plano
+from nutricional_core.metas import campos_plano
+from nutricional_core.compacto import MODELO_ESTRITO
+from nutricional_core.gerador import PlanGenerator, RefeicaoInvalida, criar_guard
+from nutricional_core.receitas import RecipeStore
+from nutricional_core.metricas import EM_ANDAMENTO, JOBS, REQUISICAO_SEGUNDOS, gerar_metricas
+from nutricional_core.inicializacao import LazyResource, Warmup
 
 dotenv.load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI()
+# Configuração da fila de jobs
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "200"))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "180"))
+
+# Motor de geração: "unico" (uma chamada com o plano inteiro) ou
+# "paralelo" (as 5 refeições e os complementos em chamadas simultâneas,
+# com as metas calculadas localmente)
+GENERATION_ENGINE = os.getenv("GENERATION_ENGINE", "unico")
+
+# Processos do servidor (uvicorn --workers); cada um tem seu pool de PDF,
+# então os núcleos são divididos entre eles
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# Estado visto por todos os workers e réplicas (PDFs para download, jobs e
+# cache de planos): "memory://" só serve a um processo, "sqlite:///arquivo.db"
+# a vários workers na mesma máquina e "redis://host:6379/0" a várias máquinas.
+# Vazio com um único worker: PDFs em memória/PDF_STORE_DIR, como antes
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL") or (
+    "sqlite:///.cache/estado.db" if WEB_CONCURRENCY > 1 else ""
+)
+
+# Processos dedicados à renderização de PDF (0 = renderiza na própria thread)
+PDF_PROCESSES = int(os.getenv("PDF_PROCESSES", str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))))
+
+# Origem dos macronutrientes dos ingredientes: "llm" (gerados pelo modelo)
+# ou "taco" (modelo informa só nome e quantidade; macros vêm da tabela TACO)
+MACRO_SOURCE = os.getenv("MACRO_SOURCE", "llm")
+
+# Metas diárias (calorias, macros, água, fibras): "local" (calculadas por
+# equação antes do prompt, que fica bem mais curto) ou "llm" (o modelo calcula)
+METAS_LOCAIS = os.getenv("ENERGY_TARGETS", "local") == "local"
+
+# Formato da resposta do modelo: "json" (plano completo), "compacto" (chaves
+# curtas e listas, expandido no servidor; bem menos tokens de saída) ou
+# "estrito" (compacto com JSON Schema estrito na API). O stream usa sempre o
+# JSON completo, que o parser incremental entende
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "json")
+
+# Modelo do plano; o formato estrito exige saída estruturada (gpt-4o ou mais novo)
+PLAN_MODEL = os.getenv("PLAN_MODEL") or (MODELO_ESTRITO if OUTPUT_FORMAT == "estrito" else "gpt-4")
+
+# Planos de vários dias: opções diferentes por horário, que se revezam nos dias
+RECIPE_VARIETY = int(os.getenv("RECIPE_VARIETY", "3"))
+
+@asynccontextmanager
+async def lifespan(app):
+    await job_queue.start()
+    # O servidor já aceita conexões; /ready responde 503 até o aquecimento terminar
+    aquecimento.start()
+    yield
+    await job_queue.stop()
+    pdf_renderer.stop()
+    recipe_store.salvar()
+
+app = FastAPI(lifespan=lifespan)
+
+# Template HTML/CSS pré-compilado; o layout roda em um pool de processos
+pdf_renderer = PdfRenderer(processes=PDF_PROCESSES)
 templates = Jinja2Templates(directory="./templates")
 
-# Diretório para salvar os PDFs
-PDF_DIR = "pdfs"
-if not os.path.exists(PDF_DIR):
-    os.makedirs(PDF_DIR)
+estado_compartilhado = criar_backend(SHARED_STATE_URL) if SHARED_STATE_URL else None
+
+# PDFs gerados ficam em memória (ou em PDF_STORE_DIR) com TTL e limite de
+# tamanho; com estado compartilhado, no backend, e qualquer worker os serve
+if estado_compartilhado is not None:
+    pdf_store = SharedBlobStore(estado_compartilhado, ttl=float(os.getenv("PDF_STORE_TTL", "3600")))
+else:
+    pdf_store = BlobStore(
+        max_bytes=int(os.getenv("PDF_STORE_MAX_BYTES", str(256 * 1024 * 1024))),
+        ttl=float(os.getenv("PDF_STORE_TTL", "3600")),
+        disk_dir=os.getenv("PDF_STORE_DIR") or None
+    )
+
+# Cache de planos já gerados (memória + estado compartilhado + disco)
+plan_cache = PlanCache(
+    disk_dir=os.getenv("PLAN_CACHE_DIR", ".cache/planos"),
+    memory_size=int(os.getenv("PLAN_CACHE_MEMORY_SIZE", "256")),
+    ttl=float(os.getenv("PLAN_CACHE_TTL", str(7 * 24 * 3600))),
+    max_disk_bytes=int(os.getenv("PLAN_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+    backend=estado_compartilhado
+)
+
+# Refeições já geradas, reaproveitadas nos planos semanais
+recipe_store = RecipeStore(
+    path=os.getenv("RECIPE_STORE_PATH", ".cache/receitas.json"),
+    max_por_grupo=int(os.getenv("RECIPE_STORE_MAX_PER_GROUP", "200"))
+)
+
+# Triagem de objetivos/restrições antes de gastar uma chamada ao gpt-4
+filtro_entrada = InjectionFilter(
+    limiar=float(os.getenv("INJECTION_THRESHOLD", "0.9")),
+    tokens_resposta=2500,
+    custo_por_1k_tokens=float(os.getenv("LLM_COST_PER_1K_TOKENS", "0"))
+)
 
 openai_api_key = os.getenv("OPENAI_API_KEY")
 if not openai_api_key:
     raise ValueError("Variável de ambiente OPENAI_API_KEY não está definida")
 
-llm = ChatOpenAI(
-    model="gpt-4",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=openai_api_key
+# LangChain e guardrails só são importados no primeiro
+# uso (ou no aquecimento), para o processo subir rápido
+def criar_llm():
+    # Cliente compartilhado: pool HTTP, limites de taxa, retentativas e prazo
+    return get_client().langchain_llm(
+        model="gpt-4",
+        temperature=0,
+        max_tokens=None
+    )
+
+def criar_stream_chain():
+    # Cadeia usada no modo streaming (token a token); o prompt vem do núcleo compartilhado
+    from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
+
+    return ChatPromptTemplate.from_messages([
+        HumanMessagePromptTemplate.from_template(prompt_plano(MACRO_SOURCE, METAS_LOCAIS))
+    ]) | llm.get()
+
+llm = LazyResource(criar_llm, "LangChain (ChatOpenAI)")
+stream_chain = LazyResource(criar_stream_chain, "cadeia de streaming")
+guard = LazyResource(criar_guard, "guardrails (rail do plano)")
+
+# Pipeline compartilhado com o backend Flask (mesmo prompt, validação e cache)
+gerador = PlanGenerator(
+    get_client(),
+    plan_cache,
+    pdf_renderer,
+    namespace="plano",
+    model=PLAN_MODEL,
+    macro_source=MACRO_SOURCE,
+    guard=guard,
+    paralelo=GENERATION_ENGINE == "paralelo",
+    metas_locais=METAS_LOCAIS,
+    recipe_store=recipe_store,
+    formato=OUTPUT_FORMAT
 )
 
-rail_spec = """
-<rail version="0.1">
-<messages>
-    <message role="system">
-    You are a professional nutritionist specialized in creating personalized meal plans. You must respond only with valid JSON in the specified format.
-    </message>
-    <message role="user">
-    Generate a diet plan based on the provided information.
-    </message>
-    <message role="assistant">
-    I'll generate a personalized diet plan based on the information you provide. The plan will be in JSON format as specified.
-    </message>
-</messages>
-<output>
-    <object name="plano_dieta">
-        <string name="calorias" description="Quantidade diária em kcal" />
-        <string name="macronutrientes" description="Distribuição macro" />
-        <string name="Consumo de água" description="Quantidade diária em ml" />
-        <string name="Consumo de fibras" description="Quantidade diária em gramas" />
-        <string name="Suplementação" description="Suplementos recomendados" />
-        <object name="plano_refeicoes">
-            <string name="detalhamento" description="Descrição do plano de refeições" />
-        </object>
-        <list name="refeições" description="5 refeições diárias">
-            <object>
-                <string name="refeicao" description="Nome da refeição" />
-                <string name="nome" description="Nome da receita" />
-                <list name="ingredientes" description="Lista de ingredientes">
-                    <object>
-                        <string name="nome" description="Nome do ingrediente" />
-                        <string name="proteina" description="Valor nutricional de proteína em gramas (tabela TACO)" />
-                        <string name="carboidrato" description="Valor nutricional de carboidrato em gramas (tabela TACO)" />
-                        <string name="gordura" description="Valor nutricional de gordura em gramas (tabela TACO)" />
-                    </object>
-                </list>
-                <string name="instrucoes" description="Passos para preparo" />
-            </object>
-        </list>
-        <list name="dicas" description="Dicas de nutrição e estilo de vida">
-            <string />
-        </list>
-        <string name="observacoes" description="Observações adicionais" />
-    </object>
-</output>
-</rail>
-"""
-
-guard = Guard.for_rail_string(rail_spec)
-
-prompt_template = ChatPromptTemplate.from_messages([
-    HumanMessagePromptTemplate.from_template("""
-Você é um nutricionista profissional especializado em elaborar planos alimentares personalizados. Sua tarefa é fornecer um plano nutricional baseado nas seguintes informações:
-
-- Idade: {idade}
-- Peso: {peso}
-- Altura: {altura}
-- Gênero: {genero}
-- Nível de Atividade: {nivel_atividade}
-- Restrições Alimentares: {restricoes_alimentares}
-- Objetivos: {objetivos}
-
-O plano nutricional deve:
-
-- Ser adequado às necessidades calóricas diárias calculadas com base nas informações fornecidas.
-- Incluir a distribuição de macronutrientes (proteínas, carboidratos e gorduras) conforme recomendado para o objetivo especificado.
-- Detalhar um plano de refeições composto por 5 refeições diárias: café da manhã, lanche da manhã, almoço, lanche da tarde e jantar.
-- Fornecer receitas para cada refeição, incluindo ingredientes e instruções de preparo.
-- Os ingredientes devem ser apresentados com seus valores nutricionais (proteína, carboidrato, gordura) em gramas, conforme a tabela TACO.
-- Incluir 3 dicas adicionais para auxiliar no alcance dos objetivos.
-
-Retorne exatamente no seguinte formato JSON:
-
-{{
-    "plano_dieta": {{
-        "calorias": "quantidade diária em kcal",
-        "macronutrientes": "distribuição macro",
-        "Consumo de água": "quantidade diária em ml",
-        "Consumo de fibras": "quantidade diária em gramas",
-        "Suplementação": "suplementos recomendados",
-        "plano_refeicoes": {{
-            "detalhamento": "descrição do plano de refeições"
-        }},
-        "refeições": [
-            {{
-                "refeicao": "CAFÉ DA MANHÃ",
-                "nome": "Nome da receita",
-                "ingredientes": [
-                    {{
-                        "nome": "Nome do ingrediente",
-                        "proteina": "valor em gramas (tabela TACO)",
-                        "carboidrato": "valor em gramas (tabela TACO)",
-                        "gordura": "valor em gramas (tabela TACO)"
-                    }},
-                    ...
-                ],
-                "instrucoes": "passos para preparo"
-            }},
-            {{
-                "refeicao": "LANCHE DA MANHÃ",
-                "nome": "Nome da receita",
-                "ingredientes": [
-                    {{
-                        "nome": "Nome do ingrediente",
-                        "proteina": "valor em gramas (tabela TACO)",
-                        "carboidrato": "valor em gramas (tabela TACO)",
-                        "gordura": "valor em gramas (tabela TACO)"
-                    }},
-                    ...
-                ],
-                "instrucoes": "passos para preparo"
-            }},
-            {{
-                "refeicao": "ALMOÇO",
-                "nome": "Nome da receita",
-                "ingredientes": [
-                    {{
-                        "nome": "Nome do ingrediente",
-                        "proteina": "valor em gramas (tabela TACO)",
-                        "carboidrato": "valor em gramas (tabela TACO)",
-                        "gordura": "valor em gramas (tabela TACO)"
-                    }},
-                    ...
-                ],
-                "instrucoes": "passos para preparo"
-            }},
-            {{
-                "refeicao": "LANCHE DA TARDE",
-                "nome": "Nome da receita",
-                "ingredientes": [
-                    {{
-                        "nome": "Nome do ingrediente",
-                        "proteina": "valor em gramas (tabela TACO)",
-                        "carboidrato": "valor em gramas (tabela TACO)",
-                        "gordura": "valor em gramas (tabela TACO)"
-                    }},
-                    ...
-                ],
-                "instrucoes": "passos para preparo"
-            }},
-            {{
-                "refeicao": "JANTAR",
-                "nome": "Nome da receita",
-                "ingredientes": [
-                    {{
-                        "nome": "Nome do ingrediente",
-                        "proteina": "valor em gramas (tabela TACO)",
-                        "carboidrato": "valor em gramas (tabela TACO)",
-                        "gordura": "valor em gramas (tabela TACO)"
-                    }},
-                    ...
-                ],
-                "instrucoes": "passos para preparo"
-            }}
-        ],
-        "dicas": [
-            "dica 1",
-            "dica 2",
-            "dica 3"
-        ],
-        "observacoes": "observações adicionais"
-    }}
-}}
-
-Certifique-se de seguir rigorosamente o formato solicitado e preencher todos os campos com informações precisas.
-""")
-])
-
-chain = LLMChain(llm=llm, prompt=prompt_template)
-
-def generate_pdf_report(plano_dieta):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt="Plano de Dieta Personalizado", ln=True, align='C')
-
-    # Adicionando informações gerais
-    pdf.multi_cell(0, 10, txt=f"Calorias: {plano_dieta['calorias']}")
-    pdf.multi_cell(0, 10, txt=f"Macronutrientes: {plano_dieta['macronutrientes']}")
-    pdf.multi_cell(0, 10, txt=f"Consumo de água: {plano_dieta['Consumo de água']}")
-    pdf.multi_cell(0, 10, txt=f"Consumo de fibras: {plano_dieta['Consumo de fibras']}")
-    pdf.multi_cell(0, 10, txt=f"Suplementação: {plano_dieta['Suplementação']}")
-
-    # Adicionando plano de refeições
-    pdf.multi_cell(0, 10, txt=f"Plano de Refeições: {plano_dieta['plano_refeicoes']['detalhamento']}")
-
-    # Adicionando refeições
-    for refeicao in plano_dieta['refeições']:
-        pdf.multi_cell(0, 10, txt=f"\n{refeicao['refeicao']} - {refeicao['nome']}")
-        pdf.multi_cell(0, 10, txt="Ingredientes:")
-        for ingrediente in refeicao['ingredientes']:
-            pdf.multi_cell(0, 10, txt=f"- {ingrediente['nome']}: Proteína {ingrediente['proteina']}g, Carboidrato {ingrediente['carboidrato']}g, Gordura {ingrediente['gordura']}g")
-        pdf.multi_cell(0, 10, txt=f"Instruções: {refeicao['instrucoes']}")
-
-    # Adicionando dicas
-    pdf.multi_cell(0, 10, txt="\nDicas:")
-    for dica in plano_dieta['dicas']:
-        pdf.multi_cell(0, 10, txt=f"- {dica}")
-
-    # Adicionando observações
-    pdf.multi_cell(0, 10, txt=f"\nObservações: {plano_dieta['observacoes']}")
-
-    # Gerando um nome de arquivo único
-    filename = f"plano_dieta_{uuid.uuid4()}.pdf"
-    filepath = os.path.join(PDF_DIR, filename)
-
-    # Salvando o PDF
-    pdf.output(filepath)
-
-    return filename
+# Aquecimento único por processo, em segundo plano
+aquecimento = Warmup()
+aquecimento.add("pdf", pdf_renderer.start)
+aquecimento.add("guard", guard.get)
+aquecimento.add("langchain", stream_chain.get)
+if MACRO_SOURCE == "taco":
+    aquecimento.add("taco", get_tabela)
+
+def salvar_pdf(pdf_bytes):
+    # Guarda o PDF no blob store e retorna o identificador para download
+    return pdf_store.put(pdf_bytes)
+
+def entrada_bloqueada(input_data):
+    """Resposta 400 se os campos livres não passam pela triagem, senão None."""
+    permitido, motivo = filtro_entrada.verificar_campos(input_data)
+    if permitido:
+        return None
+    return JSONResponse(status_code=400, content={"error": f"Entrada rejeitada ({motivo})"})
+
+def url_download(filename):
+    return f"/baixar_plano/{filename}"
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
-@app.post("/gerar_dieta")
-async def gerar_dieta(
+def finalizar_plano(chave, texto, metas=None, perfil=None):
+    """Validação final e PDF do documento montado pelo stream."""
+    resultado = gerador.finalizar(chave, texto, metas, perfil)
+    return resultado["totais"], salvar_pdf(resultado["pdf"])
+
+def evento_sse(evento, dados):
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+def gerar_plano(input_data, renderizar=True):
+    """
+    Gera (ou busca no cache) o plano e o PDF. Retorna um dict com
+    plano_dieta, totais, pdf (bytes), cache ("hit" ou "miss") e os tempos
+    de cada etapa em ms. Com `renderizar=False` o PDF fica para
+    renderizar_lote (usado pelo batch.py).
+    """
+    return gerador.gerar(input_data, renderizar)
+
+def renderizar_lote(resultados):
+    """PDFs de vários resultados de gerar_plano(..., renderizar=False) de uma vez."""
+    return gerador.renderizar_lote(resultados)
+
+def resposta_plano(resultado):
+    filename = salvar_pdf(resultado["pdf"])
+    logging.info(f"PDF gerado: {filename}")
+    return {
+        "filename": filename,
+        "download_url": url_download(filename),
+        "cache": resultado["cache"],
+        "totais": resultado["totais"],
+        "tempos": resultado["tempos"]
+    }
+
+def resposta_semana(resultado):
+    filename = salvar_pdf(resultado["pdf"])
+    logging.info(f"PDF semanal gerado: {filename}")
+    return {
+        "filename": filename,
+        "download_url": url_download(filename),
+        "plano_semanal": resultado["plano_semanal"],
+        "totais": resultado["totais"],
+        "refeicoes_novas": resultado["refeicoes_novas"],
+        "refeicoes_reutilizadas": resultado.get("refeicoes_reutilizadas", 0),
+        "tempos": resultado["tempos"]
+    }
+
+def processar_plano(input_data):
+    """Executa a cadeia completa (LLM, guard, PDF) de forma síncrona."""
+    return resposta_plano(gerar_plano(input_data))
+
+def mensagem_de_erro(e):
+    if isinstance(e, (PerfilInvalido, RefeicaoInvalida)):
+        logging.info(f"Entrada inválida: {e}")
+        return str(e)
+    if isinstance(e, json.JSONDecodeError):
+        logging.error(f"Erro ao decodificar JSON: {e}")
+        return "Erro ao processar resposta do modelo"
+    if isinstance(e, KeyError):
+        logging.error(f"Chave não encontrada no JSON: {e}")
+        return "Estrutura da resposta do modelo inválida"
+    logging.error(f"Erro não esperado: {str(e)}")
+    return f"Erro ao processar: {str(e)}"
+
+def status_de_erro(e):
+    return 400 if isinstance(e, (PerfilInvalido, RefeicaoInvalida)) else 500
+
+def processar_job(input_data):
+    try:
+        return processar_plano(input_data)
+    except Exception as e:
+        raise RuntimeError(mensagem_de_erro(e)) from e
+
+def observar_jobs(na_fila, executando):
+    JOBS.labels("na_fila").set(na_fila)
+    JOBS.labels("executando").set(executando)
+
+job_queue = JobQueue(
+    processar_job,
+    max_workers=JOB_WORKERS,
+    max_queue=JOB_QUEUE_SIZE,
+    job_timeout=JOB_TIMEOUT,
+    backend=estado_compartilhado,
+    observador=observar_jobs
+)
+
+@app.middleware("http")
+async def medir_requisicoes(request: Request, call_next):
+    # Rótulo pelo primeiro segmento do caminho, para não criar uma série por id
+    prefixo = "/" + request.url.path.strip("/").split("/")[0]
+    EM_ANDAMENTO.labels(prefixo).inc()
+    inicio = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        EM_ANDAMENTO.labels(prefixo).dec()
+        rota = request.scope.get("route")
+        endpoint = rota.path if rota is not None else prefixo
+        REQUISICAO_SEGUNDOS.labels(endpoint, str(status)).observe(time.perf_counter() - inicio)
+
+def perfil_do_formulario(
     idade: int = Form(...),
     genero: str = Form(...),
     peso: float = Form(...),
@@ -261,44 +310,242 @@ async def gerar_dieta(
     objetivos: str = Form(...),
     restricoes_alimentares: str = Form(...)
 ):
+    """Campos do perfil enviados pelo formulário, como o pipeline os recebe."""
+    return {
+        "idade": idade,
+        "genero": genero,
+        "peso": peso,
+        "altura": altura,
+        "nivel_atividade": nivel_atividade,
+        "objetivos": objetivos,
+        "restricoes_alimentares": restricoes_alimentares
+    }
+
+@app.post("/gerar_dieta")
+async def gerar_dieta(input_data: dict = Depends(perfil_do_formulario)):
+    bloqueio = entrada_bloqueada(input_data)
+    if bloqueio is not None:
+        return bloqueio
     try:
-        logging.info("Iniciando geração de plano de dieta")
-        input_data = {
-            "idade": idade,
-            "genero": genero,
-            "peso": peso,
-            "altura": altura,
-            "nivel_atividade": nivel_atividade,
-            "objetivos": objetivos,
-            "restricoes_alimentares": restricoes_alimentares
+        # A chamada à LLM é assíncrona e o PDF vai para o pool de processos
+        resultado = await gerador.agerar(input_data)
+        resultado = await run_in_threadpool(resposta_plano, resultado)
+        return JSONResponse(
+            content={"message": "Plano de dieta gerado com sucesso", **resultado},
+            headers={"Server-Timing": server_timing(resultado["tempos"])}
+        )
+    except Exception as e:
+        return JSONResponse(status_code=status_de_erro(e), content={"error": mensagem_de_erro(e)})
+
+@app.post("/gerar_dieta/stream")
+async def gerar_dieta_stream(input_data: dict = Depends(perfil_do_formulario)):
+    bloqueio = entrada_bloqueada(input_data)
+    if bloqueio is not None:
+        return bloqueio
+
+    async def eventos():
+        try:
+            perfil = validar_perfil(input_data)
+            chave = gerador.chave(perfil)
+            # Disco ou estado compartilhado: a consulta não roda no event loop
+            cached = await run_in_threadpool(plan_cache.get, chave)
+            if cached is not None:
+                plano_dieta = cached["plano"]
+                for nome, valor in plano_dieta.items():
+                    if nome == "refeições":
+                        for indice, refeicao in enumerate(valor):
+                            yield evento_sse("refeicao", {"indice": indice, "refeicao": refeicao})
+                    else:
+                        yield evento_sse("campo", {"campo": nome, "valor": valor})
+                filename = await run_in_threadpool(salvar_pdf, cached["pdf"])
+                yield evento_sse("concluido", {
+                    "filename": filename,
+                    "download_url": url_download(filename),
+                    "cache": "hit",
+                    "totais": totais_plano(plano_dieta)
+                })
+                return
+
+            # Metas calculadas localmente saem antes mesmo da primeira chamada
+            metas = gerador.metas(perfil)
+            if metas is not None:
+                for nome, valor in campos_plano(metas).items():
+                    yield evento_sse("campo", {"campo": nome, "valor": valor})
+
+            # Emite cada campo/refeição assim que o JSON correspondente fecha
+            parser = PlanoStreamParser()
+            # Prazo total da chamada, como nas chamadas diretas do LLMClient
+            async with asyncio.timeout(get_client().deadline):
+                async for chunk in stream_chain.get().astream(gerador.variaveis(perfil, metas)):
+                    for tipo, nome, valor in parser.feed(chunk.content):
+                        if tipo == "refeicao":
+                            if MACRO_SOURCE == "taco":
+                                preencher_refeicao(valor, valor_ausente="n/d")
+                            yield evento_sse("refeicao", {"indice": nome, "refeicao": valor})
+                        else:
+                            yield evento_sse("campo", {"campo": nome, "valor": valor})
+            logging.info("Stream do modelo concluído")
+
+            # Validação final pelo guard sobre o documento completo
+            totais, filename = await run_in_threadpool(finalizar_plano, chave, parser.texto, metas, perfil)
+            logging.info(f"PDF gerado: {filename}")
+            yield evento_sse("concluido", {
+                "filename": filename,
+                "download_url": url_download(filename),
+                "cache": "miss",
+                "totais": totais
+            })
+        except Exception as e:
+            yield evento_sse("erro", {"error": mensagem_de_erro(e)})
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/gerar_dieta/pdf")
+async def gerar_dieta_pdf(input_data: dict = Depends(perfil_do_formulario)):
+    bloqueio = entrada_bloqueada(input_data)
+    if bloqueio is not None:
+        return bloqueio
+    try:
+        resultado = await gerador.agerar(input_data)
+    except Exception as e:
+        return JSONResponse(status_code=status_de_erro(e), content={"error": mensagem_de_erro(e)})
+    # PDF enviado direto da memória, sem passar pelo disco
+    return Response(
+        content=resultado["pdf"],
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": 'attachment; filename="plano_dieta.pdf"',
+            "Server-Timing": server_timing(resultado["tempos"])
         }
-        logging.info(f"Dados de entrada: {input_data}")
-        
-        resposta = chain.invoke(input_data)
-        logging.info("Resposta do modelo obtida")
-        logging.info(f"Resposta do modelo: {resposta['text']}")
-        
-        validated_output = guard(lambda: resposta['text'])
-        logging.info("JSON validado pelo guard")
-        
-        plano_dieta = json.loads(validated_output)['plano_dieta']
-        logging.info("JSON parseado com sucesso")
-        
-        filename = generate_pdf_report(plano_dieta)
-        logging.info(f"PDF gerado: {filename}")
-        
-        return JSONResponse(content={"message": "Plano de dieta gerado com sucesso", "filename": filename})
-        
-    except json.JSONDecodeError as e:
-        logging.error(f"Erro ao decodificar JSON: {e}")
-        return JSONResponse(status_code=500, content={"error": "Erro ao processar resposta do modelo"})
-    except KeyError as e:
-        logging.error(f"Chave não encontrada no JSON: {e}")
-        return JSONResponse(status_code=500, content={"error": "Estrutura da resposta do modelo inválida"})
+    )
+
+@app.post("/gerar_semana")
+async def gerar_semana(
+    input_data: dict = Depends(perfil_do_formulario),
+    dias: int = Form(7)
+):
+    if not 1 <= dias <= 14:
+        return JSONResponse(status_code=400, content={"error": "dias deve estar entre 1 e 14"})
+    bloqueio = entrada_bloqueada(input_data)
+    if bloqueio is not None:
+        return bloqueio
+    try:
+        # Refeições do banco sempre que possível; o modelo só gera as que faltam
+        resultado = await gerador.agerar_semana(input_data, dias, RECIPE_VARIETY)
+        resultado = await run_in_threadpool(resposta_semana, resultado)
+        return JSONResponse(
+            content={"message": "Plano semanal gerado com sucesso", **resultado},
+            headers={"Server-Timing": server_timing(resultado["tempos"])}
+        )
     except Exception as e:
-        logging.error(f"Erro não esperado: {str(e)}")
-        return JSONResponse(status_code=500, content={"error": f"Erro ao processar: {str(e)}"})
+        return JSONResponse(status_code=status_de_erro(e), content={"error": mensagem_de_erro(e)})
+
+@app.post("/gerar_semana/regenerar")
+async def regenerar_refeicao(request: Request):
+    """
+    Troca uma refeição de um plano semanal. Corpo JSON: os campos do perfil
+    em "perfil", o "plano_semanal" retornado por /gerar_semana, o "dia"
+    (1 = primeiro) e a "refeicao" (ex.: "ALMOÇO").
+    """
+    try:
+        corpo = await request.json()
+        input_data, plano_semanal = corpo["perfil"], corpo["plano_semanal"]
+        dia, horario = int(corpo["dia"]), corpo["refeicao"]
+    except (ValueError, KeyError, TypeError):
+        return JSONResponse(status_code=400, content={"error": "Informe perfil, plano_semanal, dia e refeicao"})
+    bloqueio = entrada_bloqueada(input_data)
+    if bloqueio is not None:
+        return bloqueio
+    try:
+        resultado = await gerador.aregenerar_refeicao(input_data, plano_semanal, dia, horario)
+        resultado = await run_in_threadpool(resposta_semana, resultado)
+        return JSONResponse(content=resultado, headers={"Server-Timing": server_timing(resultado["tempos"])})
+    except Exception as e:
+        return JSONResponse(status_code=status_de_erro(e), content={"error": mensagem_de_erro(e)})
+
+@app.get("/baixar_plano/{filename}")
+async def baixar_plano(filename: str):
+    path = pdf_store.path(filename)
+    if path is not None:
+        # Em disco: FileResponse usa sendfile quando o servidor suporta
+        return FileResponse(path, media_type="application/pdf", filename="plano_dieta.pdf")
+    # Com estado compartilhado é uma consulta ao SQLite/Redis: fora do event loop
+    pdf_bytes = await asyncio.to_thread(pdf_store.get, filename)
+    if pdf_bytes is None:
+        return JSONResponse(status_code=404, content={"error": "Plano não encontrado ou expirado"})
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={"Content-Disposition": 'attachment; filename="plano_dieta.pdf"'}
+    )
+
+@app.post("/jobs", status_code=202)
+async def criar_job(input_data: dict = Depends(perfil_do_formulario)):
+    bloqueio = entrada_bloqueada(input_data)
+    if bloqueio is not None:
+        return bloqueio
+    try:
+        job_id = await job_queue.submit(input_data)
+    except QueueFullError:
+        return JSONResponse(
+            status_code=429,
+            content={"error": "Servidor ocupado, tente novamente em instantes"},
+            headers={"Retry-After": "10"}
+        )
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": (await job_queue.get(job_id))["status"]})
+
+@app.get("/jobs/{job_id}")
+async def consultar_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job não encontrado"})
+    return JSONResponse(content={
+        "job_id": job["id"],
+        "status": job["status"],
+        "result": job["result"],
+        "error": job["error"]
+    })
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return JSONResponse(content=plan_cache.stats())
+
+@app.get("/receitas/stats")
+async def receitas_stats():
+    return JSONResponse(content=recipe_store.stats())
+
+@app.get("/filtro/stats")
+async def filtro_stats():
+    return JSONResponse(content=filtro_entrada.stats())
+
+@app.get("/metrics")
+async def metrics():
+    conteudo, content_type = gerar_metricas()
+    return Response(content=conteudo, media_type=content_type)
+
+@app.get("/health")
+async def health():
+    # Liveness: o processo responde, mesmo ainda aquecendo
+    return JSONResponse(content={"status": "ok"})
+
+@app.get("/ready")
+async def ready():
+    # Readiness: só recebe tráfego depois do aquecimento
+    stats = aquecimento.stats()
+    return JSONResponse(status_code=200 if stats["pronto"] else 503, content=stats)
+
+@app.get("/pdf/stats")
+async def pdf_stats():
+    return JSONResponse(content={**pdf_renderer.stats(), "store": pdf_store.stats()})
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    if WEB_CONCURRENCY > 1:
+        # Vários processos precisam do app por nome de importação
+        uvicorn.run("main:app", host="0.0.0.0", port=8001, workers=WEB_CONCURRENCY)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file